@@ -1,8 +1,16 @@
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import organizations, users, webhooks, files
+from .routers import organizations, users, webhooks, files, rules
 from .middleware.auth import auth_middleware
 from .database.config import engine, Base
+from .services.sandbox import sandbox
+from .services.jobs import job_queue
+from .services.pandas_options import configure_pandas
+
+# Options pandas du processus API (les pools les appliquent à leurs processus)
+configure_pandas()
 
 # Création des tables
 Base.metadata.create_all(bind=engine)
@@ -28,10 +36,28 @@ app.include_router(webhooks.router)  # Pas de middleware auth pour les webhooks
 app.include_router(organizations.router)
 app.include_router(users.router)
 app.include_router(files.router)
+app.include_router(rules.router)
 
 # Ajout du middleware d'authentification après CORS
 app.middleware("http")(auth_middleware)
 
+# 🧪 Pré-démarrage des processus d'exécution du code généré
+@app.on_event("startup")
+async def start_sandbox():
+    await asyncio.to_thread(sandbox.start)
+
+# 🏭 Reprise des traitements de fichiers interrompus (voir services/jobs.py)
+@app.on_event("startup")
+async def start_job_queue():
+    try:
+        await asyncio.to_thread(job_queue.start)
+    except Exception as e:
+        logging.warning(f"⚠️ Reprise des traitements impossible: {e}")
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    job_queue.shutdown()
+
 @app.get("/")
 async def root():
     return {
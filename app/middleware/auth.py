@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, Dict, NamedTuple, Optional, Tuple
 from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import httpx
@@ -15,8 +15,10 @@ from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 from cryptography.hazmat.backends import default_backend
 import base64
 import logging
+import threading
 from sqlalchemy.orm import Session
 from ..database.config import get_db
+from ..models.organization import Organization
 from ..models.user import User
 
 # Configuration du logging
@@ -243,4 +245,36 @@ async def get_current_organization(request: Request):
             status_code=403,
             detail="Aucune organisation associée"
         )
-    return request.state.org_id 
\ No newline at end of file
+    return request.state.org_id 
+
+# Organisation de l'utilisateur, pour les routes qui n'ont besoin que de ses
+# settings : pas d'erreur si l'utilisateur n'est pas (encore) synchronisé,
+# session fermée aussitôt, résultat gardé ORGANIZATION_CACHE_SECONDS.
+ORGANIZATION_CACHE_SECONDS = float(os.getenv("ORGANIZATION_CACHE_SECONDS", "60"))
+
+class RequestOrganization(NamedTuple):
+    id: str
+    settings: Dict[str, Any]
+
+_organizations: Dict[str, Tuple[float, Optional[RequestOrganization]]] = {}
+_organizations_lock = threading.Lock()
+
+def get_request_organization(request: Request) -> Optional[RequestOrganization]:
+    clerk_user_id = getattr(request.state, "clerk_session", None)
+    if not clerk_user_id:
+        return None
+    with _organizations_lock:
+        cached = _organizations.get(clerk_user_id)
+    if cached is not None and time.monotonic() - cached[0] < ORGANIZATION_CACHE_SECONDS:
+        return cached[1]
+    db = next(get_db())
+    try:
+        row = db.query(Organization.id, Organization.settings)\
+            .join(User, User.organization_id == Organization.id)\
+            .filter(User.clerk_user_id == clerk_user_id).first()
+    finally:
+        db.close()
+    organization = RequestOrganization(str(row.id), row.settings or {}) if row else None
+    with _organizations_lock:
+        _organizations[clerk_user_id] = (time.monotonic(), organization)
+    return organization
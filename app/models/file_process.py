@@ -23,6 +23,10 @@ class FileProcess(Base):
     file_metadata = Column(JSON, default={})
     processing_options = Column(JSON, default={})
     
+    # Bail du worker qui traite la tâche (voir services/jobs.py)
+    claimed_by = Column(String(255))
+    claimed_at = Column(DateTime(timezone=True))  # dernier battement de cœur
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     completed_at = Column(DateTime(timezone=True))
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Query
+from fastapi.responses import JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional, Tuple
 from ..database.config import get_db
@@ -7,7 +8,7 @@ from ..models.file_process import FileProcess
 from ..models.user import User
 from ..schemas.file import FileProcessCreate, FileProcessResponse, ProcessingResponse, FileProcessUpdate
 from ..services.file import FileService
-from ..middleware.auth import get_current_user
+from ..middleware.auth import get_current_user, get_request_organization, RequestOrganization
 import pandas as pd
 import json
 from app.services.cleaner import apply_user_rule, clean_numeric_values
@@ -16,12 +17,38 @@ import math
 import logging
 import traceback
 from datetime import datetime
-from app.utils.json_encoder import serialize_with_custom_encoder
+from app.utils.json_encoder import DataJSONResponse
 from app.services.chat import graph_with_memory
 from langchain_core.messages import HumanMessage
 import uuid
-from app.services.chat import get_session_history, memory_store,df_history_store  
-router = APIRouter(prefix="/files", tags=["files"])
+from app.services.delta import compute_delta, delta_to_payload
+from app.services.ingest import ingest_upload, describe_schema, DEFAULT_PAGE_SIZE
+from app.services.rows import window_rows
+from app.services.wire import (
+    DATA_FORMAT_HEADER,
+    ARROW_STREAM,
+    parse_data_format,
+    encode_frame,
+    decode_frame,
+    frame_to_arrow_stream,
+    frame_from_arrow_stream,
+)
+from app.services.history import DataFrameHistory
+from app.services.pipeline import plan_settings
+from app.services.session_backends import SessionConflictError
+from app.services.dtypes import optimize_dtypes, memory_bytes
+from app.services.chat import get_session_history, code_cache
+from app.services.datasets import (
+    memory_store,
+    df_history_store,
+    df_version_store,
+    dtype_store,
+    prepare_initial_df,
+    register_dataset,
+    get_dataset,
+    session_store,
+)
+router = APIRouter(prefix="/files", tags=["files"], default_response_class=DataJSONResponse)
 
 @router.post("/upload", response_model=FileProcessResponse)
 async def upload_file(
@@ -63,19 +90,7 @@ async def get_processing_history(
     file_service = FileService(db)
     return await file_service.get_history(current_user)
 
-# Utilitaires pour la sérialisation
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (np.integer, np.floating)):
-            return obj.item()
-        if isinstance(obj, (float, np.float64)):
-            if math.isinf(obj) or math.isnan(obj):
-                return str(obj)
-        return super().default(obj)
-
-def serialize_with_custom_encoder(obj: Any) -> str:
-    return json.dumps(obj, cls=CustomJSONEncoder)
-
+# Utilitaires
 def log_request(request: Request, endpoint: str):
     auth_header = request.headers.get('Authorization', 'No Auth Header')
     logging.info(f"""
@@ -86,32 +101,95 @@ def log_request(request: Request, endpoint: str):
 - Timestamp: {datetime.now().isoformat()}
 """)
 
+def get_data_format(request: Request) -> str:
+    """Format de la clé "data" des réponses (en-têtes X-Data-Format / Accept, voir wire.py)."""
+    try:
+        return parse_data_format(request.headers.get(DATA_FORMAT_HEADER), request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def read_payload(request: Request) -> Dict[str, Any]:
+    """
+    Corps JSON, ou flux Arrow (Content-Type application/vnd.apache.arrow.stream) :
+    les lignes deviennent "data", les paramètres (prompt, session_id...) viennent
+    des métadonnées du schéma.
+    """
+    if request.headers.get("content-type", "").startswith(ARROW_STREAM):
+        try:
+            df, params = await run_in_threadpool(frame_from_arrow_stream, await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {**params, "data": df}
+    return await request.json()
+
+def frame_response(content: Dict[str, Any], data_format: str) -> Response:
+    """Réponse dont content["data"] est un DataFrame, encodé dans le format négocié."""
+    df = content["data"]
+    if data_format == "arrow":
+        metadata = {key: value for key, value in content.items() if key != "data"}
+        return Response(content=frame_to_arrow_stream(df, metadata), media_type=ARROW_STREAM,
+                        headers={DATA_FORMAT_HEADER: data_format})
+    return DataJSONResponse(content={**content, "data": encode_frame(df, data_format)},
+                            headers={DATA_FORMAT_HEADER: data_format})
+
+def resolve_dataframe(data: Dict[str, Any], new_session: Optional[str] = None) -> pd.DataFrame:
+    """
+    Retrouve le DataFrame de travail d'une requête : dernier état de la session,
+    jeu de données déjà chargé (dataset_id) ou, à défaut, les lignes envoyées
+    (converties dans leurs types compacts, voir dtypes.py). `new_session` reçoit
+    le rapport de conversion de types dans dtype_store.
+    """
+    session_id = data.get("session_id")
+    if session_id and session_id in df_history_store:
+        return df_history_store[session_id][-1]
+    dataset_id = data.get("dataset_id")
+    if dataset_id:
+        df = get_dataset(dataset_id)
+        if df is not None:
+            if new_session and dataset_id in dtype_store:
+                dtype_store[new_session] = dtype_store[dataset_id]
+            return df
+    if "data" in data:
+        try:
+            df, report = optimize_dtypes(prepare_initial_df(decode_frame(data["data"])))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if new_session:
+            dtype_store[new_session] = report
+        return df
+    if dataset_id:
+        raise HTTPException(status_code=404, detail=f"Jeu de données inconnu ou expiré: {dataset_id}")
+    raise HTTPException(status_code=404, detail="Session inconnue : renvoyer 'dataset_id' ou 'data'")
+
 @router.post("/quick-upload")
-async def quick_upload_file(request: Request, file: UploadFile = File(...)) -> Dict[str, Any]:
+async def quick_upload_file(request: Request, file: UploadFile = File(...), page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, Any]:
     """
     Endpoint pour télécharger un fichier et le convertir en DataFrame (rapide, sans base).
+    Le fichier est lu en flux et conservé côté serveur : la réponse ne contient que
+    le schéma, le nombre de lignes et la première page.
     """
+    data_format = get_data_format(request)
     try:
         log_request(request, "/files/quick-upload")
         logging.info(f"📁 Traitement du fichier: {file.filename}")
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(file.file)
-            logging.info(f"✅ Fichier CSV lu avec succès: {len(df)} lignes")
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file.file)
-            logging.info(f"✅ Fichier Excel lu avec succès: {len(df)} lignes")
-        else:
+        if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
             logging.error(f"❌ Format de fichier non supporté: {file.filename}")
             raise HTTPException(status_code=400, detail="Format de fichier non supporté")
-        data = df.to_dict('records')
-        columns = df.columns.tolist()
+        dataset_id, df = await run_in_threadpool(ingest_upload, file.file, file.filename)
+        logging.info(f"✅ Fichier lu en flux avec succès: {len(df)} lignes")
         content = {
             "message": "Fichier traité avec succès",
-            "data": data,
-            "columns": columns
+            "dataset_id": dataset_id,
+            "schema": describe_schema(df),
+            "row_count": len(df),
+            "columns": df.columns.tolist(),
+            "data": df.head(page_size),
+            "has_more": len(df) > page_size
         }
         logging.info("✅ Données converties et prêtes à être envoyées")
-        return JSONResponse(content=json.loads(serialize_with_custom_encoder(content)))
+        return await run_in_threadpool(frame_response, content, data_format)
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"""
 ❌ Erreur lors du traitement du fichier:
@@ -143,13 +221,13 @@ async def quick_upload_file(request: Request, file: UploadFile = File(...)) -> D
 #                 "message": message,
 #                 "data": result_data
 #             }
-#         return JSONResponse(content=json.loads(serialize_with_custom_encoder(content)))
 #     except Exception as e:
 #         raise HTTPException(status_code=500, detail=str(e))
 @router.post("/quick-process")
-async def quick_process_file(request: Request):
+async def quick_process_file(request: Request, organization: Optional[RequestOrganization] = Depends(get_request_organization)):
+    data_format = get_data_format(request)
     try:
-        data = await request.json()
+        data = await read_payload(request)
         prompt = data["prompt"]
         session_id = data.get("session_id") or str(uuid.uuid4())
 
@@ -157,15 +235,13 @@ async def quick_process_file(request: Request):
         chat_history = get_session_history(session_id)
         previous_messages = chat_history.messages if hasattr(chat_history, "messages") else []
 
-        # 🧠 Récupère ou initialise df_history
+        # 🧠 Récupère ou initialise df_history (dataset_id évite de renvoyer toutes les lignes)
         if session_id in df_history_store:
             df_history = df_history_store[session_id]
         else:
-            df_initial = pd.DataFrame(data["data"])
-            df_initial = df_initial.replace(r'^\s*$', None, regex=True)
-            df_initial = df_initial.where(pd.notnull(df_initial), None)
-            df_initial.dropna(how="all", inplace=True)
-            df_history = [df_initial]
+            df_history = DataFrameHistory(
+                await run_in_threadpool(resolve_dataframe, {**data, "session_id": None}, session_id)
+            )
 
         # ✅ Point de départ : dernier état connu du DataFrame
         df = df_history[-1]
@@ -175,7 +251,10 @@ async def quick_process_file(request: Request):
             "messages": [HumanMessage(content=prompt)],
             "df": df,
             "df_history": df_history,
-            "session_id": session_id
+            "session_id": session_id,
+            # Settings de l'organisation (règles téléphoniques...) ; défauts globaux sans organisation
+            "settings": plan_settings(organization.settings if organization else None),
+            "organization_id": organization.id if organization else None
         }
 
         # 🔁 Appel à LangGraph avec mémoire
@@ -188,36 +267,154 @@ async def quick_process_file(request: Request):
         if "output" in result and "df_history" in result["output"]:
             df_history_store[session_id] = result["output"]["df_history"]
         else:
-            df_history_store[session_id] = result.get("df_history", [df.copy()])
+            df_history_store[session_id] = result.get("df_history", DataFrameHistory(df))
+
+        # 🔢 Versionnage : toute nouvelle version du DataFrame incrémente le compteur
+        base_version = df_version_store.get(session_id, 0)
+        version = base_version if result["df"] is df else base_version + 1
+        df_version_store[session_id] = version
+
+        # ✅ Réponse delta (opt-in) : seulement les changements depuis la version du client,
+        # lignes encodées dans le format négocié (Arrow : réponse complète, un seul tableau par flux)
+        if data.get("response_mode") == "delta" and data_format != "arrow":
+            delta = None
+            if data.get("version") == base_version:
+                delta = compute_delta(df, result["df"])
+            if delta is not None and delta.cell_count() < result["df"].size:
+                payload = await run_in_threadpool(delta_to_payload, delta, data_format)
+                return DataJSONResponse(content={
+                    "delta": payload,
+                    "base_version": base_version,
+                    "version": version,
+                    "message": result["message"],
+                    "session_id": session_id
+                }, headers={DATA_FORMAT_HEADER: data_format})
 
         # ✅ Réponse
-        df = result["df"].copy()
-        for col in df.select_dtypes(include=["datetime", "datetimetz"]):
-            df[col] = df[col].astype(str)
-        return JSONResponse(content={
-            "data": df.to_dict(orient="records"),
+        df = result["df"]
+        content = {
+            "data": df,
+            "version": version,
             "message": result["message"],
             "session_id": session_id
-        })
+        }
+        if data.get("response_mode") == "delta":
+            content["row_ids"] = df.index.tolist()
+        return await run_in_threadpool(frame_response, content, data_format)
 
+    except HTTPException:
+        raise
+    except SessionConflictError as e:
+        # Même session modifiée en parallèle par un autre worker (SESSION_BACKEND=disk|redis)
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/sessions/metrics")
+async def get_session_metrics() -> Dict[str, Any]:
+    """Occupation du stockage des sessions : sessions, snapshots et octets détenus."""
+    return session_store.stats()
+
+
+@router.get("/sessions/{session_id}/dtypes")
+async def get_session_dtypes(session_id: str) -> Dict[str, Any]:
+    """
+    Types des colonnes de la session : conversions faites à l'entrée (octets
+    avant / après), types et occupation mémoire du dernier état.
+    """
+    if session_id in df_history_store:
+        history = df_history_store[session_id]
+        df, history_bytes = history[-1], history.nbytes
+    else:
+        df, history_bytes = get_dataset(session_id), None
+        if df is None:
+            raise HTTPException(status_code=404, detail=f"Session inconnue ou expirée: {session_id}")
+    return {
+        "session_id": session_id,
+        "optimized": dtype_store.get(session_id),
+        "schema": describe_schema(df),
+        "bytes": await run_in_threadpool(memory_bytes, df),
+        "history_bytes": history_bytes,
+    }
+
+
+@router.get("/code-cache/metrics")
+async def get_code_cache_metrics() -> Dict[str, Any]:
+    """Efficacité du cache de code généré : entrées, hits exacts / similaires, misses."""
+    return code_cache.stats()
+
+@router.get("/sessions/{session_id}/rows")
+async def get_session_rows(
+    session_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=10_000),
+    columns: Optional[str] = None,
+    sort: Optional[str] = None,
+    filter: Optional[List[str]] = Query(None)
+) -> Dict[str, Any]:
+    """
+    Retourne une fenêtre de lignes du dernier état de la session (ou d'un dataset_id).
+    - columns : liste séparée par des virgules
+    - sort : colonnes séparées par des virgules, préfixe '-' pour un tri décroissant
+    - filter : répétable, au format colonne:opérateur:valeur (eq, ne, contains,
+      startswith, gt, gte, lt, lte, isnull, notnull)
+    L'en-tête X-Data-Format choisit la forme de "data" (records, table, columns).
+    """
+    data_format = get_data_format(request)
+    if session_id in df_history_store:
+        history = df_history_store[session_id]
+        df = history[-1]
+        version = df_version_store.get(session_id, 0)
+        # La version repart de 0 si la session est recréée : l'historique change alors d'identifiant
+        cache_key = ("session", session_id, history.generation, version)
+    else:
+        df = get_dataset(session_id)
+        version = 0
+        cache_key = ("dataset", session_id)
+        if df is None:
+            raise HTTPException(status_code=404, detail=f"Session inconnue ou expirée: {session_id}")
+    try:
+        content = await run_in_threadpool(
+            window_rows,
+            df,
+            offset=offset,
+            limit=limit,
+            columns=[col for col in columns.split(",") if col] if columns else None,
+            sort=sort,
+            filters=filter,
+            cache_key=cache_key
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await run_in_threadpool(frame_response, {
+        "session_id": session_id,
+        "version": version,
+        **content
+    }, data_format)
+
+
 @router.post("/gpt")
-async def gpt_analyze(data: Dict[str, Any], request: Request) -> Dict[str, Any]:
+async def gpt_analyze(request: Request) -> Dict[str, Any]:
     """
     Endpoint pour analyser les données et générer des KPIs avec GPT (rapide, sans base).
+    Accepte un corps JSON ou un flux Arrow (voir read_payload).
     """
     try:
+        data = await read_payload(request)
         prompt = data["prompt"]
-        df = pd.DataFrame(data.get("data", []))
+        df = resolve_dataframe(data)
         kpi_data, message = await analyze_data(df, prompt)
         content = {
             "message": message,
             "kpi_data": kpi_data
         }
-        return JSONResponse(content=json.loads(serialize_with_custom_encoder(content)))
+        return DataJSONResponse(content=content)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,63 @@
+"""
+Benchmark de clean_numeric_values : version vectorisée par dtype vs version
+historique (map cellule par cellule), avec vérification que les résultats sont identiques.
+
+Usage : python -m app.scripts.bench_clean_numeric_values [nombre_de_lignes]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from app.services.cleaner import clean_numeric_values, _clean_value
+
+
+def clean_numeric_values_reference(df: pd.DataFrame) -> pd.DataFrame:
+    """Implémentation d'origine : _clean_value appliqué à chaque cellule via Series.map."""
+    df_clean = df.copy()
+    for col in df_clean.columns:
+        df_clean[col] = df_clean[col].map(_clean_value)
+    return df_clean
+
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    floats = rng.normal(size=rows) * 1000
+    floats[rng.random(rows) < 0.05] = np.nan
+    floats[rng.random(rows) < 0.001] = np.inf
+    mixed = pd.Series(rng.integers(0, 1000, rows), dtype=object)
+    mixed[rng.random(rows) < 0.1] = None
+    mixed[rng.random(rows) < 0.1] = "n/a"
+    mixed[rng.random(rows) < 0.01] = 1.5
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "montant": floats,
+        "quantite": rng.integers(0, 100, rows),
+        "ville": rng.choice(["Paris", "Lyon", "Casablanca", None], rows),
+        "code": mixed,
+        "actif": rng.random(rows) < 0.5,
+        "ratio": np.where(rng.random(rows) < 0.02, np.nan, rng.random(rows)),
+    })
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = make_frame(rows)
+
+    start = time.perf_counter()
+    expected = clean_numeric_values_reference(df)
+    reference_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = clean_numeric_values(df)
+    vectorized_seconds = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(result, expected)
+    print(f"{rows} lignes x {df.shape[1]} colonnes")
+    print(f"  cellule par cellule : {reference_seconds:.2f} s")
+    print(f"  vectorisé par dtype : {vectorized_seconds:.2f} s")
+    print(f"  accélération        : x{reference_seconds / vectorized_seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark de la normalisation des téléphones : moteur vectorisé (phones.py) vs
+version historique (re.sub cellule par cellule via .apply, +212 en dur), avec
+vérification que les deux donnent le même résultat sur les numéros marocains
+nationaux (seul cas que la version historique traitait correctement).
+
+Usage : python -m app.scripts.bench_format_phone [nombre_de_lignes]
+"""
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from app.services.phones import normalize_phones, phone_rules
+
+
+def format_phone_reference(values: pd.Series) -> pd.Series:
+    """Implémentation d'origine de format_phone_column (str(x) : NaN rendu "nan" comme avec pandas 2)."""
+    digits = values.apply(lambda x: re.sub(r'\D', '', str(x)))
+    return digits.str.replace(r'^0', '+212', regex=True)
+
+
+def make_column(rows: int, seed: int = 0) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    subscriber = pd.Series(rng.integers(10 ** 8, 10 ** 9, rows)).astype(str)
+    kind = rng.integers(0, 6, rows)
+    values = np.select(
+        [kind == 0, kind == 1, kind == 2, kind == 3, kind == 4],
+        [
+            "0" + subscriber,                                                     # 0612345678
+            "0" + subscriber.str[:1] + " " + subscriber.str[1:3] + " " + subscriber.str[3:5]
+            + " " + subscriber.str[5:7] + " " + subscriber.str[7:],               # 06 12 34 56 78
+            "+212 " + subscriber,                                                 # +212 612345678
+            "+33 " + subscriber,                                                  # +33 612345678
+            "00" + "44" + subscriber + "1",                                       # 0044...
+        ],
+        "n/a",
+    )
+    column = pd.Series(values, name="telephone", dtype="str")
+    return column.mask(rng.random(rows) < 0.02)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    column = make_column(rows)
+
+    expected, reference_seconds = timed(format_phone_reference, column)
+    (result, valid), vectorized_seconds = timed(normalize_phones, column)
+    (_, valid_fr), france_seconds = timed(normalize_phones, column, phone_rules({"phone": {"default_country": "FR"}}))
+
+    national = column.str.fullmatch(r"0\d{9}").fillna(False)
+    pd.testing.assert_series_equal(result[national], expected[national], check_dtype=False)
+    print(f"{rows} lignes")
+    print(f"  cellule par cellule (+212 en dur) : {reference_seconds:.2f} s ({rows / reference_seconds:,.0f} lignes/s)")
+    print(f"  vectorisé, pays MA                : {vectorized_seconds:.2f} s ({rows / vectorized_seconds:,.0f} lignes/s)")
+    print(f"  vectorisé, pays FR                : {france_seconds:.2f} s ({rows / france_seconds:,.0f} lignes/s)")
+    print(f"  accélération                      : x{reference_seconds / vectorized_seconds:.1f}")
+    print(f"  numéros valides                   : {valid.mean():.1%} (MA), {valid_fr.mean():.1%} (FR)")
+
+
+if __name__ == "__main__":
+    main()
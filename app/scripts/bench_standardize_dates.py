@@ -0,0 +1,65 @@
+"""
+Benchmark de la lecture des dates : formats déduits et mis en cache (dates.py)
+vs version historique (pd.to_datetime sans format), sur une colonne qui mélange
+dates françaises, ISO et compactes (20240105). Affiche aussi les valeurs
+perdues (NaT) par la version historique.
+
+Usage : python -m app.scripts.bench_standardize_dates [nombre_de_lignes]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from app.services.dates import parse_dates
+
+
+def standardize_dates_reference(values: pd.Series) -> pd.Series:
+    """Implémentation d'origine de standardize_date_column."""
+    return pd.to_datetime(values, errors='coerce')
+
+
+def make_column(rows: int, seed: int = 0) -> pd.Series:
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 2000, rows), unit="D")
+    kind = rng.integers(0, 4, rows)
+    values = np.select(
+        [kind == 0, kind == 1, kind == 2],
+        [
+            days.strftime("%Y-%m-%d"),   # 2024-01-05
+            days.strftime("%d/%m/%Y"),   # 05/01/2024
+            days.strftime("%d.%m.%Y"),   # 05.01.2024
+        ],
+        days.strftime("%Y%m%d"),         # 20240105
+    )
+    column = pd.Series(values, name="date_commande", dtype="str")
+    return column.mask(rng.random(rows) < 0.02)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    column = make_column(rows)
+
+    expected, reference_seconds = timed(standardize_dates_reference, column)
+    (result, report), inferred_seconds = timed(parse_dates, column)
+    (_, cached_report), cached_seconds = timed(parse_dates, column)
+    assert cached_report["cached"] and report["unparsed"] == 0
+
+    present = int(column.notna().sum())
+    print(f"{rows} lignes")
+    print(f"  to_datetime sans format : {reference_seconds:.2f} s, {present - int(expected.notna().sum())} dates perdues (NaT)")
+    print(f"  formats déduits         : {inferred_seconds:.2f} s, {report['unparsed']} dates perdues")
+    print(f"  formats en cache        : {cached_seconds:.2f} s")
+    print(f"  accélération            : x{reference_seconds / inferred_seconds:.1f}")
+    for fmt, count in report["formats"].items():
+        print(f"    {fmt:<10} {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ import pandas as pd
 import numpy as np
 from typing import Optional, Tuple, Dict, Any, List
 from dotenv import load_dotenv
+from app.services.sandbox import sandbox
 
 # Chargement de la clé API depuis le fichier .env
 load_dotenv()
@@ -206,20 +207,19 @@ RULES:
             rows_before = len(df)
             df_before = df.copy()
             
-            # Exécuter le code
-            local_vars = {
-                "df": df.copy(),
-                "pd": pd,
-                "np": np,
-                "re": re,
-                "calculate_basic_stats": calculate_basic_stats,
-                "calculate_frequencies": calculate_frequencies
-            }
-            
-            exec(gpt_response.code, {}, local_vars)
+            # Exécuter le code (processus isolé, pd / np / re disponibles)
+            outputs = await sandbox.run(
+                gpt_response.code,
+                frames={"df": df},
+                outputs=["result"],
+                helpers={
+                    "calculate_basic_stats": calculate_basic_stats,
+                    "calculate_frequencies": calculate_frequencies
+                }
+            )
             
             # Récupérer le résultat et le convertir en liste de dictionnaires
-            result_df = local_vars.get("result", None)
+            result_df = outputs.get("result", None)
             if result_df is not None and isinstance(result_df, pd.DataFrame):
                 kpi_data = result_df.to_dict('records')
             else:
@@ -4,18 +4,22 @@ from langgraph.graph import StateGraph
 from langchain_core.runnables import RunnableWithMessageHistory
 from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
 from langchain_community.chat_message_histories import ChatMessageHistory
-from typing import Dict, Any, TypedDict, List
+from typing import Dict, Any, TypedDict, List, Optional, Set
+import asyncio
 import pandas as pd
 import re
-import uuid
 from langchain_core.prompts import PromptTemplate
 from app.database.config import get_db
 from app.models.history_cleaning import ActionHistory
+from app.services.datasets import memory_store
+from app.services.history import DataFrameHistory
+from app.services.code_cache import CodeCache
+from app.services.sandbox import sandbox, SandboxError
+from app.services.intents import parse_intent, apply_intent
+from app.services.dtypes import optimize_dtypes
+from app.services.phones import phone_rules
 
-# 🧠 Mémoire de session
-memory_store = {}
-df_history_store = {}
-
+# 🧠 Historique des messages de chaque session (stores : voir datasets.py)
 def get_session_history(session_id: str):
     if session_id not in memory_store:
         memory_store[session_id] = ChatMessageHistory()
@@ -23,6 +27,8 @@ def get_session_history(session_id: str):
 
 # 🔮 LLM
 llm = ChatOpenAI(model="gpt-4-turbo", temperature=0)
+# 🧩 Codes déjà générés (schéma + instruction), persistés entre redémarrages
+code_cache = CodeCache()
 
 code_prompt = ChatPromptTemplate.from_messages([
     ("system", """
@@ -52,9 +58,9 @@ Code exécuté :
 ```python
 {code}
 """)
-def generate_title_description(instruction: str, code: str) -> Dict[str, str]:
+async def generate_title_description(instruction: str, code: str) -> Dict[str, str]:
     prompt_input = title_description_prompt.format(instruction=instruction, code=code)
-    response = llm.invoke(prompt_input)
+    response = await llm.ainvoke(prompt_input)
     
     match_title = re.search(r"Titre\s*:\s*(.*)", response.content)
     match_desc = re.search(r"Description\s*:\s*(.*)", response.content)
@@ -64,27 +70,86 @@ def generate_title_description(instruction: str, code: str) -> Dict[str, str]:
         "description": match_desc.group(1).strip() if match_desc else "Pas de description générée."
     }
 # 🔧 Génère du code à partir du prompt utilisateur
-def generate_code(df: pd.DataFrame, instruction: str) -> str:
+async def generate_code(df: pd.DataFrame, instruction: str) -> str:
     df_sample = df.head().to_string()
     chain = code_prompt | llm
-    result = chain.invoke({"instruction": instruction, "df_sample": df_sample})
+    result = await chain.ainvoke({"instruction": instruction, "df_sample": df_sample})
     match = re.search(r"```python(.*?)```", result.content, re.DOTALL)
     return match.group(1).strip() if match else ""
 
-def exec_code_on_df(code: str, df: pd.DataFrame) -> (pd.DataFrame, str):
-    local_vars = {"df": df.copy()}
+async def exec_code_on_df(code: str, df: pd.DataFrame) -> (pd.DataFrame, str):
+    # Exécution dans un processus isolé (timeout, limites CPU / mémoire) : voir sandbox.py
     try:
-        exec(code, {"pd": pd}, local_vars)
+        result = await sandbox.run(code, frames={"df": df}, outputs=["df"])
 
         # ✅ On récupère toujours `df`, qu'il ait été modifié ou non
-        df_result = local_vars.get("df", df)
+        df_result = result.get("df", df)
         return df_result, f"✅ Action appliquée avec succès.\n\n```python\n{code}\n```"
-    except Exception as e:
+    except SandboxError as e:
         return df, f"❌ Erreur : {str(e)}"
 
 
+# 📥 Sauvegarde BDD (synchrone : appelée via asyncio.to_thread)
+def save_action(session_id: str, instruction: str, code: str,
+                title: Optional[str] = None, description: Optional[str] = None) -> Optional[int]:
+    db = None
+    try:
+      db = next(get_db())  # ✅ Récupère la vraie session depuis le générateur        
+      action = ActionHistory(
+        session_id=session_id,
+        instruction=instruction,
+        generated_code=code,
+        title=title,
+        description=description
+    )
+      db.add(action)
+      db.commit()
+      return action.id
+    except Exception as e:
+      print(f"❌ Erreur DB: {e}")
+      return None
+    finally:
+      if db is not None:
+        db.close()
+
+def update_action_meta(action_id: int, title: str, description: str) -> None:
+    db = None
+    try:
+      db = next(get_db())
+      action = db.get(ActionHistory, action_id)
+      if action is not None:
+        action.title = title
+        action.description = description
+        db.commit()
+    except Exception as e:
+      print(f"❌ Erreur DB: {e}")
+    finally:
+      if db is not None:
+        db.close()
+
+# 🏷️ Titre / description générés après la réponse, puis écrits sur la ligne ActionHistory
+_background_tasks: Set[asyncio.Task] = set()
+
+async def describe_action(action_id: Optional[int], instruction: str, code: str) -> None:
+    try:
+        meta = await generate_title_description(instruction, code)
+    except Exception as e:
+        print(f"❌ Erreur génération titre/description: {e}")
+        return
+    title, description = meta["title"], meta["description"]
+    print("🔖", title)
+    print("📝", description)
+    if action_id is not None:
+        await asyncio.to_thread(update_action_meta, action_id, title, description)
+
+def schedule_describe_action(action_id: Optional[int], instruction: str, code: str) -> None:
+    task = asyncio.create_task(describe_action(action_id, instruction, code))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
 # 🔁 Nœud principal LangGraph avec gestion de l'annulation
-def decide_and_apply(state: Dict[str, Any]) -> Dict[str, Any]:
+async def decide_and_apply(state: Dict[str, Any]) -> Dict[str, Any]:
     messages = state.get("messages", [])
     if not messages or not isinstance(messages[-1], HumanMessage):
         return {
@@ -94,13 +159,13 @@ def decide_and_apply(state: Dict[str, Any]) -> Dict[str, Any]:
                 "df": state["df"],
                 "message": "❌ Aucun message utilisateur valide.",
                 "session_id": state["session_id"],
-                "df_history": state.get("df_history", [state["df"].copy()])
+                "df_history": state.get("df_history", DataFrameHistory(state["df"]))
             }
         }
 
     instruction = messages[-1].content
     df = state["df"]
-    df_history = state.get("df_history", [df.copy()])
+    df_history = state.get("df_history", DataFrameHistory(df))
 
     # 🔙 Undo
     cancel_keywords = ["undo", "annule", "reviens", "revenir", "retour", "revient", "revenir en arrière"]
@@ -132,47 +197,54 @@ def decide_and_apply(state: Dict[str, Any]) -> Dict[str, Any]:
                 }
             }
 
-    # 💬 Appel LLM
-    code = generate_code(df, instruction)
-    
-    if not code.strip():
-        response = llm.invoke(messages)
-        return {
-            **state,
-            "message": response.content,
-            "df_history": df_history,
-            "output": {
-                "df": df,
+    # 🧭 Demande simple reconnue localement : fonction de cleaner.py, sans LLM
+    intent = parse_intent(instruction, df)
+    if intent is not None:
+        code = intent.code
+        try:
+            # Settings de l'organisation (pays téléphoniques...) : voir pipeline.plan_settings
+            df_new = await asyncio.to_thread(apply_intent, df, intent, phone_rules(state.get("settings")))
+            message = f"✅ Action appliquée avec succès.\n\n```python\n{code}\n```"
+        except Exception as e:
+            df_new, message = df, f"❌ Erreur : {str(e)}"
+        if df_new is not df:
+            df_new, _ = await asyncio.to_thread(optimize_dtypes, df_new)
+        df_history.append(df_new)
+        await asyncio.to_thread(
+            save_action, state["session_id"], instruction, code, intent.title, intent.description
+        )
+    else:
+        # 💬 Appel LLM (sauf si la même demande a déjà été traitée sur ce schéma)
+        # Cache propre à l'organisation (le code peut reprendre des valeurs de ses données),
+        # à la session pour un utilisateur sans organisation
+        cache_scope = state.get("organization_id") or f"session:{state['session_id']}"
+        cached_code = code_cache.lookup(df, instruction, cache_scope)
+        code = cached_code if cached_code is not None else await generate_code(df, instruction)
+        
+        if not code.strip():
+            response = await llm.ainvoke(messages)
+            return {
+                **state,
                 "message": response.content,
-                "session_id": state["session_id"],
-                "df_history": df_history
+                "df_history": df_history,
+                "output": {
+                    "df": df,
+                    "message": response.content,
+                    "session_id": state["session_id"],
+                    "df_history": df_history
+                }
             }
-        }
-
-    df_new, message = exec_code_on_df(code, df)
-    meta = generate_title_description(instruction, code)
-    title, description = meta["title"], meta["description"]
 
-    # Tu peux maintenant logger, afficher ou sauvegarder ça :
-    print("🔖", title)
-    print("📝", description)
-    df_history.append(df_new.copy()) 
-# 📥 Sauvegarde BDD
-    try:
-      db = next(get_db())  # ✅ Récupère la vraie session depuis le générateur        
-      action = ActionHistory(
-        session_id=state["session_id"],
-        instruction=instruction,
-        generated_code=code,
-        title=title,
-        description=description
-    )
-      db.add(action)
-      db.commit()
-    except Exception as e:
-      print(f"❌ Erreur DB: {e}")
-    finally:
-      db.close()
+        # Exécution hors de la boucle d'événements : les autres requêtes ne sont pas bloquées
+        df_new, message = await exec_code_on_df(code, df)
+        if cached_code is None and not message.startswith("❌"):
+            code_cache.store(df, instruction, code, cache_scope)
+        if df_new is not df:
+            # Le sandbox rend des types « de calcul » : retour aux types compacts
+            df_new, _ = await asyncio.to_thread(optimize_dtypes, df_new)
+        df_history.append(df_new)
+        action_id = await asyncio.to_thread(save_action, state["session_id"], instruction, code)
+        schedule_describe_action(action_id, instruction, code)
     return {
         "df": df_new,
         "df_history": df_history,
@@ -192,11 +264,13 @@ def decide_and_apply(state: Dict[str, Any]) -> Dict[str, Any]:
 # 📦 État de la session avec historique
 class AppState(TypedDict):
     df: pd.DataFrame
-    df_history: List[pd.DataFrame]
+    df_history: DataFrameHistory
     messages: List[BaseMessage]
     session_id: str
     message: str
     chat_history: List[BaseMessage]
+    settings: Dict[str, Any]
+    organization_id: Optional[str]
 
 # 🔁 Graphe LangGraph
 def build_graph():
@@ -16,36 +16,153 @@ openai.api_key = os.getenv("OPENAI_API_KEY", "")
 
 # --- 🔌 Fonctions d'enrichissement disponibles ---
 from app.services.enrichment import enrich_with_lookup, add_concatenated_column
+from app.services.phones import PhoneRules, normalize_phones
+from app.services.dates import format_dates, parse_dates
 
 # --- 🧹 Fonctions de nettoyage manuelles ---
 
 def remove_duplicates(df: pd.DataFrame) -> pd.DataFrame:
     return df.drop_duplicates()
 
+def remove_empty_rows(df: pd.DataFrame) -> pd.DataFrame:
+    # Une cellule ne contenant que des espaces compte comme vide
+    blank = df.isna() | df.apply(lambda col: col.astype(str).str.strip().eq(""))
+    return df[~blank.all(axis=1)]
+
+# Versions "colonne" (Series -> Series) : utilisées telles quelles par pipeline.py
+def clear_values(values: pd.Series) -> pd.Series:
+    return pd.Series('', index=values.index, name=values.name)
+
+def format_phone_values(values: pd.Series, rules: Optional[PhoneRules] = None, country: Optional[str] = None) -> pd.Series:
+    # E.164 ; pays par défaut : PHONE_DEFAULT_COUNTRY ou celui de l'organisation (voir phones.py)
+    return normalize_phones(values, rules, country)[0]
+
+def standardize_date_values(values: pd.Series, output_format: str = "%Y-%m-%d", dayfirst: bool = True) -> pd.Series:
+    # Formats déduits et lus un par un (voir dates.py) : pas de NaT silencieux sur un mélange FR / ISO
+    return format_dates(parse_dates(values, dayfirst)[0], output_format)
+
+def capitalize_values(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.title()
+
 def clear_column(df: pd.DataFrame, column: str) -> pd.DataFrame:
     if column in df.columns:
-        df[column] = ''
+        df[column] = clear_values(df[column])
     return df
 
-def format_phone_column(df: pd.DataFrame, column: str) -> pd.DataFrame:
+def format_phone_column(df: pd.DataFrame, column: str, rules: Optional[PhoneRules] = None) -> pd.DataFrame:
     if column in df.columns:
-        df[column] = df[column].astype(str).apply(lambda x: re.sub(r'\D', '', x))
-        df[column] = df[column].str.replace(r'^0', '+212', regex=True)
+        df[column] = format_phone_values(df[column], rules)
     return df
 
 def standardize_date_column(df: pd.DataFrame, column: str, output_format: str = "%Y-%m-%d") -> pd.DataFrame:
     if column in df.columns:
-        df[column] = pd.to_datetime(df[column], errors='coerce').dt.strftime(output_format)
+        df[column] = standardize_date_values(df[column], output_format)
     return df
 
 def capitalize_text_column(df: pd.DataFrame, column: str) -> pd.DataFrame:
     if column in df.columns:
-        df[column] = df[column].astype(str).str.title()
+        df[column] = capitalize_values(df[column])
     return df
 
+def _clean_value(val):
+    """Rend une cellule sérialisable en JSON (règles historiques, appliquées cellule par cellule)."""
+    try:
+        if pd.isna(val):  # Vérifie NaN, None, etc.
+            return None
+        if isinstance(val, (np.integer, np.floating)):
+            val = val.item()  # Convertit les types numpy en types Python natifs
+        if isinstance(val, (float, int)):
+            if math.isinf(val) or math.isnan(val):
+                return str(val)
+            # Vérifier si le nombre est trop grand pour JSON
+            if abs(val) > 1e308:  # Limite max de JSON
+                return str(val)
+        if isinstance(val, (dict, list)):
+            try:
+                return json.dumps(val)  # Convertit les objets complexes en JSON
+            except:
+                return str(val)  # Fallback en string si la conversion JSON échoue
+        # Test final de sérialisation JSON
+        json.dumps(val)  # Si ça échoue, on convertit en string
+        return val
+    except:
+        return str(val)  # Conversion en string pour toute valeur problématique
+
+def _clean_float_column(col: pd.Series) -> pd.Series:
+    values = col.to_numpy().astype("float64", copy=False)
+    with np.errstate(invalid="ignore"):
+        too_large = np.abs(values) > 1e308  # inclut ±inf
+    if not too_large.any():
+        # NaN -> None -> NaN : la colonne ressort identique (en float64, comme avec map)
+        return col.astype("float64")
+    out = values.astype(object)
+    out[np.isnan(values)] = None
+    out[too_large] = [str(float(v)) for v in values[too_large]]
+    return pd.Series(out, index=col.index, name=col.name).infer_objects()
+
+def _clean_object_values(col: pd.Series) -> pd.Series:
+    values = col.to_numpy()
+    out = values.copy()
+    kinds = np.frompyfunc(type, 1, 1)(values)
+    is_str = kinds == str
+    is_none = kinds == type(None)
+    is_float = kinds == float
+    is_int = kinds == int
+
+    # Flottants Python : NaN -> None, inf / trop grands -> str, le reste inchangé
+    if is_float.any():
+        floats = values[is_float].astype("float64")
+        with np.errstate(invalid="ignore"):
+            too_large = np.abs(floats) > 1e308
+        cleaned = floats.astype(object)
+        cleaned[np.isnan(floats)] = None
+        cleaned[too_large] = [str(float(v)) for v in floats[too_large]]
+        out[is_float] = cleaned
+    out[is_none] = None
+
+    # Entiers Python : seuls les très grands (> 1e308) changent, on les laisse à _clean_value
+    if is_int.any():
+        positions = np.flatnonzero(is_int)
+        try:
+            huge = np.abs(values[positions].astype("float64")) > 1e300
+        except OverflowError:
+            huge = np.ones(len(positions), dtype=bool)
+        for i in positions[huge]:
+            out[i] = _clean_value(values[i])
+
+    # Tout le reste (bool, Timestamp, dict, list, Decimal, pd.NA...) : règles cellule par cellule
+    for i in np.flatnonzero(~(is_str | is_none | is_float | is_int)):
+        out[i] = _clean_value(values[i])
+    return pd.Series(out, index=col.index, name=col.name).infer_objects()
+
+def _clean_column(col: pd.Series) -> pd.Series:
+    dtype = col.dtype
+    if not len(col):
+        return col.map(_clean_value)
+    if isinstance(dtype, np.dtype):
+        if dtype.kind == "b":
+            return col.copy()
+        if dtype.kind in "iu":
+            # Entiers numpy : toujours sérialisables ; map les ressortait en int64
+            # (uint64 seulement au-delà de la borne int64)
+            if dtype == np.int64 or (dtype == np.uint64 and (col.to_numpy() > np.iinfo(np.int64).max).any()):
+                return col.copy()
+            return col.astype("int64")
+        if dtype.kind == "f":
+            return _clean_float_column(col)
+        if dtype.kind == "O":
+            return _clean_object_values(col)
+    elif isinstance(dtype, pd.StringDtype) and dtype.na_value is np.nan:
+        # Chaînes ("str" de pandas 3) : déjà sérialisables, manquants restés NaN
+        return col.copy()
+    # Catégories, dates, dtypes d'extension : comportement d'origine
+    return col.map(_clean_value)
+
 def clean_numeric_values(df: pd.DataFrame) -> pd.DataFrame:
     """
     Nettoie les valeurs numériques non conformes à JSON dans un DataFrame.
+    Traitement par dtype : vectorisé pour les colonnes numériques, et seules les
+    cellules qui ne sont pas de simples str / int / float passent par _clean_value.
     
     Args:
         df: DataFrame à nettoyer
@@ -53,35 +170,12 @@ def clean_numeric_values(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         DataFrame nettoyé
     """
-    def clean_value(val):
-        try:
-            if pd.isna(val):  # Vérifie NaN, None, etc.
-                return None
-            if isinstance(val, (np.integer, np.floating)):
-                val = val.item()  # Convertit les types numpy en types Python natifs
-            if isinstance(val, (float, int)):
-                if math.isinf(val) or math.isnan(val):
-                    return str(val)
-                # Vérifier si le nombre est trop grand pour JSON
-                if abs(val) > 1e308:  # Limite max de JSON
-                    return str(val)
-            if isinstance(val, (dict, list)):
-                try:
-                    return json.dumps(val)  # Convertit les objets complexes en JSON
-                except:
-                    return str(val)  # Fallback en string si la conversion JSON échoue
-            # Test final de sérialisation JSON
-            json.dumps(val)  # Si ça échoue, on convertit en string
-            return val
-        except:
-            return str(val)  # Conversion en string pour toute valeur problématique
-
     # Créer une copie pour éviter les modifications en place
     df_clean = df.copy()
     
     # Appliquer le nettoyage à chaque colonne
     for col in df_clean.columns:
-        df_clean[col] = df_clean[col].map(clean_value)
+        df_clean[col] = _clean_column(df_clean[col])
         
     return df_clean
 
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+import pandas as pd
+
+# --- 🧩 Cache du code pandas généré ---
+#
+# Clé = périmètre (organisation : le code généré peut contenir des valeurs
+# vues dans ses données, via df.head()) + empreinte du schéma (noms + dtypes
+# des colonnes) + instruction réduite
+# à ce qui peut changer le code (instruction_key) : espaces et ponctuation de
+# phrase ignorés, majuscule du premier mot aussi ; comparaisons, signes,
+# nombres, valeurs entre guillemets et casse des autres mots conservés, pour
+# ne jamais confondre "age > 30" et "age < 30", ">= -5" et ">= 5", "N/A" et
+# "n a". Deux niveaux :
+#   - exact   : même périmètre, même schéma, même clé d'instruction ;
+#   - similar : même périmètre, même schéma, instruction proche (Jaccard sur trigrammes de
+#               caractères >= CODE_CACHE_SIMILARITY) et mêmes radicaux de mots,
+#               pour accepter "supprimer les doublons" mais ne pas confondre
+#               "supprime la colonne A" et "supprime la colonne B" (nombres,
+#               valeurs et symboles doivent être identiques).
+# Les entrées sont persistées dans SQLite et évincées en LRU.
+
+CODE_CACHE_PATH = os.getenv("CODE_CACHE_PATH", os.path.join(tempfile.gettempdir(), "tervela_code_cache.db"))
+CODE_CACHE_MAX_ENTRIES = int(os.getenv("CODE_CACHE_MAX_ENTRIES", "5000"))
+CODE_CACHE_SIMILARITY = float(os.getenv("CODE_CACHE_SIMILARITY", "0.75"))
+# Incrémenté quand la clé change (instruction_key, périmètre...) : les entrées déjà persistées ne valent plus
+CODE_CACHE_KEY_VERSION = 3
+
+Key = Tuple[str, str, str]  # (périmètre, empreinte du schéma, clé d'instruction)
+
+_LITERAL = r"""(?<!\w)'[^']*'(?!\w)|"[^"]*"|«[^»]*»|“[^”]*”"""
+_INSTRUCTION_TOKEN = re.compile(
+    rf"""{_LITERAL}             # valeurs entre guillemets, telles quelles
+    |[<>]=?|[!=]=|=|[≤≥≠]          # comparaisons
+    |(?<!\w)[-+]?\d+(?:[.,]\d+)*%? # nombres signés
+    |\w+(?:['’]\w+)*              # mots (élisions comprises : l'âge, O'Brien)
+    |[^\w\s.,;:!?…]               # autres symboles (/, @, *, -...)
+    """,
+    re.VERBOSE,
+)
+_KEY_TOKEN = re.compile(rf"{_LITERAL}|\S+")
+
+
+def normalize_instruction(instruction: str) -> str:
+    """'Supprime  les doublons !' -> 'supprime les doublons' (reconnaissance des instructions, intents.py)."""
+    text = unicodedata.normalize("NFKD", instruction.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"[a-z0-9_]+", text))
+
+
+def instruction_key(instruction: str) -> str:
+    """'Supprime les lignes où Age >= -5 !' -> 'supprime les lignes où Age >= -5'."""
+    tokens = _INSTRUCTION_TOKEN.findall(unicodedata.normalize("NFC", instruction))
+    if tokens and tokens[0][1:].islower() and tokens[0][:1].isupper():
+        tokens[0] = tokens[0].lower()  # Majuscule de début de phrase
+    return " ".join(tokens)
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    schema = "|".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items())
+    return hashlib.sha1(schema.encode()).hexdigest()
+
+
+def _trigrams(text: str) -> FrozenSet[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _stems(text: str) -> Tuple[FrozenSet[str], Tuple[str, ...]]:
+    """
+    Radicaux grossiers (5 premiers caractères) des mots en minuscules : seules
+    leurs flexions peuvent différer. Nombres, valeurs, symboles et mots avec
+    majuscules restent entiers et dans leur ordre ("Paris par PARIS" != "PARIS par Paris").
+    """
+    tokens = _KEY_TOKEN.findall(text)
+    words = frozenset(token[:5] for token in tokens if token.isalpha() and token.islower())
+    return words, tuple(token for token in tokens if not (token.isalpha() and token.islower()))
+
+
+class CodeCache:
+    """Cache LRU persistant des codes générés, avec recherche exacte puis par similarité."""
+
+    def __init__(self, path: str = CODE_CACHE_PATH, max_entries: int = CODE_CACHE_MAX_ENTRIES,
+                 similarity: float = CODE_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self._entries: "OrderedDict[Key, str]" = OrderedDict()
+        self._trigrams: Dict[Key, FrozenSet[str]] = {}
+        self._lock = threading.RLock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] < CODE_CACHE_KEY_VERSION:
+            # Clés calculées autrement (instructions confondues, sans périmètre) : on repart de zéro
+            self._db.execute("DROP TABLE IF EXISTS code_cache")
+            self._db.execute(f"PRAGMA user_version = {CODE_CACHE_KEY_VERSION}")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS code_cache (
+                scope TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                instruction TEXT NOT NULL,
+                code TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (scope, fingerprint, instruction)
+            )
+        """)
+        self._db.commit()
+        for scope, fingerprint, instruction, code in self._db.execute(
+            "SELECT scope, fingerprint, instruction, code FROM code_cache ORDER BY last_used"
+        ):
+            self._remember((scope, fingerprint, instruction), code)
+
+    def _remember(self, key: Key, code: str) -> None:
+        self._entries[key] = code
+        self._entries.move_to_end(key)
+        self._trigrams[key] = _trigrams(key[2])
+
+    def _touch(self, key: Key) -> None:
+        self._entries.move_to_end(key)
+        self._db.execute(
+            "UPDATE code_cache SET last_used = ? WHERE scope = ? AND fingerprint = ? AND instruction = ?",
+            (time.time(), *key),
+        )
+        self._db.commit()
+
+    def lookup(self, df: pd.DataFrame, instruction: str, scope: str) -> Optional[str]:
+        """Retourne le code mis en cache pour ce périmètre (organisation), ce schéma et cette instruction, sinon None."""
+        fingerprint = schema_fingerprint(df)
+        normalized = instruction_key(instruction)
+        key = (scope, fingerprint, normalized)
+        with self._lock:
+            if key in self._entries:
+                self.exact_hits += 1
+                self._touch(key)
+                return self._entries[key]
+
+            grams = _trigrams(normalized)
+            stems = _stems(normalized)
+            best, best_score = None, self.similarity
+            for candidate, candidate_grams in self._trigrams.items():
+                if candidate[:2] != key[:2]:
+                    continue
+                score = len(grams & candidate_grams) / len(grams | candidate_grams)
+                if score >= best_score and _stems(candidate[2]) == stems:
+                    best, best_score = candidate, score
+            if best is not None:
+                self.similar_hits += 1
+                self._touch(best)
+                return self._entries[best]
+
+            self.misses += 1
+            return None
+
+    def store(self, df: pd.DataFrame, instruction: str, code: str, scope: str) -> None:
+        key = (scope, schema_fingerprint(df), instruction_key(instruction))
+        with self._lock:
+            self._remember(key, code)
+            self._db.execute(
+                "INSERT OR REPLACE INTO code_cache (scope, fingerprint, instruction, code, last_used) VALUES (?, ?, ?, ?, ?)",
+                (*key, code, time.time()),
+            )
+            while len(self._entries) > self.max_entries:
+                victim, _ = self._entries.popitem(last=False)
+                del self._trigrams[victim]
+                self._db.execute(
+                    "DELETE FROM code_cache WHERE scope = ? AND fingerprint = ? AND instruction = ?", victim
+                )
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,38 @@
+import uuid
+from typing import Optional
+import pandas as pd
+
+from app.services.session_backends import create_session_backend
+
+# --- 📦 Jeux de données et état de session ---
+#
+# Module léger (ni LLM, ni LangGraph, ni modèles SQLAlchemy) : importé par
+# l'ingestion et le streaming, y compris dans les processus du pool de tâches.
+
+# 🧠 Mémoire de session (bornée : budget mémoire, TTL d'inactivité, éviction LRU)
+# SESSION_BACKEND=disk|redis la partage entre workers (voir session_backends.py)
+session_store = create_session_backend()
+memory_store = session_store.namespace("messages")
+df_history_store = session_store.namespace("df_history")
+# 🔢 Version courante du DataFrame de chaque session (incrémentée à chaque changement)
+df_version_store = session_store.namespace("df_version")
+# 📦 Jeux de données chargés une seule fois (quick-upload), référencés par dataset_id
+dataset_store = session_store.namespace("dataset")
+# 🗜️ Conversions de types faites à l'entrée (session ou dataset_id), voir dtypes.py
+dtype_store = session_store.namespace("dtypes")
+
+def prepare_initial_df(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalise un DataFrame fraîchement chargé : cellules vides -> None, lignes vides supprimées."""
+    df = df.replace(r'^\s*$', None, regex=True)
+    df = df.where(pd.notnull(df), None)
+    df.dropna(how="all", inplace=True)
+    return df
+
+def register_dataset(df: pd.DataFrame, dataset_id: Optional[str] = None) -> str:
+    """Conserve un DataFrame côté serveur et retourne son identifiant."""
+    dataset_id = dataset_id or str(uuid.uuid4())
+    dataset_store[dataset_id] = df
+    return dataset_id
+
+def get_dataset(dataset_id: str) -> Optional[pd.DataFrame]:
+    return dataset_store.get(dataset_id)
@@ -0,0 +1,227 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# --- 📅 Lecture des dates multi-formats ---
+#
+# pd.to_datetime sans format devine le format sur la première valeur : dans une
+# colonne qui mélange "05/01/2024" et "2024-01-05", le reste devient NaT sans
+# bruit. Ici les formats sont d'abord déduits d'un échantillon des valeurs
+# distinctes (couverture gloutonne : le format qui lit le plus de valeurs, puis
+# le suivant sur le reste...), puis chaque groupe est lu en une passe avec son
+# format explicite. Les valeurs ne sont lues qu'une fois par valeur distincte.
+# Les formats déduits sont mis en cache par empreinte de colonne (nom + formes
+# des valeurs, "99/99/9999") : un export déjà vu saute la déduction ; si des
+# valeurs restent illisibles, la déduction reprend sur elles seules.
+# Les jours passent avant les mois ("03/04/2024" = 3 avril) sauf dayfirst=False.
+# Le résultat garde l'unité rendue par pandas (us, ns...) : "9999-12-31" ou
+# "0001-01-01" ne tiennent pas en nanosecondes et ne doivent pas déborder.
+
+DATE_SAMPLE_SIZE = 1000
+DATE_FORMAT_CACHE_SIZE = 1024
+TIME_UNITS = ("ns", "us", "ms", "s")  # de la plus fine à la plus large
+
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y/%m/%d",
+    "%d/%m/%Y",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y %H:%M:%S",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+    "%d %m %Y",
+    "%d/%m/%y",
+    "%m/%d/%Y",
+    "%m/%d/%Y %H:%M",
+    "%m-%d-%Y",
+    "%m/%d/%y",
+    "%d %B %Y",
+    "%B %d, %Y",
+    "%Y%m%d",
+)
+DAY_FIRST = {"%d/%m/%Y": "%m/%d/%Y", "%d/%m/%Y %H:%M": "%m/%d/%Y %H:%M", "%d-%m-%Y": "%m-%d-%Y", "%d/%m/%y": "%m/%d/%y"}
+
+# Mois en toutes lettres (français) -> numéro, lus ensuite par "%d %m %Y"
+FRENCH_MONTHS = {
+    "01": "janvier|janv", "02": "février|fevrier|févr|fevr|fév|fev", "03": "mars", "04": "avril|avr",
+    "05": "mai", "06": "juin", "07": "juillet|juil", "08": "août|aout", "09": "septembre|sept",
+    "10": "octobre|oct", "11": "novembre|nov", "12": "décembre|decembre|déc|dec",
+}
+
+
+def _candidates(dayfirst: bool) -> List[str]:
+    if dayfirst:
+        return list(DATE_FORMATS)
+    month_first = {month: day for day, month in DAY_FIRST.items()}
+    return [DAY_FIRST.get(fmt) or month_first.get(fmt) or fmt for fmt in DATE_FORMATS]
+
+
+def _normalize_text(text: pd.Series) -> pd.Series:
+    text = text.str.strip()
+    if not text.str.contains(r"[^\W\d_]", regex=True).any():
+        return text
+    # "1er janvier 2024" -> "1 01 2024" ; les mois anglais restent pour %B
+    text = text.str.lower().str.replace(r"(\d)er\b", r"\1", regex=True)
+    for number, names in FRENCH_MONTHS.items():
+        text = text.str.replace(rf"\b(?:{names})\b\.?", f" {number} ", regex=True)
+    return text.str.replace(r"\s+", " ", regex=True).str.strip()
+
+
+def _shapes(sample: pd.Series) -> List[str]:
+    shapes = sample.str.replace(r"\d", "9", regex=True).str.replace(r"[^\W\d_]+", "a", regex=True)
+    return sorted(set(shapes.dropna()))
+
+
+def column_fingerprint(name: Any, sample: pd.Series, dayfirst: bool = True) -> str:
+    """
+    Empreinte d'une colonne de dates : nom normalisé + ordre jour/mois + formes
+    des valeurs de l'échantillon ("03/04/2024" se lit différemment selon dayfirst).
+    """
+    key = "\n".join([str(name or "").strip().lower(), "dayfirst" if dayfirst else "monthfirst", *_shapes(sample)])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _sample(text: pd.Series) -> pd.Series:
+    if len(text) <= DATE_SAMPLE_SIZE:
+        return text
+    return text.iloc[np.linspace(0, len(text) - 1, DATE_SAMPLE_SIZE).astype(int)]
+
+
+def infer_formats(sample: pd.Series, dayfirst: bool = True) -> List[str]:
+    """Formats qui lisent l'échantillon, du plus couvrant au moins couvrant."""
+    coverage = {
+        fmt: pd.to_datetime(sample, format=fmt, errors="coerce").notna().to_numpy()
+        for fmt in _candidates(dayfirst)
+    }
+    remaining = np.ones(len(sample), dtype=bool)
+    chosen: List[str] = []
+    while remaining.any():
+        # À couverture égale, l'ordre des candidats décide (jour avant mois)
+        best = max(coverage, key=lambda fmt: int((coverage[fmt] & remaining).sum()))
+        gained = coverage[best] & remaining
+        if not gained.any():
+            break
+        chosen.append(best)
+        remaining &= ~gained
+    return chosen
+
+
+class FormatCache:
+    """Formats déduits par empreinte de colonne (LRU, par processus)."""
+
+    def __init__(self, max_entries: int = DATE_FORMAT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            formats = self._entries.get(key)
+            if formats is not None:
+                self._entries.move_to_end(key)
+            return formats
+
+    def set(self, key: str, formats: List[str]) -> None:
+        with self._lock:
+            self._entries[key] = formats
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+format_cache = FormatCache()
+
+
+Parsed = List[Tuple[np.ndarray, np.ndarray]]  # (positions, dates dans l'unité rendue par pandas)
+
+
+def _parse_with(text: pd.Series, formats: List[str], labels: np.ndarray, parsed: Parsed, first_label: int) -> None:
+    for i, fmt in enumerate(formats, start=first_label):
+        todo = labels == -1
+        if not todo.any():
+            return
+        result = pd.to_datetime(text[todo], format=fmt, errors="coerce")
+        ok = result.notna().to_numpy()
+        rows = np.flatnonzero(todo)[ok]
+        parsed.append((rows, result.to_numpy()[ok]))
+        labels[rows] = i
+
+
+def _assemble(parsed: Parsed, size: int) -> np.ndarray:
+    """Dates lues par les différents formats, dans l'unité la plus fine qui les contient toutes."""
+    units = {np.datetime_data(dates.dtype)[0] for _, dates in parsed}
+    finest = next((i for i, unit in enumerate(TIME_UNITS) if unit in units), 0)
+    for unit in TIME_UNITS[finest:]:
+        try:
+            pieces = [(rows, pd.DatetimeIndex(dates).as_unit(unit).to_numpy()) for rows, dates in parsed]
+        except pd.errors.OutOfBoundsDatetime:
+            continue  # Date hors de portée dans cette unité : unité plus large (jamais pour "s")
+        break
+    result = np.full(size, np.datetime64("NaT"), dtype=f"datetime64[{unit}]")
+    for rows, dates in pieces:
+        result[rows] = dates
+    return result
+
+
+def parse_dates(values: pd.Series, dayfirst: bool = True) -> Tuple[pd.Series, Dict[str, Any]]:
+    """
+    (dates en datetime64, rapport) ; le rapport donne le nombre de valeurs lues
+    par chaque format, les valeurs illisibles (NaT) et manquantes, et si les
+    formats viennent du cache.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        present = int(values.notna().sum())
+        return values, {"formats": {"datetime": present}, "unparsed": 0, "missing": len(values) - present, "cached": True}
+
+    codes, uniques = pd.factorize(values)
+    if not len(uniques):
+        empty = pd.Series(np.full(len(values), np.datetime64("NaT"), dtype="datetime64[ns]"), index=values.index, name=values.name)
+        return empty, {"formats": {}, "unparsed": 0, "missing": len(values), "cached": False}
+    text = _normalize_text(pd.Series(uniques, dtype=object).astype(str))
+    sample = _sample(text)
+    key = column_fingerprint(values.name, sample, dayfirst)
+    formats = format_cache.get(key)
+    cached = formats is not None
+    if formats is None:
+        formats = infer_formats(sample, dayfirst)
+
+    labels = np.full(len(text), -1, dtype=np.int64)
+    parsed: Parsed = []
+    _parse_with(text, formats, labels, parsed, 0)
+    if cached and (labels == -1).any():
+        # Valeurs d'une forme déjà vue mais d'un format absent du cache (mois > 12...)
+        extra = [fmt for fmt in infer_formats(_sample(text[labels == -1]), dayfirst) if fmt not in formats]
+        _parse_with(text, extra, labels, parsed, len(formats))
+        formats = formats + extra
+        cached = not extra
+    if not cached:
+        format_cache.set(key, formats)
+
+    counts = np.bincount(codes[codes >= 0], minlength=len(text))
+    report = {
+        "formats": {fmt: int(counts[labels == i].sum()) for i, fmt in enumerate(formats)},
+        "unparsed": int(counts[labels == -1].sum()),
+        "missing": int((codes < 0).sum()),
+        "cached": cached,
+    }
+    dates = _assemble(parsed, len(text))
+    dates = np.where(codes >= 0, dates[codes], np.datetime64("NaT"))
+    return pd.Series(dates, index=values.index, name=values.name), report
+
+
+def format_dates(dates: pd.Series, output_format: str) -> pd.Series:
+    """dt.strftime, avec les années avant 1000 sur quatre chiffres ("0001" et non "1", strftime de la libc)."""
+    text = dates.dt.strftime(output_format)
+    if "%Y" in output_format:
+        early = (dates.dt.year < 1000).to_numpy()
+        if early.any():
+            text[early] = [date.strftime(output_format.replace("%Y", f"{date.year:04d}")) for date in dates[early]]
+    return text
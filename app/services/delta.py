@@ -0,0 +1,137 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from app.services.wire import encode_frame
+
+# --- 🔀 Différences structurelles entre deux versions d'un DataFrame ---
+#
+# Les lignes sont identifiées par leur label d'index : une delta n'est calculable
+# que si les deux index sont uniques.
+
+
+@dataclass
+class FrameDelta:
+    """Changements permettant de passer d'une version `old` à une version `new`."""
+    removed: pd.Index
+    inserted: pd.DataFrame
+    columns: Dict[Any, pd.Series] = field(default_factory=dict)
+    dropped_columns: List[Any] = field(default_factory=list)
+    column_order: List[Any] = field(default_factory=list)
+    row_order: Optional[pd.Index] = None
+
+    def cell_count(self) -> int:
+        """Nombre approximatif de cellules transportées par la delta."""
+        cells = len(self.removed) + self.inserted.size
+        cells += sum(len(s) for s in self.columns.values())
+        if self.row_order is not None:
+            cells += len(self.row_order)
+        return cells
+
+    def is_empty(self) -> bool:
+        return (
+            len(self.removed) == 0
+            and len(self.inserted) == 0
+            and not self.columns
+            and not self.dropped_columns
+            and self.row_order is None
+        )
+
+
+def _same_buffer(a: pd.Series, b: pd.Series) -> bool:
+    """Vrai si les deux colonnes pointent sur le même buffer numpy (colonne non touchée, Copy-on-Write)."""
+    if not (isinstance(a.dtype, np.dtype) and isinstance(b.dtype, np.dtype)):
+        return False
+    va, vb = a.to_numpy(copy=False), b.to_numpy(copy=False)
+    return (
+        va.shape == vb.shape
+        and va.strides == vb.strides
+        and va.__array_interface__["data"][0] == vb.__array_interface__["data"][0]
+    )
+
+
+def compute_delta(old: pd.DataFrame, new: pd.DataFrame) -> Optional[FrameDelta]:
+    """
+    Calcule la delta old -> new : lignes supprimées, lignes insérées, colonnes remplacées.
+    Retourne None si les index ne permettent pas d'identifier les lignes.
+    """
+    if not (old.index.is_unique and new.index.is_unique):
+        return None
+    if not (old.columns.is_unique and new.columns.is_unique):
+        return None
+
+    removed = old.index.difference(new.index, sort=False)
+    inserted_labels = new.index.difference(old.index, sort=False)
+    kept_index = old.index.drop(removed) if len(removed) else old.index
+    expected_order = kept_index.append(inserted_labels) if len(inserted_labels) else kept_index
+    row_order = None if new.index.equals(expected_order) else new.index
+
+    same_rows = len(removed) == 0 and len(inserted_labels) == 0
+    columns = {}
+    for col in new.columns:
+        if col not in old.columns:
+            columns[col] = new[col]
+            continue
+        old_col, new_col = old[col], new[col]
+        if old_col.dtype != new_col.dtype:
+            columns[col] = new_col
+            continue
+        if same_rows and row_order is None and _same_buffer(old_col, new_col):
+            continue
+        if same_rows:
+            unchanged = old_col.equals(new_col.reindex(old.index)) if row_order is not None else old_col.equals(new_col)
+        else:
+            unchanged = old_col.reindex(kept_index).equals(new_col.reindex(kept_index))
+        if not unchanged:
+            columns[col] = new_col
+
+    untouched = [col for col in new.columns if col not in columns]
+    inserted = new.loc[inserted_labels, untouched] if len(inserted_labels) else new.iloc[0:0][untouched]
+
+    return FrameDelta(
+        removed=removed,
+        inserted=inserted,
+        columns=columns,
+        dropped_columns=[col for col in old.columns if col not in new.columns],
+        column_order=new.columns.tolist(),
+        row_order=row_order,
+    )
+
+
+def apply_delta(old: pd.DataFrame, delta: FrameDelta) -> pd.DataFrame:
+    """Reconstruit la version `new` à partir de `old` et de la delta old -> new."""
+    kept = old.drop(index=delta.removed) if len(delta.removed) else old
+    index = kept.index.append(delta.inserted.index) if len(delta.inserted) else kept.index
+    if delta.row_order is not None:
+        index = delta.row_order
+
+    data = {}
+    for col in delta.column_order:
+        if col in delta.columns:
+            series = delta.columns[col]
+        else:
+            series = kept[col]
+            if len(delta.inserted):
+                series = pd.concat([series, delta.inserted[col]])
+        data[col] = series.reindex(index) if not series.index.equals(index) else series
+
+    return pd.DataFrame(data, index=index, columns=delta.column_order)
+
+
+def delta_to_payload(delta: FrameDelta, data_format: str = "records") -> Dict[str, Any]:
+    """
+    Représentation JSON d'une delta. Les lignes insérées (avec leur "_row_id") et
+    les colonnes remplacées (dans l'ordre final des lignes) sont encodées dans le
+    format négocié (records, table ou columns : voir wire.py), comme "data".
+    """
+    payload = {
+        "removed": delta.removed.tolist(),
+        "inserted": encode_frame(delta.inserted.reset_index(names="_row_id"), data_format),
+        "columns": encode_frame(pd.DataFrame(delta.columns), data_format) if delta.columns else None,
+        "dropped_columns": [str(col) for col in delta.dropped_columns],
+        "column_order": [str(col) for col in delta.column_order],
+    }
+    if delta.row_order is not None:
+        payload["row_order"] = delta.row_order.tolist()
+    return payload
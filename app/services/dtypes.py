@@ -0,0 +1,134 @@
+import os
+from typing import Any, Dict, Tuple
+import numpy as np
+import pandas as pd
+
+# --- 🗜️ Types compacts pour les DataFrames de session ---
+#
+# Un DataFrame construit depuis du JSON garde ses chaînes en `object` : chaque
+# ville, statut ou catégorie répétée est un objet Python distinct, dans chaque
+# snapshot de l'historique. À l'entrée dans une session, les colonnes passent
+# dans un type plus compact, uniquement quand la conversion est sans perte :
+#   - texte peu varié (distincts <= CATEGORY_MAX_RATIO des lignes) -> category
+#   - autre texte -> chaînes Arrow
+#   - dates ISO dont le rendu texte est inchangé -> datetime64
+#   - int64 dont les bornes tiennent -> int32 (jamais int8 / int16 : le code
+#     généré fait des calculs, un débordement serait silencieux)
+#   - float64 exactement représentables -> float32
+# Le code utilisateur reçoit des types « de calcul » (compute_dtypes) : pas de
+# catégorie qui refuse une nouvelle valeur, pas de calcul en float32.
+
+DTYPE_OPTIMIZE_MIN_ROWS = int(os.getenv("DTYPE_OPTIMIZE_MIN_ROWS", "1000"))
+CATEGORY_MAX_RATIO = 0.5
+ISO_DATE_RE = r"^\d{4}-\d{2}-\d{2}"
+
+try:
+    # pandas >= 2.3 : chaînes Arrow avec NaN comme valeur manquante (le "str" de pandas 3)
+    STRING_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+except TypeError:
+    STRING_DTYPE = pd.StringDtype("pyarrow")
+
+INT32 = np.iinfo(np.int32)
+
+
+def _as_dates(values: pd.Series) -> Any:
+    """Valeurs (non nulles) en datetime64 si toutes sont des dates ISO rendues à l'identique."""
+    if not pd.Series(values.iloc[:1]).astype(str).str.match(ISO_DATE_RE).all():
+        return None
+    parsed = pd.to_datetime(values, format="ISO8601", errors="coerce")
+    if parsed.isna().any() or getattr(parsed.dt, "tz", None) is not None:
+        return None
+    # Même rendu que les réponses JSON (astype(str)) : sinon l'utilisateur verrait ses dates changer
+    if not (parsed.astype(str).to_numpy() == values.astype(str).to_numpy()).all():
+        return None
+    return parsed
+
+
+def _optimize_text(col: pd.Series) -> pd.Series:
+    values = col.dropna()
+    if values.empty:
+        return col
+    if col.dtype == object and pd.api.types.infer_dtype(values, skipna=False) != "string":
+        return col  # Types mélangés : laissés tels quels
+    parsed = _as_dates(values)
+    if parsed is not None:
+        return pd.to_datetime(col, format="ISO8601") if len(values) < len(col) else parsed
+    if values.nunique() <= CATEGORY_MAX_RATIO * len(col):
+        return col.astype("category")
+    if col.dtype == object:
+        return col.astype(STRING_DTYPE)
+    return col
+
+
+def _optimize_column(col: pd.Series) -> pd.Series:
+    dtype = col.dtype
+    if isinstance(dtype, np.dtype):
+        if dtype.kind in "iu" and dtype.itemsize > 4 and len(col):
+            if col.min() >= INT32.min and col.max() <= INT32.max:
+                return col.astype(np.int32)
+            return col
+        if dtype == np.float64:
+            values = col.to_numpy()
+            with np.errstate(over="ignore"):
+                narrowed = values.astype(np.float32)
+            if np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+                return pd.Series(narrowed, index=col.index, name=col.name)
+            return col
+        if dtype.kind == "O":
+            return _optimize_text(col)
+        return col
+    if isinstance(dtype, pd.StringDtype):
+        return _optimize_text(col)
+    return col
+
+
+def memory_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True, index=False).sum())
+
+
+def optimize_dtypes(df: pd.DataFrame, min_rows: int = DTYPE_OPTIMIZE_MIN_ROWS) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Convertit les colonnes dans leur type compact (sans perte) et retourne
+    (DataFrame, rapport) ; le rapport liste les colonnes converties et les
+    octets occupés avant / après. Les petits DataFrames sont laissés tels quels.
+    """
+    if len(df) < min_rows:
+        return df, {"columns": {}, "bytes_before": None, "bytes_after": None}
+    converted: Dict[int, pd.Series] = {}
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        new_col = _optimize_column(col)
+        if new_col is not col and new_col.dtype != col.dtype:
+            converted[i] = new_col
+    if not converted:
+        bytes_now = memory_bytes(df)
+        return df, {"columns": {}, "bytes_before": bytes_now, "bytes_after": bytes_now}
+
+    bytes_before = memory_bytes(df)
+    report = {
+        str(df.columns[i]): {"from": str(df.iloc[:, i].dtype), "to": str(new_col.dtype)}
+        for i, new_col in converted.items()
+    }
+    df = df.copy(deep=False)
+    for i, new_col in converted.items():
+        df.isetitem(i, new_col)
+    return df, {"columns": report, "bytes_before": bytes_before, "bytes_after": memory_bytes(df)}
+
+
+def compute_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Types attendus par du code pandas quelconque : catégories -> valeurs, int32 -> int64, float32 -> float64."""
+    widened = {}
+    for i in range(df.shape[1]):
+        dtype = df.iloc[:, i].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            widened[i] = dtype.categories.dtype
+        elif isinstance(dtype, np.dtype) and dtype.kind in "iu" and dtype.itemsize < 8:
+            widened[i] = np.int64
+        elif dtype == np.float32:
+            widened[i] = np.float64
+    if not widened:
+        return df
+    df = df.copy(deep=False)
+    for i, dtype in widened.items():
+        df.isetitem(i, df.iloc[:, i].astype(dtype))
+    return df
@@ -1,13 +1,19 @@
 import pandas as pd
 
+def lookup_replace(values: pd.Series, mapping: dict) -> pd.Series:
+    """Remplace les valeurs présentes dans `mapping`, laisse les autres inchangées."""
+    return values.map(mapping).fillna(values)
+
 def enrich_with_lookup(df: pd.DataFrame, lookup_column: str, lookup_values: dict) -> pd.DataFrame:
     """Enrichit un DataFrame en remplaçant les valeurs d'une colonne selon un dictionnaire de correspondance."""
     if lookup_column in df.columns:
-        df[lookup_column] = df[lookup_column].map(lookup_values).fillna(df[lookup_column])
+        df[lookup_column] = lookup_replace(df[lookup_column], lookup_values)
     return df
 
 def add_concatenated_column(df: pd.DataFrame, source_columns: list, target_column: str, separator: str = " ") -> pd.DataFrame:
     """Ajoute une nouvelle colonne qui est la concaténation de plusieurs colonnes existantes."""
     if all(col in df.columns for col in source_columns):
-        df[target_column] = df[source_columns].astype(str).agg(separator.join, axis=1)
+        # Valeurs manquantes -> chaîne vide ; concaténation vectorisée (pas de boucle par ligne)
+        texts = [df[col].astype(object).where(df[col].notna(), "").astype(str) for col in source_columns]
+        df[target_column] = texts[0].str.cat(texts[1:], sep=separator) if len(texts) > 1 else texts[0]
     return df 
\ No newline at end of file
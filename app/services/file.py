@@ -1,36 +1,41 @@
-import os
+import uuid
 from typing import List, Optional
-from fastapi import UploadFile
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from ..models.file_process import FileProcess
+from ..models.processing_history import ProcessingHistory
+from ..models.processing_rule import ProcessingRule
 from ..models.user import User
-from ..schemas.file import FileProcessCreate, FileProcessUpdate
+from ..schemas.file import FileProcessCreate, FileProcessUpdate, ProcessingResponse
+from .jobs import job_queue
+from .pipeline import compile_rule, plan_settings
+from .uploads import UPLOAD_DIR, StoredUpload, store_upload, release_upload
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
 
 class FileService:
     def __init__(self, db: Session):
         self.db = db
-        self.upload_dir = "uploads"
+        self.upload_dir = UPLOAD_DIR
+
+    async def _store(self, file: UploadFile) -> StoredUpload:
+        # Copie par blocs + SHA-256 : un contenu déjà reçu n'est pas réécrit (voir uploads.py)
+        return await run_in_threadpool(store_upload, file.file, file.filename, self.upload_dir)
 
     async def create_file(self, file: UploadFile, user_id: int) -> FileProcess:
-        # Créer le dossier d'upload s'il n'existe pas
-        os.makedirs(self.upload_dir, exist_ok=True)
-        
-        # Générer un nom de fichier unique
-        file_path = os.path.join(self.upload_dir, file.filename)
-        
-        # Sauvegarder le fichier
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Sauvegarder le fichier (adressé par contenu : pas d'écrasement entre homonymes)
+        stored = await self._store(file)
         
         # Créer l'entrée dans la base de données
         db_file = FileProcess(
             user_id=user_id,
             original_filename=file.filename,
-            file_path=file_path,
-            file_size=len(content),
+            file_path=stored.path,
+            file_size=stored.size,
             status='pending',
-            process_type='upload'
+            process_type='upload',
+            file_metadata={"sha256": stored.digest}
         )
         
         self.db.add(db_file)
@@ -62,13 +67,134 @@ class FileService:
         if not db_file:
             return False
             
-        # Supprimer le fichier physique
-        try:
-            os.remove(db_file.file_path)
-        except OSError:
-            pass  # Le fichier n'existe peut-être pas
+        # Supprimer le fichier physique, sauf s'il sert encore à un autre traitement (même contenu)
+        shared = self.db.query(FileProcess).filter(
+            FileProcess.file_path == db_file.file_path,
+            FileProcess.id != db_file.id
+        ).first()
+        if not shared:
+            release_upload(db_file.file_path)
             
         # Supprimer l'entrée de la base de données
         self.db.delete(db_file)
         self.db.commit()
-        return True 
\ No newline at end of file
+        return True
+
+    # 🏭 Traitements en tâche de fond (voir jobs.py)
+
+    def _get_user_file(self, file_id: str, user: User) -> FileProcess:
+        try:
+            file_uuid = uuid.UUID(str(file_id))
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Fichier introuvable")
+        db_file = self.db.query(FileProcess).filter(
+            FileProcess.id == file_uuid,
+            FileProcess.organization_id == user.organization_id
+        ).first()
+        if not db_file:
+            raise HTTPException(status_code=404, detail="Fichier introuvable")
+        return db_file
+
+    async def upload(self, file: UploadFile, user: User) -> FileProcess:
+        """Enregistre le fichier sur disque (copie en flux, adressée par contenu) et crée le FileProcess associé"""
+        if not user.organization_id:
+            raise HTTPException(status_code=400, detail="Utilisateur sans organisation")
+        if not file.filename or not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            raise HTTPException(status_code=400, detail="Format de fichier non supporté")
+
+        stored = await self._store(file)
+        db_file = FileProcess(
+            organization_id=user.organization_id,
+            user_id=user.id,
+            original_filename=file.filename,
+            file_path=stored.path,
+            file_size=stored.size,
+            status='pending',
+            process_type='clean',
+            file_metadata={"sha256": stored.digest, "deduplicated": not stored.created}
+        )
+        self.db.add(db_file)
+        self.db.commit()
+        self.db.refresh(db_file)
+        # Conversion Parquet + statistiques de colonnes hors de la requête
+        job_queue.enqueue_ingest(db_file.id)
+        return db_file
+
+    async def process(self, file_id: str, rules: List[str], user: User) -> ProcessingResponse:
+        """Met le traitement en file : les règles sont appliquées par le pool de jobs"""
+        db_file = self._get_user_file(file_id, user)
+        if db_file.status in ('queued', 'processing'):
+            raise HTTPException(status_code=409, detail="Traitement déjà en cours pour ce fichier")
+        if not rules:
+            raise HTTPException(status_code=400, detail="Aucune règle à appliquer")
+
+        try:
+            rule_ids = [uuid.UUID(str(rule_id)) for rule_id in rules]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Identifiant de règle invalide")
+        found = {
+            rule.id: rule
+            for rule in self.db.query(ProcessingRule).filter(
+                ProcessingRule.id.in_(rule_ids),
+                ProcessingRule.organization_id == user.organization_id,
+                ProcessingRule.is_active.is_(True)
+            )
+        }
+        missing = [str(rule_id) for rule_id in rule_ids if rule_id not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Règles introuvables ou inactives: {', '.join(missing)}")
+        settings = plan_settings(user.organization.settings if user.organization else None)
+        try:
+            plans = {rule_id: compile_rule(rule.configuration, settings) for rule_id, rule in found.items()}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Copie des configurations : une règle modifiée ensuite n'affecte pas ce traitement
+        db_file.processing_options = {
+            "rules": [
+                {
+                    "id": str(rule_id),
+                    "name": found[rule_id].name,
+                    "version": plans[rule_id].version,
+                    "configuration": found[rule_id].configuration,
+                }
+                for rule_id in rule_ids
+            ],
+            "settings": settings,
+            "requested_by": str(user.id),
+        }
+        db_file.status = 'queued'
+        db_file.error_message = None
+        db_file.completed_at = None
+        self.db.commit()
+        job_queue.enqueue(db_file.id)
+
+        return ProcessingResponse(
+            file_id=db_file.id,
+            status='queued',
+            message="Traitement mis en file d'attente",
+            details={"rules": [str(rule_id) for rule_id in rule_ids]}
+        )
+
+    async def get_status(self, file_id: str, user: User) -> FileProcess:
+        """Statut courant et étapes déjà exécutées (durées issues de ProcessingHistory)"""
+        db_file = self._get_user_file(file_id, user)
+        self.db.refresh(db_file)
+        steps = self.db.query(ProcessingHistory).filter(
+            ProcessingHistory.file_process_id == db_file.id
+        ).order_by(ProcessingHistory.created_at).all()
+        db_file.processing_details = {
+            "steps": [
+                {"step": step.step, "status": step.status, "duration": step.duration, "details": step.details}
+                for step in steps
+            ],
+            "completed_at": db_file.completed_at.isoformat() if db_file.completed_at else None,
+            "result": db_file.file_metadata or {},
+        }
+        return db_file
+
+    async def get_history(self, user: User) -> List[FileProcess]:
+        """Traitements de l'utilisateur, du plus récent au plus ancien"""
+        return self.db.query(FileProcess).filter(
+            FileProcess.user_id == user.id
+        ).order_by(FileProcess.created_at.desc()).all()
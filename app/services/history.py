@@ -0,0 +1,160 @@
+import os
+import shutil
+import uuid
+import weakref
+from typing import Iterator, List, Optional, Union
+import pandas as pd
+
+from app.services.delta import FrameDelta, compute_delta, apply_delta
+from app.services.session_store import frame_bytes
+from app.services.spill import SPILL_DIR, SpilledStep
+
+# --- ↩️ Historique des versions d'un DataFrame encodé en deltas ---
+#
+# Seule la dernière version est matérialisée. Chaque version précédente est
+# conservée sous forme de delta inverse (version courante -> version précédente) :
+# colonnes modifiées, lignes supprimées par l'action, ordre des lignes...
+# Les colonnes non modifiées partagent leurs buffers entre versions grâce au
+# Copy-on-Write de pandas (toujours actif à partir de pandas 3, activé au
+# démarrage de l'API et des pools sinon : voir pandas_options.py).
+#
+# Les deltas les plus récentes restent en RAM ; au-delà de HISTORY_HOT_VERSIONS
+# elles sont compressées en mémoire, puis au-delà de HISTORY_WARM_VERSIONS
+# écrites sur disque (voir spill.py) et relues à la demande lors d'un undo.
+
+HISTORY_HOT_VERSIONS = int(os.getenv("HISTORY_HOT_VERSIONS", "2"))
+HISTORY_WARM_VERSIONS = int(os.getenv("HISTORY_WARM_VERSIONS", "8"))
+
+
+def delta_bytes(delta: FrameDelta) -> int:
+    size = delta.removed.nbytes
+    size += int(delta.inserted.memory_usage(deep=True).sum())
+    size += sum(int(series.memory_usage(deep=True)) for series in delta.columns.values())
+    if delta.row_order is not None:
+        size += delta.row_order.nbytes
+    return int(size)
+
+
+def _detach(delta: FrameDelta) -> FrameDelta:
+    """Copie les colonnes conservées pour ne pas retenir les blocs entiers de l'ancienne version."""
+    delta.columns = {col: series.copy() for col, series in delta.columns.items()}
+    return delta
+
+
+class DataFrameHistory:
+    """
+    Historique d'undo d'une session. S'utilise comme la liste de DataFrames
+    qu'il remplace : history[-1], len(history), append(), pop().
+    """
+
+    def __init__(self, initial: pd.DataFrame):
+        self._current = initial
+        # Deltas inverses (ou snapshot complet si les lignes ne sont pas identifiables)
+        self._undo: List[Union[FrameDelta, pd.DataFrame, SpilledStep]] = []
+        self._undo_bytes: List[int] = []
+        self._spill_dir = os.path.join(SPILL_DIR, uuid.uuid4().hex)
+        weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+        # Identifiant de cet historique : une session recréée en change (caches par version, rows.py)
+        self.generation = uuid.uuid4().hex
+
+    def __len__(self) -> int:
+        return len(self._undo) + 1
+
+    @property
+    def current(self) -> pd.DataFrame:
+        return self._current
+
+    @staticmethod
+    def _revert(df: pd.DataFrame, step: Union[FrameDelta, pd.DataFrame, SpilledStep]) -> pd.DataFrame:
+        if isinstance(step, SpilledStep):
+            step = step.load()
+        return step if isinstance(step, pd.DataFrame) else apply_delta(df, step)
+
+    def __getitem__(self, position: int) -> pd.DataFrame:
+        size = len(self)
+        if position < 0:
+            position += size
+        if not 0 <= position < size:
+            raise IndexError("Version inexistante dans l'historique")
+        df = self._current
+        for step in reversed(self._undo[position:]):
+            df = self._revert(df, step)
+        return df
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        versions = [self._current]
+        for step in reversed(self._undo):
+            versions.append(self._revert(versions[-1], step))
+        return reversed(versions)
+
+    def append(self, df: pd.DataFrame) -> None:
+        """Ajoute une nouvelle version ; la précédente est réduite à une delta inverse."""
+        delta = compute_delta(df, self._current)
+        if delta is None:
+            self._undo.append(self._current)
+            self._undo_bytes.append(frame_bytes(self._current))
+        else:
+            delta = _detach(delta)
+            self._undo.append(delta)
+            self._undo_bytes.append(delta_bytes(delta))
+        self._current = df
+        self._rebalance()
+
+    def _rebalance(self) -> None:
+        """Fait descendre les étapes anciennes vers le niveau compressé puis vers le disque."""
+        depth = len(self._undo)
+        for i, step in enumerate(self._undo):
+            age = depth - i
+            if age <= HISTORY_HOT_VERSIONS:
+                break
+            target = "memory" if age <= HISTORY_HOT_VERSIONS + HISTORY_WARM_VERSIONS else "disk"
+            if isinstance(step, SpilledStep):
+                if step.tier == target or target == "memory":
+                    continue
+                spilled = SpilledStep(step.load(), "disk", self._spill_dir)
+                spilled.blob_id = step.blob_id
+                step.release()
+            else:
+                spilled = SpilledStep(step, target, self._spill_dir)
+            self._undo[i] = spilled
+            self._undo_bytes[i] = spilled.nbytes
+
+    def pop(self) -> pd.DataFrame:
+        """Annule la dernière version et retourne le DataFrame retiré."""
+        if not self._undo:
+            raise IndexError("Aucune version précédente dans l'historique")
+        removed = self._current
+        step = self._undo.pop()
+        self._current = self._revert(self._current, step)
+        self._undo_bytes.pop()
+        if isinstance(step, SpilledStep):
+            step.release()
+        return removed
+
+    def export_steps(self) -> List[SpilledStep]:
+        """Étapes sous forme sérialisable, pour un backend de session partagé."""
+        for i, step in enumerate(self._undo):
+            if not isinstance(step, SpilledStep):
+                self._undo[i] = SpilledStep(step, "memory")
+                self._undo_bytes[i] = self._undo[i].nbytes
+        return list(self._undo)
+
+    @classmethod
+    def from_steps(cls, current: pd.DataFrame, steps: List[SpilledStep], generation: Optional[str] = None) -> "DataFrameHistory":
+        history = cls(current)
+        history.generation = generation or history.generation
+        history._undo = list(steps)
+        history._undo_bytes = [step.nbytes for step in steps]
+        return history
+
+    @property
+    def nbytes(self) -> int:
+        return frame_bytes(self._current) + sum(self._undo_bytes)
+
+    @property
+    def snapshots(self) -> int:
+        return len(self)
+
+    @property
+    def disk_bytes(self) -> int:
+        return sum(step.disk_bytes for step in self._undo if isinstance(step, SpilledStep))
@@ -0,0 +1,122 @@
+import logging
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from openpyxl import load_workbook
+
+from app.services.datasets import prepare_initial_df, register_dataset, get_dataset, dtype_store
+from app.services.dtypes import optimize_dtypes
+from app.services.uploads import store_upload, load_or_parse
+
+# --- 📥 Lecture en flux des fichiers (CSV / Excel) ---
+#
+# Les fichiers sont lus par blocs et chaque bloc est normalisé dès sa lecture :
+# on ne garde jamais en mémoire ni le fichier brut, ni une liste de dicts.
+
+CSV_BLOCK_SIZE = 16 << 20  # 16 Mo par bloc Arrow (sert aussi à l'inférence des types)
+EXCEL_CHUNK_ROWS = 50_000
+DEFAULT_PAGE_SIZE = 200
+
+
+def iter_csv_chunks(fileobj: BinaryIO, as_text: bool = False) -> Iterator[pd.DataFrame]:
+    """Lit un CSV bloc par bloc avec le moteur CSV de pyarrow (`as_text` : toutes les colonnes en texte)."""
+    read_options = pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE)
+    convert_options = None
+    if as_text:
+        # Noms de colonnes lus sur un premier passage, puis relecture sans inférence de types
+        names = pa_csv.open_csv(fileobj, read_options=read_options).schema.names
+        fileobj.seek(0)
+        convert_options = pa_csv.ConvertOptions(column_types={name: pa.string() for name in names})
+    reader = pa_csv.open_csv(fileobj, read_options=read_options, convert_options=convert_options)
+    for batch in reader:
+        yield batch.to_pandas(date_as_object=False)
+
+
+def iter_excel_chunks(fileobj: BinaryIO, chunk_rows: int = EXCEL_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Lit la première feuille d'un XLSX en mode read-only, par paquets de lignes."""
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header)]
+        buffer: List[Tuple[Any, ...]] = []
+        for row in rows:
+            buffer.append(row[:len(columns)])
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame.from_records(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame.from_records(buffer, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _as_text(chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    for chunk in chunks:
+        yield chunk.where(chunk.isna(), chunk.astype(str))
+
+
+def iter_upload_chunks(fileobj: BinaryIO, filename: str, as_text: bool = False) -> Iterator[pd.DataFrame]:
+    """Blocs du fichier ; `as_text` lit toutes les colonnes en texte (types stables d'un bloc à l'autre)."""
+    if filename.endswith('.csv'):
+        return iter_csv_chunks(fileobj, as_text)
+    if filename.endswith('.xlsx'):
+        return _as_text(iter_excel_chunks(fileobj)) if as_text else iter_excel_chunks(fileobj)
+    if filename.endswith('.xls'):
+        # Ancien format binaire : pas de lecture en flux possible avec openpyxl
+        chunks = iter([pd.read_excel(fileobj)])
+        return _as_text(chunks) if as_text else chunks
+    raise ValueError(f"Format de fichier non supporté: {filename}")
+
+
+def read_upload(fileobj: BinaryIO, filename: str) -> pd.DataFrame:
+    """Lit un fichier en flux et normalise chaque bloc dès sa lecture."""
+    chunks = []
+    offset = 0
+    try:
+        for chunk in iter_upload_chunks(fileobj, filename):
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            chunk = prepare_initial_df(chunk)
+            if len(chunk):
+                chunks.append(chunk)
+    except pa.ArrowInvalid as e:
+        # Types incohérents entre blocs : on relit le CSV d'un seul tenant
+        logging.warning(f"⚠️ Lecture en flux impossible ({e}), relecture complète du CSV")
+        fileobj.seek(0)
+        chunks = [prepare_initial_df(pd.read_csv(fileobj))]
+
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks)
+
+
+def ingest_upload(fileobj: BinaryIO, filename: str) -> Tuple[str, pd.DataFrame]:
+    """
+    Stocke le fichier (adressé par contenu, voir uploads.py), le lit en flux
+    (read_upload) et enregistre le résultat dans le dataset store. Un contenu
+    déjà reçu réutilise le jeu de données déjà lu. Les colonnes passent dans leurs
+    types compacts (dtypes.py). Retourne (dataset_id, DataFrame).
+    """
+    stored = store_upload(fileobj, filename)
+    # Même contenu => même identifiant de jeu de données
+    dataset_id = os.path.basename(stored.path)
+    df = get_dataset(dataset_id)
+    if df is not None:
+        logging.info(f"♻️ Fichier déjà reçu ({stored.digest[:12]}), jeu de données réutilisé")
+        return dataset_id, df
+    df, cached = load_or_parse(stored, filename, read_upload)
+    if cached:
+        logging.info(f"♻️ Fichier déjà reçu ({stored.digest[:12]}), lecture évitée")
+    df, dtype_store[dataset_id] = optimize_dtypes(df)
+    return register_dataset(df, dataset_id), df
+
+
+def describe_schema(df: pd.DataFrame) -> List[Dict[str, str]]:
+    return [{"name": str(col), "dtype": str(dtype)} for col, dtype in df.dtypes.items()]
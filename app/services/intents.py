@@ -0,0 +1,185 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+import pandas as pd
+
+from app.services.code_cache import normalize_instruction
+from app.services.phones import PhoneRules
+from app.services.cleaner import (
+    remove_duplicates,
+    remove_empty_rows,
+    capitalize_text_column,
+    format_phone_column,
+    standardize_date_column,
+)
+
+# --- 🧭 Routage déterministe des demandes simples (FR / EN) ---
+#
+# Les demandes les plus fréquentes (doublons, lignes vides, majuscules, téléphones,
+# dates) sont reconnues localement et appliquées avec les fonctions de cleaner.py,
+# sans appel au LLM ni exécution de code généré. Au moindre doute (condition,
+# plusieurs actions, colonne ambiguë...) parse_intent retourne None et la demande
+# part vers GPT comme avant.
+
+REMOVE_VERBS = {
+    "supprime", "supprimer", "supprimez", "enleve", "enlever", "enlevez", "retire", "retirer",
+    "retirez", "efface", "effacer", "elimine", "eliminer", "vire", "virer",
+    "remove", "delete", "drop", "clear",
+}
+FORMAT_VERBS = {
+    "formate", "formater", "formatez", "formatte", "format", "normalise", "normaliser", "normalisez",
+    "normalize", "standardise", "standardiser", "standardize", "uniformise", "uniformiser",
+    "nettoie", "nettoyer", "nettoyez", "clean", "corrige", "corriger", "fix", "convertis", "convertir",
+    "convert", "mets", "mettre", "met", "put", "transforme", "transformer",
+}
+DEDUPE_WORDS = {
+    "dedoublonne", "dedoublonner", "dedoublonnez", "dedoublonnage", "deduplique", "dedupliquer",
+    "dedupe", "dedup", "deduplicate",
+}
+# Mots qui rendent la demande conditionnelle ou composée : on laisse GPT s'en charger
+UNSURE_WORDS = {
+    "si", "sauf", "seulement", "uniquement", "quand", "lorsque", "pas", "ne", "sans", "puis", "ensuite",
+    "et", "ou", "if", "except", "only", "where", "when", "not", "dont", "without", "then", "and", "or",
+}
+PHONE_WORDS = ("telephone", "phone", "tel", "gsm", "mobile", "portable")
+DATE_FORMATS = {
+    ("jj", "mm", "aaaa"): "%d/%m/%Y",
+    ("dd", "mm", "yyyy"): "%d/%m/%Y",
+    ("mm", "dd", "yyyy"): "%m/%d/%Y",
+    ("aaaa", "mm", "jj"): "%Y-%m-%d",
+    ("yyyy", "mm", "dd"): "%Y-%m-%d",
+}
+
+
+@dataclass
+class Intent:
+    action: str
+    column: Optional[str] = None
+    output_format: Optional[str] = None
+
+    @property
+    def code(self) -> str:
+        """Équivalent Python affiché à l'utilisateur et enregistré dans ActionHistory."""
+        if self.action == "remove_duplicates":
+            return "df = remove_duplicates(df)"
+        if self.action == "remove_empty_rows":
+            return "df = remove_empty_rows(df)"
+        if self.action == "standardize_date_column":
+            return f"df = standardize_date_column(df, {self.column!r}, {self.output_format!r})"
+        return f"df = {self.action}(df, {self.column!r})"
+
+    @property
+    def title(self) -> str:
+        return {
+            "remove_duplicates": "Suppression des doublons",
+            "remove_empty_rows": "Suppression des lignes vides",
+            "capitalize_text_column": f"Majuscules en début de mot ({self.column})",
+            "format_phone_column": f"Formatage des téléphones ({self.column})",
+            "standardize_date_column": f"Standardisation des dates ({self.column})",
+        }[self.action]
+
+    @property
+    def description(self) -> str:
+        return {
+            "remove_duplicates": "Les lignes en double ont été supprimées.",
+            "remove_empty_rows": "Les lignes entièrement vides ont été supprimées.",
+            "capitalize_text_column": f"Chaque mot de la colonne {self.column} commence par une majuscule.",
+            "format_phone_column": f"Les numéros de la colonne {self.column} ont été normalisés.",
+            "standardize_date_column": f"Les dates de la colonne {self.column} sont au format {self.output_format}.",
+        }[self.action]
+
+
+def _mentioned_columns(text: str, columns: Sequence) -> List[str]:
+    padded = f" {text} "
+    found = []
+    for col in columns:
+        name = normalize_instruction(str(col))
+        if name and (f" {name} " in padded or f" {name}s " in padded):
+            found.append((name, str(col)))
+    # "date" et "date naissance" cités : on garde la mention la plus longue
+    return [col for name, col in found if not any(name != other and name in other for other, _ in found)]
+
+
+def _column_like(columns: Sequence, predicate: Callable[[str], bool]) -> Optional[str]:
+    candidates = [str(col) for col in columns if predicate(normalize_instruction(str(col)))]
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def _date_format(words: List[str]) -> str:
+    for i in range(len(words) - 2):
+        spec = DATE_FORMATS.get(tuple(words[i:i + 3]))
+        if spec:
+            return spec
+    return "%Y-%m-%d"
+
+
+def parse_intent(instruction: str, df: pd.DataFrame) -> Optional[Intent]:
+    """Reconnaît une demande simple sur `df`, ou retourne None si l'on n'est pas sûr."""
+    text = normalize_instruction(instruction)
+    words = text.split()
+    if not words or len(words) > 14 or UNSURE_WORDS & set(words):
+        return None
+
+    columns = list(df.columns)
+    mentioned = _mentioned_columns(text, columns)
+    removing = bool(REMOVE_VERBS & set(words))
+    formatting = bool(FORMAT_VERBS & set(words))
+
+    candidates: List[Intent] = []
+    if DEDUPE_WORDS & set(words) or (removing and any(w.startswith(("doublon", "duplicate")) for w in words)):
+        candidates.append(Intent("remove_duplicates"))
+    if removing and (
+        (any(w.startswith("ligne") for w in words) and any(w.startswith("vide") for w in words))
+        or (any(w in ("empty", "blank") for w in words) and any(w.startswith("row") for w in words))
+    ):
+        candidates.append(Intent("remove_empty_rows"))
+    if (
+        {"capitalise", "capitaliser", "capitalize"} & set(words)
+        or "title case" in text
+        or "nom propre" in text
+        or (any(w.startswith("majuscule") for w in words) and ("premiere lettre" in text or "debut" in words))
+    ):
+        candidates.append(Intent("capitalize_text_column", mentioned[0] if len(mentioned) == 1 else None))
+    if formatting and any(w.startswith(PHONE_WORDS) for w in words):
+        column = mentioned[0] if len(mentioned) == 1 else (
+            None if mentioned else _column_like(columns, lambda name: any(w.startswith(PHONE_WORDS) for w in name.split()))
+        )
+        candidates.append(Intent("format_phone_column", column))
+    if formatting and any(w.startswith("date") for w in words):
+        column = mentioned[0] if len(mentioned) == 1 else None
+        if column is None and not mentioned:
+            datetime_columns = [str(col) for col in df.select_dtypes(include=["datetime", "datetimetz"]).columns]
+            column = datetime_columns[0] if len(datetime_columns) == 1 else _column_like(
+                columns, lambda name: "date" in name.split()
+            )
+        candidates.append(Intent("standardize_date_column", column, _date_format(words)))
+
+    if len(candidates) != 1:
+        return None
+    intent = candidates[0]
+    if intent.action in ("remove_duplicates", "remove_empty_rows"):
+        # "doublons sur la colonne Email" : sous-ensemble de colonnes, non géré ici
+        return None if mentioned else intent
+    return intent if intent.column is not None else None
+
+
+INTENT_FUNCTIONS: Dict[str, Callable[..., pd.DataFrame]] = {
+    "remove_duplicates": remove_duplicates,
+    "remove_empty_rows": remove_empty_rows,
+    "capitalize_text_column": capitalize_text_column,
+    "format_phone_column": format_phone_column,
+    "standardize_date_column": standardize_date_column,
+}
+
+
+def apply_intent(df: pd.DataFrame, intent: Intent, rules: Optional[PhoneRules] = None) -> pd.DataFrame:
+    """`rules` : règles téléphoniques de l'organisation (phones.phone_rules), défaut global sinon."""
+    # Copie superficielle : les fonctions de cleaner.py modifient le DataFrame reçu
+    df = df.copy(deep=False)
+    func = INTENT_FUNCTIONS[intent.action]
+    if intent.action == "standardize_date_column":
+        return func(df, intent.column, intent.output_format)
+    if intent.action == "format_phone_column":
+        return func(df, intent.column, rules)
+    if intent.column is not None:
+        return func(df, intent.column)
+    return func(df)
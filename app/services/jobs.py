@@ -0,0 +1,449 @@
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import pandas as pd
+
+from app.database.config import SessionLocal
+from app.models.file_process import FileProcess
+from app.models.processing_history import ProcessingHistory
+from app.services.ingest import read_upload
+from app.services.uploads import StoredUpload, load_or_parse
+from app.services.profiling import column_stats
+from app.services.pipeline import compile_rule
+from app.services.pandas_options import configure_pandas
+from app.services.spill import frame_to_parquet
+from app.services.streaming import StreamStep, stream_file, STREAM_OUTPUT_FORMATS
+
+# --- 🏭 Traitements de fichiers en tâche de fond ---
+#
+# La base de données sert de file d'attente : /files/{file_id}/process passe le
+# FileProcess en "queued" (avec une copie des configurations de règles dans
+# processing_options, ainsi que les settings d'organisation utilisés par les
+# plans, voir pipeline.RULE_SETTINGS) puis le confie au pool. Un processus du
+# pool "réclame" la tâche (queued -> processing, UPDATE atomique), charge le
+# fichier, applique les règles une à une (plans compilés par pipeline.py) et
+# trace chaque étape, avec sa durée, dans ProcessingHistory.
+#
+# La réclamation pose un bail : claimed_by identifie le processus (hôte:pid) et
+# claimed_at est rafraîchi toutes les JOB_LEASE_SECONDS / 4 par un thread tant
+# que la tâche tourne. Au démarrage, les tâches "queued" sont remises en file ;
+# ensuite un thread remet en file, toutes les JOB_LEASE_SECONDS / 2, les
+# "processing" dont le bail a expiré (worker tué, instance arrêtée) : celles
+# d'une autre instance encore en vie ne sont pas touchées. Si un processus du
+# pool meurt (mémoire...), le pool est recréé et ses tâches y sont soumises à
+# nouveau ; une tâche qui tue le pool JOB_MAX_CRASHES fois passe en "error".
+# Le statut se lit par polling de /status.
+#
+# Dès l'upload, une tâche "ingest" convertit le fichier en Parquet typé (voir
+# uploads.py) et range les statistiques de colonnes dans file_metadata : les
+# lectures suivantes sont colonnaires et les vues de statut ne rouvrent rien.
+#
+# Au-delà de STREAM_THRESHOLD_BYTES, le fichier n'est jamais chargé en entier :
+# les règles sont appliquées bloc par bloc et le résultat écrit au fil de l'eau
+# (voir streaming.py) ; l'ingestion (Parquet + statistiques) est alors sautée.
+#
+# JOB_WORKERS=0 exécute les tâches dans un thread du processus API (développement).
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(min(4, os.cpu_count() or 1))))
+RESULTS_DIR = os.getenv("JOB_RESULTS_DIR", "results")
+RESULT_FORMAT = os.getenv("JOB_RESULT_FORMAT", "csv")
+STREAM_THRESHOLD_BYTES = int(os.getenv("STREAM_THRESHOLD_BYTES", str(512 << 20)))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_CRASHES = int(os.getenv("JOB_MAX_CRASHES", "3"))
+
+if RESULT_FORMAT not in STREAM_OUTPUT_FORMATS:
+    raise ValueError(f"JOB_RESULT_FORMAT inconnu: {RESULT_FORMAT} (attendu: {', '.join(STREAM_OUTPUT_FORMATS)})")
+
+# (statut final, message d'erreur, clés ajoutées à file_metadata)
+JobOutcome = Tuple[str, Optional[str], Dict[str, Any]]
+
+
+def stream_rule_steps(rules: List[Dict[str, Any]], settings: Optional[Dict[str, Any]] = None) -> List[Tuple[str, StreamStep]]:
+    """Étapes (nom de la règle, fonction bloc -> bloc) pour streaming.py, état neuf à chaque appel."""
+    return [
+        (rule["name"], step)
+        for rule in rules
+        for step in compile_rule(rule["configuration"], settings).stream_steps()
+    ]
+
+
+# 👷 Exécution d'une tâche (dans un processus du pool)
+
+@contextmanager
+def _record_step(db, file_process: FileProcess, step: str) -> Iterator[Dict[str, Any]]:
+    details: Dict[str, Any] = {}
+    start = time.perf_counter()
+    try:
+        yield details
+    except Exception as e:
+        db.rollback()
+        details["error"] = str(e)
+        status = "error"
+        raise
+    else:
+        status = "success"
+    finally:
+        db.add(ProcessingHistory(
+            file_process_id=file_process.id,
+            step=step,
+            status=status,
+            details=details,
+            duration=time.perf_counter() - start,
+        ))
+        db.commit()
+
+
+def _load_upload(file_process: FileProcess) -> Tuple[pd.DataFrame, bool]:
+    # Fichier déjà lu (même contenu) : relu depuis sa version Parquet, sans parsing
+    stored = StoredUpload(
+        digest=(file_process.file_metadata or {}).get("sha256", ""),
+        path=file_process.file_path,
+        size=file_process.file_size or 0,
+        created=False,
+    )
+    df, cached = load_or_parse(stored, file_process.original_filename.lower(), read_upload)
+    return df, cached
+
+
+def _ingest_metadata(file_process: FileProcess, df: pd.DataFrame) -> Dict[str, Any]:
+    parquet_path = file_process.file_path + ".parquet"
+    return {
+        "row_count": len(df),
+        "column_count": len(df.columns),
+        "column_stats": column_stats(df),
+        "parsed_path": parquet_path if os.path.exists(parquet_path) else file_process.file_path + ".arrow",
+    }
+
+
+def _is_streamed(file_process: FileProcess) -> bool:
+    return (file_process.file_size or 0) >= STREAM_THRESHOLD_BYTES
+
+
+def _save_result(df: pd.DataFrame, file_id: str) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    if RESULT_FORMAT == "parquet":
+        result_path = os.path.join(RESULTS_DIR, f"{file_id}.parquet")
+        if frame_to_parquet(df, result_path):
+            return result_path
+        # Colonnes qu'Arrow ne sait pas typer : résultat en CSV
+    result_path = os.path.join(RESULTS_DIR, f"{file_id}.csv")
+    df.to_csv(result_path, index=False)
+    return result_path
+
+
+def _merge_metadata(db, file_process: FileProcess, values: Dict[str, Any]) -> None:
+    # Relecture d'abord : ingest et traitement peuvent écrire file_metadata en parallèle
+    db.refresh(file_process)
+    file_process.file_metadata = {**(file_process.file_metadata or {}), **values}
+    db.commit()
+
+
+def run_ingest(file_id: str) -> Optional[str]:
+    """Convertit le fichier envoyé en Parquet et calcule ses statistiques (None si déjà fait)."""
+    db = SessionLocal()
+    try:
+        file_process = db.get(FileProcess, uuid.UUID(file_id))
+        if file_process is None or "column_stats" in (file_process.file_metadata or {}):
+            return None
+        if _is_streamed(file_process):
+            # Trop gros pour être chargé : pas de Parquet ni de statistiques
+            return "skipped"
+        try:
+            with _record_step(db, file_process, "ingest") as details:
+                df, cached = _load_upload(file_process)
+                metadata = _ingest_metadata(file_process, df)
+                details.update(rows=len(df), columns=len(df.columns), parsed_cache=cached)
+        except Exception:
+            return "error"
+        _merge_metadata(db, file_process, metadata)
+        return "ingested"
+    finally:
+        db.close()
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@contextmanager
+def _lease(job_id: uuid.UUID, owner: str) -> Iterator[None]:
+    """Rafraîchit claimed_at tant que la tâche tourne (session dédiée, dans un thread)."""
+    stop = threading.Event()
+
+    def heartbeat() -> None:
+        while not stop.wait(JOB_LEASE_SECONDS / 4):
+            db = SessionLocal()
+            try:
+                db.query(FileProcess).filter(
+                    FileProcess.id == job_id, FileProcess.claimed_by == owner
+                ).update({"claimed_at": datetime.now(timezone.utc)}, synchronize_session=False)
+                db.commit()
+            except Exception as e:
+                logging.warning(f"⚠️ Bail de {job_id} non rafraîchi: {e}")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=heartbeat, name=f"lease-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(file_id: str) -> Optional[str]:
+    """Traite un FileProcess "queued" ; retourne son statut final (None si déjà réclamé)."""
+    job_id = uuid.UUID(file_id)
+    owner = _worker_id()
+    db = SessionLocal()
+    try:
+        claimed = db.query(FileProcess).filter(
+            FileProcess.id == job_id, FileProcess.status == "queued"
+        ).update(
+            {"status": "processing", "claimed_by": owner, "claimed_at": datetime.now(timezone.utc)},
+            synchronize_session=False,
+        )
+        db.commit()
+        if not claimed:
+            return None
+
+        file_process = db.get(FileProcess, job_id)
+        options = file_process.processing_options or {}
+        rules, settings = options.get("rules", []), options.get("settings")
+        with _lease(job_id, owner):
+            if _is_streamed(file_process):
+                status, error, result = _stream_job(db, file_process, rules, settings)
+            else:
+                status, error, result = _load_and_process(db, file_process, rules, settings)
+        db.refresh(file_process)
+        if file_process.status != "processing" or file_process.claimed_by != owner:
+            # Bail expiré entre-temps : la tâche a été reprise ailleurs
+            logging.warning(f"⚠️ {file_id} repris par {file_process.claimed_by}, résultat abandonné")
+            return None
+        file_process.status = status
+        file_process.error_message = error
+        file_process.file_metadata = {**(file_process.file_metadata or {}), **result}
+        file_process.completed_at = datetime.now(timezone.utc)
+        db.commit()
+        return status
+    finally:
+        db.close()
+
+
+
+def _stream_job(db, file_process: FileProcess, rules: List[Dict[str, Any]],
+                settings: Optional[Dict[str, Any]]) -> JobOutcome:
+    try:
+        with _record_step(db, file_process, "stream") as details:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            result_path = os.path.join(RESULTS_DIR, f"{file_process.id}.{RESULT_FORMAT}")
+            summary = stream_file(
+                file_process.file_path,
+                file_process.original_filename.lower(),
+                lambda: stream_rule_steps(rules, settings),
+                result_path,
+                RESULT_FORMAT,
+            )
+            details.update(result_path=result_path, **summary)
+    except Exception as e:
+        return "error", str(e), {}
+    return "completed", None, {
+        "result_path": result_path,
+        "result_row_count": summary["rows_out"],
+        "result_columns": summary["columns"],
+    }
+
+
+def _load_and_process(db, file_process: FileProcess, rules: List[Dict[str, Any]],
+                      settings: Optional[Dict[str, Any]]) -> JobOutcome:
+    try:
+        with _record_step(db, file_process, "load") as details:
+            df, cached = _load_upload(file_process)
+            details.update(rows=len(df), columns=len(df.columns), parsed_cache=cached)
+            if "column_stats" not in (file_process.file_metadata or {}):
+                # Ingestion pas encore passée (ou perdue) : statistiques calculées ici
+                _merge_metadata(db, file_process, _ingest_metadata(file_process, df))
+
+        for rule in rules:
+            with _record_step(db, file_process, f"rule:{rule['name']}") as details:
+                rows_before = len(df)
+                plan = compile_rule(rule["configuration"], settings)
+                reports: List[Dict[str, Any]] = []
+                df = plan.apply(df, reports)
+                details.update(
+                    rule_id=rule["id"], version=plan.version, plan=plan.describe(),
+                    rows_before=rows_before, rows_after=len(df),
+                )
+                if reports:
+                    details["dates"] = reports
+
+        with _record_step(db, file_process, "save") as details:
+            result_path = _save_result(df, str(file_process.id))
+            details.update(result_path=result_path)
+    except Exception as e:
+        return "error", str(e), {}
+    return "completed", None, {
+        "result_path": result_path,
+        "result_row_count": len(df),
+        "result_columns": [str(col) for col in df.columns],
+    }
+
+
+# 🏊 Côté API
+
+def _status(file_id: str) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        return db.query(FileProcess.status).filter(FileProcess.id == uuid.UUID(file_id)).scalar()
+    finally:
+        db.close()
+
+
+def _abandon(file_id: str, error: str) -> None:
+    """Passe en "error" une tâche qui ne peut pas aboutir (elle ne sera plus reprise)."""
+    db = SessionLocal()
+    try:
+        db.query(FileProcess).filter(
+            FileProcess.id == uuid.UUID(file_id), FileProcess.status.in_(("queued", "processing"))
+        ).update(
+            {"status": "error", "error_message": error, "completed_at": datetime.now(timezone.utc)},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+class JobQueue:
+    """Pool de processus qui exécute les FileProcess mis en file (voir run_job)."""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._crashes: Dict[str, int] = {}
+        self._stopping = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+
+    def _pool(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.workers <= 0:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job")
+                else:
+                    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context(method),
+                        initializer=configure_pandas,
+                    )
+            return self._executor
+
+    def _done(self, job: Callable[[str], Optional[str]], file_id: str, executor: Executor, future: Future) -> None:
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            self._crashes.pop(f"{job.__name__}:{file_id}", None)
+            logging.info(f"🏁 {job.__name__} {file_id}: {future.result()}")
+            return
+        logging.error(f"❌ {job.__name__} {file_id} interrompu: {error}")
+        if not isinstance(error, BrokenProcessPool):
+            return
+        # Processus tué (mémoire...) : toutes les tâches du pool échouent, nouveau pool
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        # Tâche en attente dans le pool (pas encore réclamée) : pas en cause, soumise à nouveau
+        if job is not run_job or _status(file_id) == "processing":
+            key = f"{job.__name__}:{file_id}"
+            crashes = self._crashes[key] = self._crashes.get(key, 0) + 1
+            if crashes >= JOB_MAX_CRASHES:
+                self._crashes.pop(key, None)
+                if job is run_job:
+                    _abandon(file_id, f"Traitement interrompu {crashes} fois (processus tué)")
+                return
+            if job is run_job:
+                # Reprise par le thread de reprise, une fois le bail du processus mort expiré
+                return
+        if not self._stopping.is_set():
+            self._submit(job, file_id)
+
+    def _submit(self, job: Callable[[str], Optional[str]], file_id: Any) -> None:
+        file_id = str(file_id)
+        executor = self._pool()
+        future = executor.submit(job, file_id)
+        future.add_done_callback(lambda f: self._done(job, file_id, executor, f))
+
+    def enqueue(self, file_id: Any) -> None:
+        self._submit(run_job, file_id)
+
+    def enqueue_ingest(self, file_id: Any) -> None:
+        self._submit(run_ingest, file_id)
+
+    def reclaim_expired(self) -> List[uuid.UUID]:
+        """Remet en file (et soumet) les tâches "processing" dont le bail a expiré."""
+        expired = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE_SECONDS)
+        lapsed = (FileProcess.status == "processing") & (
+            FileProcess.claimed_at.is_(None) | (FileProcess.claimed_at < expired)
+        )
+        db = SessionLocal()
+        try:
+            reclaimed = []
+            for (file_id,) in db.query(FileProcess.id).filter(lapsed).all():
+                # UPDATE conditionnel : deux instances ne reprennent pas la même tâche
+                if db.query(FileProcess).filter(FileProcess.id == file_id, lapsed).update(
+                    {"status": "queued", "claimed_by": None, "claimed_at": None}, synchronize_session=False
+                ):
+                    reclaimed.append(file_id)
+            db.commit()
+        finally:
+            db.close()
+        for file_id in reclaimed:
+            self.enqueue(file_id)
+        if reclaimed:
+            logging.info(f"🔁 {len(reclaimed)} traitement(s) au bail expiré remis en file")
+        return reclaimed
+
+    def _reap(self) -> None:
+        while not self._stopping.wait(JOB_LEASE_SECONDS / 2):
+            try:
+                self.reclaim_expired()
+            except Exception as e:
+                logging.warning(f"⚠️ Reprise des traitements impossible: {e}")
+
+    def start(self) -> None:
+        """Remet en file les tâches en attente ou au bail expiré (appelé au démarrage de l'API)."""
+        db = SessionLocal()
+        try:
+            queued = [row.id for row in db.query(FileProcess.id).filter(FileProcess.status == "queued")]
+        finally:
+            db.close()
+        for file_id in queued:
+            self.enqueue(file_id)
+        if queued:
+            logging.info(f"🔁 {len(queued)} traitement(s) en attente remis en file")
+        self.reclaim_expired()
+        self._stopping.clear()
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap, name="job-reaper", daemon=True)
+            self._reaper.start()
+
+    def shutdown(self) -> None:
+        self._stopping.set()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_queue = JobQueue()
@@ -9,6 +9,7 @@ from ..models.organization import Organization
 from ..models.user import User
 from ..models.file_process import FileProcess
 from ..schemas.organization import OrganizationCreate, OrganizationUpdate
+from .phones import phone_rules
 
 class OrganizationService:
     async def create(self, db: Session, org_data: OrganizationCreate) -> Organization:
@@ -29,7 +30,15 @@ class OrganizationService:
         if not org:
             return None
 
-        for key, value in org_data.dict(exclude_unset=True).items():
+        values = org_data.dict(exclude_unset=True)
+        if values.get("settings") is not None:
+            # Settings lus par les règles : refusés ici plutôt qu'au premier traitement
+            try:
+                phone_rules(values["settings"])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        for key, value in values.items():
             setattr(org, key, value)
         
         db.commit()
@@ -0,0 +1,14 @@
+import pandas as pd
+
+# --- 🐼 Options pandas communes à tous les processus ---
+#
+# Appelé une fois au démarrage de l'API (main.py) et au lancement de chaque
+# processus de pool (sandbox, colonnes, tâches) : le code généré, les intents
+# et les traitements voient tous la même sémantique. Rien n'est changé à
+# l'import d'un module de services.
+
+
+def configure_pandas() -> None:
+    """Copy-on-Write (toujours actif à partir de pandas 3) : l'historique partage les colonnes non modifiées."""
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
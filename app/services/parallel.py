@@ -0,0 +1,148 @@
+import logging
+import math
+import multiprocessing
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import util
+from typing import Any, Callable, List, Optional, Tuple
+import pandas as pd
+import pyarrow as pa
+
+from app.services.pandas_options import configure_pandas
+
+# --- 🧵 Transformations de colonnes réparties sur plusieurs cœurs ---
+#
+# Les étapes colonne d'un plan (pipeline.py) sont indépendantes d'une colonne à
+# l'autre et agissent valeur par valeur : une colonne peut donc être traitée
+# par un processus et une grande colonne découpée en tranches de lignes. Chaque
+# tranche part vers le pool en Arrow IPC (tampons colonnaires, métadonnées
+# pandas pour retrouver le type exact ; lecture sans copie côté destinataire),
+# les colonnes `object` (types Python mélangés) en pickle. Les tranches
+# reviennent dans l'ordre et sont recollées.
+# En dessous de PARALLEL_MIN_ROWS lignes à traiter, ou avec COLUMN_WORKERS <= 1,
+# tout reste dans le processus courant : l'aller-retour coûterait plus cher.
+# Chaque processus du pool de tâches (jobs.py) a son propre pool de colonnes :
+# au plus JOB_WORKERS x COLUMN_WORKERS processus de calcul.
+
+COLUMN_WORKERS = int(os.getenv("COLUMN_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARALLEL_MIN_ROWS = int(os.getenv("PARALLEL_MIN_ROWS", "500000"))
+PARALLEL_CHUNK_ROWS = 100_000
+
+ColumnKernel = Callable[[pd.Series], pd.Series]
+ColumnTask = Tuple[pd.Series, List[ColumnKernel]]
+Encoded = Tuple[str, bytes]
+
+
+def run_kernels(values: pd.Series, kernels: List[ColumnKernel]) -> pd.Series:
+    for kernel in kernels:
+        values = kernel(values)
+    return values
+
+
+# 🏹 Passage des tranches entre processus
+
+def _encode(values: pd.Series) -> Encoded:
+    values = values.reset_index(drop=True)
+    if values.dtype != object:
+        try:
+            table = pa.Table.from_pandas(values.to_frame("values"), preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return "arrow", sink.getvalue().to_pybytes()
+        except (pa.ArrowException, TypeError, ValueError):
+            pass
+    return "pickle", pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(encoded: Encoded) -> pd.Series:
+    kind, data = encoded
+    if kind == "pickle":
+        return pickle.loads(data)
+    table = pa.ipc.open_stream(pa.BufferReader(data)).read_all()
+    return table.to_pandas().iloc[:, 0]
+
+
+def _run_chunk(encoded: Encoded, kernels: List[ColumnKernel]) -> Encoded:
+    # Côté processus du pool
+    return _encode(run_kernels(_decode(encoded), kernels))
+
+
+# 🏊 Pool
+
+class ColumnPool:
+    """Pool de processus pour les transformations de colonnes ; map() retombe en local si besoin."""
+
+    def __init__(self, workers: int = COLUMN_WORKERS, min_rows: int = PARALLEL_MIN_ROWS):
+        self.workers = workers
+        self.min_rows = min_rows
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Dans un processus du pool de tâches (jobs.py), multiprocessing attend ses
+        # enfants à la sortie : le pool est arrêté (et attendu) avant, et avant la
+        # fermeture de ses files (priorité 10), sinon la sortie bloque
+        util.Finalize(self, self.shutdown, kwargs={"wait": True}, exitpriority=100)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    ctx = multiprocessing.get_context("forkserver")
+                    ctx.set_forkserver_preload(["pandas", "numpy", "pyarrow", "app.services.parallel"])
+                else:
+                    ctx = multiprocessing.get_context("spawn")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=ctx, initializer=configure_pandas
+                )
+            return self._executor
+
+    def _chunks(self, tasks: List[ColumnTask]) -> List[Tuple[int, int, int]]:
+        # (tâche, début, fin) : de quoi occuper chaque processus, sans tranches minuscules
+        total = sum(len(values) for values, _ in tasks)
+        size = max(PARALLEL_CHUNK_ROWS, math.ceil(total / self.workers))
+        return [
+            (i, start, min(start + size, len(values)))
+            for i, (values, _) in enumerate(tasks)
+            for start in range(0, len(values), size)
+        ]
+
+    def map(self, tasks: List[ColumnTask]) -> List[pd.Series]:
+        """Applique à chaque colonne sa suite de transformations ; résultats dans l'ordre des tâches."""
+        chunks = self._chunks(tasks) if self.workers > 1 else []
+        if len(chunks) < 2 or sum(len(values) for values, _ in tasks) < self.min_rows:
+            return [run_kernels(values, kernels) for values, kernels in tasks]
+
+        executor = self._pool()
+        try:
+            futures = [
+                executor.submit(_run_chunk, _encode(tasks[i][0].iloc[start:stop]), tasks[i][1])
+                for i, start, stop in chunks
+            ]
+            parts: List[List[pd.Series]] = [[] for _ in tasks]
+            for (i, _, _), future in zip(chunks, futures):
+                parts[i].append(_decode(future.result()))
+        except BrokenProcessPool as e:
+            # Processus tué (mémoire...) : nouveau pool au prochain appel, calcul refait ici
+            logging.warning(f"⚠️ Pool de colonnes interrompu, exécution locale: {e}")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            return [run_kernels(values, kernels) for values, kernels in tasks]
+
+        results = []
+        for (values, _), pieces in zip(tasks, parts):
+            result = pieces[0] if len(pieces) == 1 else pd.concat(pieces, ignore_index=True)
+            results.append(result.set_axis(values.index).rename(values.name))
+        return results
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+column_pool = ColumnPool()
@@ -0,0 +1,190 @@
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+import orjson
+import pandas as pd
+
+# --- 📞 Normalisation des numéros de téléphone (E.164) ---
+#
+# Tout est vectorisé : les chiffres sont extraits en une opération sur la
+# colonne, convertis en entiers (15 chiffres au plus en E.164, donc int64),
+# puis classés avec des tables numpy :
+#   - "+33 6..." ou "0033 6..." : numéro international, l'indicatif est retrouvé
+#     par ses 1 à 3 premiers chiffres et la longueur du numéro national vérifiée ;
+#   - sinon numéro national du pays par défaut : avec préfixe interurbain
+#     ("06..." -> "+336..."), sans ("6..."), ou indicatif sans "+" ("2126...").
+# Les pays sont décrits par COUNTRY_PREFIXES ; une organisation choisit son pays
+# par défaut et complète ou corrige la table dans ses settings :
+#   {"phone": {"default_country": "FR",
+#              "countries": {"XK": {"code": "383", "trunk": "0", "lengths": [8]}}}}
+# Un numéro invalide est laissé tel quel ; normalize_phones retourne aussi le
+# masque des numéros valides.
+
+PHONE_DEFAULT_COUNTRY = os.getenv("PHONE_DEFAULT_COUNTRY", "MA")
+E164_MAX_DIGITS = 15
+# Indicatif absent de la table : seule la forme E.164 est vérifiée
+UNKNOWN_CODE_MIN_DIGITS = 8
+
+# code : indicatif ; trunk : préfixe national à retirer ; lengths : longueurs du numéro national
+COUNTRY_PREFIXES: Dict[str, Dict[str, Any]] = {
+    "MA": {"code": "212", "trunk": "0", "lengths": [9]},
+    "DZ": {"code": "213", "trunk": "0", "lengths": [8, 9]},
+    "TN": {"code": "216", "trunk": "", "lengths": [8]},
+    "SN": {"code": "221", "trunk": "", "lengths": [9]},
+    "CI": {"code": "225", "trunk": "", "lengths": [10]},
+    "FR": {"code": "33", "trunk": "0", "lengths": [9]},
+    "BE": {"code": "32", "trunk": "0", "lengths": [8, 9]},
+    "CH": {"code": "41", "trunk": "0", "lengths": [9]},
+    "NL": {"code": "31", "trunk": "0", "lengths": [9]},
+    "DE": {"code": "49", "trunk": "0", "lengths": [7, 8, 9, 10, 11]},
+    "GB": {"code": "44", "trunk": "0", "lengths": [10]},
+    "ES": {"code": "34", "trunk": "", "lengths": [9]},
+    "PT": {"code": "351", "trunk": "", "lengths": [9]},
+    "US": {"code": "1", "trunk": "1", "lengths": [10]},
+    "CA": {"code": "1", "trunk": "1", "lengths": [10]},
+}
+
+
+def _check_country(iso: str, entry: Any) -> Dict[str, Any]:
+    if not isinstance(entry, dict):
+        raise ValueError(f"Pays {iso} : objet {{code, trunk, lengths}} attendu")
+    code = str(entry.get("code", "")).lstrip("+")
+    trunk = str(entry.get("trunk") or "")
+    lengths = entry.get("lengths")
+    if not (code.isdigit() and 1 <= len(code) <= 3 and code[0] != "0"):
+        raise ValueError(f"Pays {iso} : indicatif invalide ({entry.get('code')})")
+    if trunk and not (trunk.isdigit() and len(trunk) <= 2):
+        raise ValueError(f"Pays {iso} : préfixe national invalide ({trunk})")
+    if not isinstance(lengths, list) or not lengths or not all(
+        isinstance(n, int) and 4 <= n <= E164_MAX_DIGITS - len(code) for n in lengths
+    ):
+        raise ValueError(f"Pays {iso} : 'lengths' doit lister les longueurs du numéro national")
+    return {"code": code, "trunk": trunk, "lengths": sorted(set(lengths))}
+
+
+class PhoneRules:
+    """Table des pays compilée en tableaux numpy (objet picklable, envoyé tel quel au pool de colonnes)."""
+
+    def __init__(self, countries: Dict[str, Dict[str, Any]], default_country: str):
+        self.countries = countries
+        self.default_country = default_country
+        codes = sorted({entry["code"] for entry in countries.values()})
+        # country_of[L][p] : index de l'indicatif de L chiffres valant p, -1 sinon
+        self.country_of = [np.full(10 ** size, -1, dtype=np.int16) for size in (1, 2, 3)]
+        # national_ok[i, n] : n est une longueur de numéro national pour l'indicatif i
+        self.national_ok = np.zeros((len(codes), E164_MAX_DIGITS + 1), dtype=bool)
+        for i, code in enumerate(codes):
+            self.country_of[len(code) - 1][int(code)] = i
+        for entry in countries.values():
+            self.national_ok[codes.index(entry["code"]), entry["lengths"]] = True
+
+    def country(self, iso: Optional[str] = None) -> Dict[str, Any]:
+        iso = (iso or self.default_country).upper()
+        if iso not in self.countries:
+            raise ValueError(f"Pays inconnu pour les téléphones: {iso}")
+        return self.countries[iso]
+
+
+@lru_cache(maxsize=64)
+def _phone_rules(key: bytes) -> PhoneRules:
+    config = orjson.loads(key)
+    extra = config.get("countries") or {}
+    if not isinstance(extra, dict):
+        raise ValueError("'countries' doit être un objet {code pays: {code, trunk, lengths}}")
+    countries = dict(COUNTRY_PREFIXES)
+    countries.update({str(iso).upper(): _check_country(str(iso), entry) for iso, entry in extra.items()})
+    default_country = str(config.get("default_country") or PHONE_DEFAULT_COUNTRY).upper()
+    if default_country not in countries:
+        raise ValueError(f"Pays par défaut inconnu pour les téléphones: {default_country}")
+    return PhoneRules(countries, default_country)
+
+
+def phone_rules(settings: Optional[Dict[str, Any]] = None) -> PhoneRules:
+    """Règles de l'organisation (clé "phone" de ses settings) ; ValueError si elles sont invalides."""
+    config = (settings or {}).get("phone") or {}
+    if not isinstance(config, dict):
+        raise ValueError("settings.phone doit être un objet")
+    return _phone_rules(orjson.dumps(config, option=orjson.OPT_SORT_KEYS))
+
+
+def _pow10(exponents: np.ndarray) -> np.ndarray:
+    return np.power(10, np.clip(exponents, 0, 18), dtype=np.int64)
+
+
+def _international(numbers: np.ndarray, sizes: np.ndarray, rules: PhoneRules) -> np.ndarray:
+    """Numéros (indicatif compris) dont l'indicatif et la longueur sont reconnus."""
+    valid = np.zeros(len(numbers), dtype=bool)
+    found = np.zeros(len(numbers), dtype=bool)
+    for size, table in enumerate(rules.country_of, start=1):
+        candidate = ~found & (sizes > size)
+        prefix = numbers // _pow10(sizes - size)
+        index = np.full(len(numbers), -1, dtype=np.int16)
+        index[candidate] = table[prefix[candidate]]
+        hit = index >= 0
+        valid[hit] = rules.national_ok[index[hit], sizes[hit] - size]
+        found |= hit
+    unknown = ~found & (sizes >= UNKNOWN_CODE_MIN_DIGITS) & (numbers // _pow10(sizes - 1) > 0)
+    return valid | unknown
+
+
+def normalize_phones(
+    values: pd.Series, rules: Optional[PhoneRules] = None, country: Optional[str] = None
+) -> Tuple[pd.Series, pd.Series]:
+    """
+    (numéros au format E.164, masque des numéros valides). `country` remplace le
+    pays par défaut des règles ; les valeurs invalides ou manquantes sont rendues
+    telles quelles (en texte).
+    """
+    rules = rules or phone_rules()
+    home = rules.country(country)
+    code, trunk, lengths = home["code"], home["trunk"], home["lengths"]
+
+    if pd.api.types.is_float_dtype(values.dtype) and (values.dropna() % 1 == 0).all():
+        # Colonne de numéros lue en float (zéro de tête perdu) : "612345678.0" -> "612345678"
+        text = values.astype("Int64").astype(str)
+    else:
+        text = values.astype(str)
+    text = text.where(values.notna()).reset_index(drop=True)
+
+    # Chiffres seuls ; l'expression régulière ne passe que sur les valeurs avec séparateurs
+    digits = text.copy()
+    clean = text.str.isdigit().fillna(False).to_numpy(dtype=bool)
+    if not clean.all():
+        digits[~clean] = text[~clean].str.replace(r"\D", "", regex=True)
+    sizes = digits.str.len().fillna(0).to_numpy(dtype=np.int64)
+    parsable = sizes > 0
+
+    # Forme internationale : "+" en tête, ou "00" devant l'indicatif
+    plus = text.str.lstrip().str.startswith("+").fillna(False).to_numpy(dtype=bool)
+    double_zero = ~plus & digits.str.startswith("00").fillna(False).to_numpy(dtype=bool)
+    international = parsable & (plus | double_zero)
+    intl_sizes = sizes - 2 * double_zero
+
+    # Forme nationale du pays par défaut
+    starts_trunk = (
+        digits.str.startswith(trunk).fillna(False).to_numpy(dtype=bool) if trunk else np.zeros(len(text), dtype=bool)
+    )
+    national = parsable & ~international
+    with_trunk = national & starts_trunk & np.isin(sizes - len(trunk), lengths)
+    bare = national & ~with_trunk & ~starts_trunk & np.isin(sizes, lengths)
+    prefixed = (
+        national & ~with_trunk & ~bare
+        & digits.str.startswith(code).fillna(False).to_numpy(dtype=bool)
+        & np.isin(sizes - len(code), lengths)
+    )
+
+    # Indicatif des numéros internationaux : entiers (les zéros de tête de "00" ne comptent pas)
+    valid = with_trunk | bare | prefixed
+    checked = international & (intl_sizes <= E164_MAX_DIGITS)
+    numbers = digits[checked].astype(np.int64).to_numpy()
+    valid[checked] = _international(numbers, intl_sizes[checked], rules)
+    e164_sizes = np.where(with_trunk, sizes - len(trunk) + len(code), np.where(bare, sizes + len(code), intl_sizes))
+    valid &= e164_sizes <= E164_MAX_DIGITS
+
+    formatted = "+" + digits
+    formatted[double_zero] = "+" + digits[double_zero].str.slice(2)
+    formatted[bare] = f"+{code}" + digits[bare]
+    formatted[with_trunk] = f"+{code}" + digits[with_trunk].str.slice(len(trunk))
+    result = text.where(~valid, formatted)
+    return result.set_axis(values.index).rename(values.name), pd.Series(valid, index=values.index, name=values.name)
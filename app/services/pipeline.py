@@ -0,0 +1,399 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import numpy as np
+import orjson
+import pandas as pd
+
+from app.services.cleaner import (
+    remove_duplicates,
+    remove_empty_rows,
+    clear_values,
+    format_phone_values,
+    capitalize_values,
+)
+from app.services.dates import format_dates, parse_dates
+from app.services.enrichment import lookup_replace, add_concatenated_column
+from app.services.parallel import ColumnKernel, column_pool
+from app.services.phones import PhoneRules, normalize_phones, phone_rules
+from app.services.streaming import StreamDeduplicate, StreamStep
+
+# --- 🛠️ Moteur de règles : configuration d'une ProcessingRule -> plan d'exécution ---
+#
+# Une configuration est une étape {"type": ...} ou {"steps": [étapes...]}. Elle
+# est compilée une fois en Plan, suite d'étapes de deux sortes :
+#   - ColumnPass : étapes qui ne touchent qu'une colonne (format_phone,
+#     capitalize, lookup...). Les étapes consécutives sont fusionnées : chaque
+#     colonne concernée est lue une fois, passe par toutes ses transformations
+#     (fonctions Series -> Series de cleaner.py / enrichment.py) puis est écrite
+#     une fois ; les autres colonnes ne sont pas touchées. Ces transformations
+#     agissent valeur par valeur : sur une colonne répétitive (villes, codes...),
+#     elles ne sont calculées que sur les valeurs distinctes. Les colonnes
+#     d'une passe sont indépendantes : sur un gros fichier, elles sont
+#     réparties (et découpées en tranches) sur plusieurs cœurs, voir parallel.py.
+#   - FrameStep : étapes sur les lignes ou plusieurs colonnes (doublons,
+#     suppressions, concaténation, instruction en langage naturel reconnue par
+#     intents.py, sans LLM).
+#   - DateStep : dates d'une colonne (standardize_date, format_column vers un
+#     format de date). Les formats sont déduits de la colonne entière (dates.py),
+#     pas valeur par valeur : étape à part, qui rapporte combien de valeurs
+#     chaque format a lues (détails de la tâche).
+# Le plan est mis en cache par version de règle (empreinte de la configuration) :
+# une règle modifiée est recompilée, une règle inchangée ne l'est jamais deux fois.
+# Les settings de l'organisation qui changent le résultat (RULE_SETTINGS : pays
+# des téléphones...) sont copiés avec le traitement et font partie de la clé.
+
+PLAN_CACHE_SIZE = 256
+RULE_SETTINGS = ("phone",)
+DISTINCT_MIN_ROWS = 10_000
+DISTINCT_MAX_RATIO = 0.5
+
+FrameFunction = Callable[[pd.DataFrame, Dict[str, Any]], pd.DataFrame]
+KernelFactory = Callable[[Dict[str, Any], Dict[str, Any]], ColumnKernel]
+
+
+def resolve_column(df: pd.DataFrame, name: Any) -> Any:
+    if name in df.columns:
+        return name
+    # Même tolérance que l'éditeur de règles : casse et espaces ignorés
+    wanted = _column_key(name)
+    for col in df.columns:
+        if _column_key(col) == wanted:
+            return col
+    raise ValueError(f"Colonne introuvable: {name}")
+
+
+def _column_key(name: Any) -> str:
+    return str(name or "").strip().lower()
+
+
+# 🧹 Étapes sur tout le DataFrame
+
+def _deduplicate(df: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    if step.get("column"):
+        return df.drop_duplicates(subset=[resolve_column(df, step["column"])])
+    return remove_duplicates(df)
+
+
+def _delete_rows(df: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    column = resolve_column(df, step.get("column"))
+    value = str(step.get("value", "")).strip().lower()
+    return df[df[column].astype(str).str.strip().str.lower() != value]
+
+
+def _concatenate(df: pd.DataFrame, step: Dict[str, Any]) -> pd.DataFrame:
+    columns = [resolve_column(df, name) for name in step["columns"]]
+    return add_concatenated_column(df, columns, step["target"], step.get("separator", " "))
+
+
+def _phones_with_mask(df: pd.DataFrame, step: Dict[str, Any], rules: PhoneRules) -> pd.DataFrame:
+    column = resolve_column(df, step["column"])
+    df[column], df[step["valid_column"]] = normalize_phones(df[column], rules, step.get("country"))
+    return df
+
+
+def _parse_prompt(df: pd.DataFrame, step: Dict[str, Any]):
+    # Import tardif : intents -> code_cache, inutile pour les autres étapes
+    from app.services.intents import parse_intent
+
+    intent = parse_intent(step.get("prompt", ""), df)
+    if intent is None:
+        raise ValueError(f"Instruction non reconnue: {step.get('prompt')}")
+    return intent
+
+
+def _prompt(df: pd.DataFrame, step: Dict[str, Any], rules: Optional[PhoneRules] = None) -> pd.DataFrame:
+    from app.services.intents import apply_intent
+
+    return apply_intent(df, _parse_prompt(df, step), rules)
+
+
+FRAME_STEPS: Dict[str, FrameFunction] = {
+    "deduplicate": _deduplicate,
+    "remove_duplicates": _deduplicate,
+    "delete_rows": _delete_rows,
+    "remove_empty_rows": lambda df, step: remove_empty_rows(df),
+    "concatenate": _concatenate,
+    "prompt": _prompt,
+}
+
+
+# 🧬 Étapes sur une seule colonne (fonction Series -> Series construite à la compilation)
+
+def _step_phone_rules(step: Dict[str, Any], settings: Dict[str, Any]) -> PhoneRules:
+    rules = phone_rules(settings)
+    rules.country(step.get("country"))  # Pays inconnu refusé dès la compilation
+    return rules
+
+
+def _phone_kernel(step: Dict[str, Any], settings: Dict[str, Any]) -> ColumnKernel:
+    return partial(format_phone_values, rules=_step_phone_rules(step, settings), country=step.get("country"))
+
+
+def _format_kernel(step: Dict[str, Any], settings: Dict[str, Any]) -> ColumnKernel:
+    if step.get("format") == "phone":
+        return _phone_kernel(step, settings)
+    return capitalize_values  # Les autres formats sont des dates : DateStep
+
+
+COLUMN_STEPS: Dict[str, KernelFactory] = {
+    "clear_column": lambda step, settings: clear_values,
+    "format_phone": _phone_kernel,
+    "capitalize": lambda step, settings: capitalize_values,
+    "lookup": lambda step, settings: partial(lookup_replace, mapping=step.get("values") or {}),
+    "format_column": _format_kernel,
+}
+
+DATE_STEPS = ("standardize_date",)
+STEP_TYPES = tuple(FRAME_STEPS) + tuple(COLUMN_STEPS) + DATE_STEPS
+
+
+def _date_format(step: Dict[str, Any]) -> Optional[str]:
+    """Format de sortie si l'étape écrit des dates, None sinon."""
+    output_format = step.get("format") or "%Y-%m-%d"
+    if step["type"] in DATE_STEPS:
+        return output_format
+    if step["type"] == "format_column" and output_format not in ("phone", "capitalize"):
+        return "%Y-%m-%d" if output_format == "date" else output_format
+    return None
+
+
+# 📋 Plan
+
+def _distinct(values: pd.Series) -> Tuple[pd.Series, Optional[np.ndarray]]:
+    """(valeurs à transformer, codes pour revenir aux lignes) ; codes None si la colonne est peu répétitive."""
+    if len(values) >= DISTINCT_MIN_ROWS:
+        try:
+            # Valeurs manquantes gardées comme une valeur distincte : les fonctions les voient
+            codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        except TypeError:
+            return values, None  # Valeurs non hachables (listes...)
+        if len(uniques) <= DISTINCT_MAX_RATIO * len(values):
+            return pd.Series(uniques, name=values.name), codes
+    return values, None
+
+
+class ColumnPass:
+    """Étapes colonne consécutives : une lecture et une écriture par colonne touchée."""
+
+    def __init__(self):
+        # clé de colonne -> (nom demandé, [(type d'étape, fonction)])
+        self.columns: "OrderedDict[str, Tuple[Any, List[Tuple[str, ColumnKernel]]]]" = OrderedDict()
+
+    def add(self, step: Dict[str, Any], settings: Dict[str, Any]) -> None:
+        key = _column_key(step["column"])
+        _, kernels = self.columns.setdefault(key, (step["column"], []))
+        kernels.append((step["type"], COLUMN_STEPS[step["type"]](step, settings)))
+
+    def apply(self, df: pd.DataFrame, reports: Optional[List[Dict[str, Any]]] = None) -> pd.DataFrame:
+        resolved = [(resolve_column(df, name), kernels) for name, kernels in self.columns.values()]
+        distinct = [_distinct(df[column]) for column, _ in resolved]
+        results = column_pool.map([
+            (values, [kernel for _, kernel in kernels])
+            for (values, _), (_, kernels) in zip(distinct, resolved)
+        ])
+        df = df.copy(deep=False)
+        for (column, _), (_, codes), result in zip(resolved, distinct, results):
+            if codes is not None:
+                result = result.take(codes)
+            df[column] = result.set_axis(df.index).rename(column)
+        return df
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "columns": {str(name): [kind for kind, _ in kernels] for name, kernels in self.columns.values()}
+        }
+
+
+class FrameStep:
+    def __init__(self, step: Dict[str, Any], function: Optional[FrameFunction] = None):
+        self.step = step
+        self.function = function or FRAME_STEPS[step["type"]]
+
+    @property
+    def kind(self) -> str:
+        return self.step["type"]
+
+    def apply(self, df: pd.DataFrame, reports: Optional[List[Dict[str, Any]]] = None) -> pd.DataFrame:
+        # Copie superficielle : les fonctions de cleaner.py modifient le DataFrame reçu
+        return self.function(df.copy(deep=False), self.step)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"step": self.kind}
+
+
+class DateStep:
+    """Dates d'une colonne réécrites au format de sortie ; rapport des formats lus dans `reports`."""
+
+    def __init__(self, step: Dict[str, Any], output_format: str):
+        self.step = step
+        self.output_format = output_format
+
+    def apply(self, df: pd.DataFrame, reports: Optional[List[Dict[str, Any]]] = None) -> pd.DataFrame:
+        column = resolve_column(df, self.step["column"])
+        dates, report = parse_dates(df[column], self.step.get("dayfirst", True))
+        df = df.copy(deep=False)
+        df[column] = format_dates(dates, self.output_format)
+        if reports is not None:
+            reports.append({"column": str(column), **report})
+        return df
+
+    def describe(self) -> Dict[str, Any]:
+        return {"step": self.step["type"], "column": str(self.step["column"]), "format": self.output_format}
+
+
+Stage = Union[ColumnPass, FrameStep, DateStep]
+
+
+class _StreamPrompt:
+    """Instruction reconnue une fois, sur le premier bloc, puis appliquée à tous les blocs."""
+
+    def __init__(self, step: Dict[str, Any], rules: Optional[PhoneRules] = None):
+        self.step = step
+        self.rules = rules
+        self._apply: Optional[StreamStep] = None
+
+    def __call__(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        if self._apply is None:
+            from app.services.intents import apply_intent
+
+            intent = _parse_prompt(chunk, self.step)
+            if intent.action == "remove_duplicates":
+                self._apply = StreamDeduplicate()
+            else:
+                self._apply = lambda c: apply_intent(c, intent, self.rules)
+        return self._apply(chunk)
+
+    def close(self) -> None:
+        if hasattr(self._apply, "close"):
+            self._apply.close()
+
+
+class _StreamDates:
+    """DateStep bloc par bloc ; `report` cumule les valeurs lues par format sur tout le fichier."""
+
+    def __init__(self, stage: DateStep):
+        self.stage = stage
+        self.report: Dict[str, Any] = {"column": str(stage.step["column"]), "formats": {}, "unparsed": 0, "missing": 0}
+
+    def __call__(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        reports: List[Dict[str, Any]] = []
+        chunk = self.stage.apply(chunk, reports)
+        for report in reports:
+            for fmt, rows in report["formats"].items():
+                self.report["formats"][fmt] = self.report["formats"].get(fmt, 0) + rows
+            self.report["unparsed"] += report["unparsed"]
+            self.report["missing"] += report["missing"]
+        return chunk
+
+
+class Plan:
+    def __init__(self, version: str, stages: List[Stage], settings: Optional[Dict[str, Any]] = None):
+        self.version = version
+        self.stages = stages
+        self.settings = settings or {}
+
+    def apply(self, df: pd.DataFrame, reports: Optional[List[Dict[str, Any]]] = None) -> pd.DataFrame:
+        """Applique le plan ; les étapes de dates ajoutent leur rapport à `reports` s'il est fourni."""
+        for stage in self.stages:
+            df = stage.apply(df, reports)
+        return df
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [stage.describe() for stage in self.stages]
+
+    def stream_steps(self) -> List[StreamStep]:
+        """Mêmes étapes pour un traitement bloc par bloc (streaming.py) ; état neuf à chaque appel."""
+        steps: List[StreamStep] = []
+        for stage in self.stages:
+            if isinstance(stage, FrameStep) and stage.kind in ("deduplicate", "remove_duplicates"):
+                # Doublons sur tout le fichier, pas seulement à l'intérieur d'un bloc
+                column = stage.step.get("column")
+                steps.append(StreamDeduplicate((lambda chunk: [resolve_column(chunk, column)]) if column else None))
+            elif isinstance(stage, FrameStep) and stage.kind == "prompt":
+                steps.append(_StreamPrompt(stage.step, phone_rules(self.settings)))
+            elif isinstance(stage, DateStep):
+                steps.append(_StreamDates(stage))
+            else:
+                steps.append(stage.apply)
+        return steps
+
+
+def _validate(step: Dict[str, Any]) -> None:
+    kind = step.get("type") if isinstance(step, dict) else None
+    if kind not in STEP_TYPES:
+        raise ValueError(f"Type d'étape inconnu: {kind}")
+    if kind in COLUMN_STEPS or kind in DATE_STEPS or kind == "delete_rows":
+        if not step.get("column"):
+            raise ValueError(f"L'étape {kind} attend 'column'")
+    if kind == "concatenate" and not (step.get("columns") and step.get("target")):
+        raise ValueError("L'étape concatenate attend 'columns' et 'target'")
+    if kind == "lookup" and not isinstance(step.get("values", {}), dict):
+        raise ValueError("L'étape lookup attend 'values' (objet valeur -> remplacement)")
+    if "valid_column" in step and (kind != "format_phone" or not isinstance(step["valid_column"], str)):
+        raise ValueError("'valid_column' (nom de colonne) n'est accepté que par l'étape format_phone")
+    if not isinstance(step.get("dayfirst", True), bool):
+        raise ValueError("'dayfirst' doit être true ou false")
+
+
+def rule_version(configuration: Dict[str, Any]) -> str:
+    """Empreinte de la configuration : change dès que la règle est modifiée."""
+    return hashlib.sha256(orjson.dumps(configuration, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+
+
+def plan_settings(settings: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Part des settings d'une organisation utilisée par les plans (copiée avec chaque traitement)."""
+    return {key: settings[key] for key in RULE_SETTINGS if settings and settings.get(key) is not None}
+
+
+def _compile(configuration: Dict[str, Any], version: str, settings: Dict[str, Any]) -> Plan:
+    if not isinstance(configuration, dict):
+        raise ValueError("La configuration d'une règle doit être un objet")
+    steps = configuration.get("steps", [configuration])
+    if not isinstance(steps, list) or not steps:
+        raise ValueError("'steps' doit être une liste d'étapes non vide")
+    stages: List[Stage] = []
+    for step in steps:
+        _validate(step)
+        if step.get("valid_column"):
+            # Deux colonnes écrites (numéros + masque de validité) : étape hors passe colonne
+            stages.append(FrameStep(step, partial(_phones_with_mask, rules=_step_phone_rules(step, settings))))
+        elif _date_format(step):
+            stages.append(DateStep(step, _date_format(step)))
+        elif step["type"] in COLUMN_STEPS:
+            if not stages or not isinstance(stages[-1], ColumnPass):
+                stages.append(ColumnPass())
+            stages[-1].add(step, settings)
+        elif step["type"] == "prompt":
+            # Instruction reconnue à l'exécution : règles téléphoniques de l'organisation fixées ici
+            stages.append(FrameStep(step, partial(_prompt, rules=phone_rules(settings))))
+        else:
+            stages.append(FrameStep(step))
+    return Plan(version, stages, settings)
+
+
+_plans: "OrderedDict[str, Plan]" = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def compile_rule(configuration: Dict[str, Any], settings: Optional[Dict[str, Any]] = None) -> Plan:
+    """
+    Plan de la configuration (ValueError si elle ou les settings sont invalides),
+    compilé une fois par version et par settings d'organisation.
+    """
+    version = rule_version(configuration)
+    settings = plan_settings(settings)
+    key = f"{version}:{rule_version(settings)}" if settings else version
+    with _plans_lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return plan
+    plan = _compile(configuration, version, settings)
+    with _plans_lock:
+        _plans[key] = plan
+        if len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
@@ -0,0 +1,106 @@
+import math
+from datetime import date, datetime
+from typing import Any, Dict, List
+import numpy as np
+import pandas as pd
+
+# --- 📊 Statistiques de colonnes calculées à l'ingestion ---
+#
+# Stockées dans FileProcess.file_metadata["column_stats"] : les vues de statut et
+# d'historique les lisent sans rouvrir le fichier. Tout est vectorisé ; le nombre
+# de valeurs distinctes est exact jusqu'à PROFILE_SAMPLE_ROWS lignes, estimé
+# au-delà sur un échantillon (estimateur Duj1), et le type sémantique des colonnes
+# texte est déduit d'un échantillon de valeurs non nulles.
+
+PROFILE_SAMPLE_ROWS = 100_000
+SEMANTIC_SAMPLE_SIZE = 1_000
+SEMANTIC_MATCH_RATIO = 0.9
+CATEGORICAL_MAX_DISTINCT = 50
+
+EMAIL_RE = r"^[\w.+-]+@[\w-]+(\.[\w-]+)+$"
+URL_RE = r"^(https?://|www\.)\S+$"
+PHONE_RE = r"^\+?[\d\s().-]{8,20}$"
+
+
+def _json_scalar(value: Any) -> Any:
+    """Valeur sérialisable en JSON (colonne JSON de la base)."""
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _distinct(values: pd.Series) -> Dict[str, Any]:
+    if len(values) <= PROFILE_SAMPLE_ROWS:
+        return {"distinct": int(values.nunique()), "distinct_exact": True}
+    sample = values.sample(PROFILE_SAMPLE_ROWS, random_state=0)
+    frequencies = sample.value_counts()
+    singletons = int((frequencies == 1).sum())
+    # Duj1 (Haas & Stokes) : n * d / (n - f1 + f1 * n / N)
+    n, total = len(sample), len(values)
+    estimate = n * len(frequencies) / (n - singletons + singletons * n / total)
+    return {"distinct": int(min(round(estimate), len(values))), "distinct_exact": False}
+
+
+def _text_semantic_type(values: pd.Series, distinct: int) -> str:
+    sample = values.astype(str).str.strip()
+    if len(sample) > SEMANTIC_SAMPLE_SIZE:
+        sample = sample.sample(SEMANTIC_SAMPLE_SIZE, random_state=0)
+    for semantic_type, pattern in (("email", EMAIL_RE), ("url", URL_RE), ("phone", PHONE_RE)):
+        if sample.str.match(pattern).mean() >= SEMANTIC_MATCH_RATIO:
+            if semantic_type != "phone" or sample.str.count(r"\d").between(8, 15).mean() >= SEMANTIC_MATCH_RATIO:
+                return semantic_type
+    if sample.str.contains(r"\d").mean() >= SEMANTIC_MATCH_RATIO:
+        parsed = pd.to_datetime(sample, errors="coerce", format="mixed", dayfirst=True)
+        if parsed.notna().mean() >= SEMANTIC_MATCH_RATIO:
+            return "date"
+    numeric = pd.to_numeric(sample.str.replace(",", ".", regex=False), errors="coerce")
+    if numeric.notna().mean() >= SEMANTIC_MATCH_RATIO:
+        return "number"
+    if distinct <= CATEGORICAL_MAX_DISTINCT and distinct <= 0.05 * len(values):
+        return "categorical"
+    return "text"
+
+
+def _column_stats(name: Any, col: pd.Series) -> Dict[str, Any]:
+    values = col.dropna()
+    stats: Dict[str, Any] = {
+        "name": str(name),
+        "dtype": str(col.dtype),
+        "null_count": int(len(col) - len(values)),
+    }
+    if values.empty:
+        return {**stats, "distinct": 0, "distinct_exact": True, "min": None, "max": None, "semantic_type": "empty"}
+    try:
+        stats.update(_distinct(values))
+    except TypeError:
+        # Valeurs non hachables (listes, dicts...) : pas de comptage des distincts
+        stats.update(distinct=None, distinct_exact=False)
+
+    if pd.api.types.is_bool_dtype(col):
+        semantic_type = "boolean"
+    elif pd.api.types.is_numeric_dtype(col):
+        semantic_type = "integer" if pd.api.types.is_integer_dtype(col) else "float"
+    elif pd.api.types.is_datetime64_any_dtype(col):
+        semantic_type = "datetime"
+    else:
+        semantic_type = _text_semantic_type(values, stats["distinct"] or len(values))
+
+    if semantic_type in ("integer", "float", "datetime"):
+        stats.update(min=_json_scalar(values.min()), max=_json_scalar(values.max()))
+    else:
+        stats.update(min=None, max=None)
+    stats["semantic_type"] = semantic_type
+    return stats
+
+
+def column_stats(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Une entrée par colonne : nulls, min / max, distincts (exacts ou estimés), type sémantique."""
+    return [_column_stats(name, df.iloc[:, i]) for i, name in enumerate(df.columns)]
@@ -3,6 +3,7 @@ from typing import List, Dict, Any, Tuple
 import openai
 import os
 from app.models.gpt_response import GPTResponse
+from app.services.sandbox import sandbox
 
 # Configuration de l'API OpenAI
 openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -67,14 +68,11 @@ async def generate_kpi(data: List[Dict[str, Any]], query: str) -> Tuple[List[Dic
 
         # Si du code a été généré, l'exécuter
         if gpt_response.code:
-            # Créer un environnement local pour l'exécution
-            local_vars = {'df': df.copy(), 'pd': pd}
-            
-            # Exécuter le code
-            exec(gpt_response.code, {}, local_vars)
+            # Exécuter le code dans un processus isolé (timeout, limites CPU / mémoire)
+            outputs = await sandbox.run(gpt_response.code, frames={'df': df}, outputs=['df_kpi'])
             
             # Récupérer le DataFrame des KPIs
-            df_kpi = local_vars.get('df_kpi', None)
+            df_kpi = outputs.get('df_kpi', None)
             
             if df_kpi is not None and isinstance(df_kpi, pd.DataFrame):
                 return df_kpi.to_dict('records'), gpt_response.message
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# --- 🪟 Accès fenêtré aux lignes d'un DataFrame de session ---
+#
+# Tri et filtres sont appliqués côté serveur ; on garde en cache les positions
+# de lignes résultantes pour que le défilement (offset/limit) ne re-trie pas
+# tout le DataFrame à chaque page.
+
+FILTER_OPERATORS = {"eq", "ne", "contains", "startswith", "gt", "gte", "lt", "lte", "isnull", "notnull"}
+MAX_CACHED_VIEWS = 32
+
+_view_cache: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+
+
+def parse_sort(sort: Optional[str]) -> List[Tuple[str, bool]]:
+    """'-Ville,Nom' -> [('Ville', False), ('Nom', True)] (colonne, ordre croissant)."""
+    if not sort:
+        return []
+    keys = []
+    for part in sort.split(","):
+        part = part.strip()
+        if part:
+            keys.append((part[1:], False) if part.startswith("-") else (part, True))
+    return keys
+
+
+def parse_filters(filters: Optional[List[str]]) -> List[Tuple[str, str, Optional[str]]]:
+    """['Ville:eq:Paris', 'Email:notnull'] -> [('Ville', 'eq', 'Paris'), ('Email', 'notnull', None)]."""
+    parsed = []
+    for raw in filters or []:
+        column, _, rest = raw.partition(":")
+        op, _, value = rest.partition(":")
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Opérateur de filtre inconnu: {op}")
+        parsed.append((column, op, value if op not in ("isnull", "notnull") else None))
+    return parsed
+
+
+def _coerce(series: pd.Series, value: str) -> Any:
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_numeric(value)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Timestamp(value)
+    return value
+
+
+def _filter_mask(df: pd.DataFrame, filters: List[Tuple[str, str, Optional[str]]]) -> np.ndarray:
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Catégories non ordonnées : comparaisons sur les valeurs
+            series = series.astype(series.dtype.categories.dtype)
+        if op == "isnull":
+            cond = series.isna()
+        elif op == "notnull":
+            cond = series.notna()
+        elif op == "contains":
+            cond = series.astype(str).str.contains(value, case=False, regex=False)
+        elif op == "startswith":
+            cond = series.astype(str).str.lower().str.startswith(value.lower())
+        else:
+            target = _coerce(series, value)
+            cond = {
+                "eq": lambda: series == target,
+                "ne": lambda: series != target,
+                "gt": lambda: series > target,
+                "gte": lambda: series >= target,
+                "lt": lambda: series < target,
+                "lte": lambda: series <= target,
+            }[op]()
+        mask &= cond.fillna(False).to_numpy(dtype=bool)
+    return mask
+
+
+def view_positions(
+    df: pd.DataFrame,
+    sort: List[Tuple[str, bool]],
+    filters: List[Tuple[str, str, Optional[str]]],
+    cache_key: Optional[Hashable] = None,
+) -> np.ndarray:
+    """
+    Positions (iloc) des lignes visibles, filtrées puis triées. `cache_key` doit
+    identifier le contenu de `df` (session, historique, version) : il ne doit
+    jamais désigner deux DataFrames différents.
+    """
+    if cache_key is not None:
+        key = (cache_key, tuple(sort), tuple(filters))
+        if key in _view_cache:
+            _view_cache.move_to_end(key)
+            return _view_cache[key]
+
+    positions = np.arange(len(df))
+    if filters:
+        positions = positions[_filter_mask(df, filters)]
+    if sort:
+        columns = [col for col, _ in sort]
+        subset = df[columns].iloc[positions].reset_index(drop=True)
+        try:
+            order = subset.sort_values(
+                by=columns,
+                ascending=[asc for _, asc in sort],
+                kind="stable",
+                na_position="last",
+            ).index.to_numpy()
+        except TypeError as e:
+            # Colonne object aux types mélangés (nombres et textes...) : pas d'ordre défini
+            raise ValueError(f"Tri impossible sur {', '.join(map(str, columns))} : valeurs de types incomparables") from e
+        positions = positions[order]
+
+    if cache_key is not None:
+        _view_cache[key] = positions
+        while len(_view_cache) > MAX_CACHED_VIEWS:
+            _view_cache.popitem(last=False)
+    return positions
+
+
+def window_rows(
+    df: pd.DataFrame,
+    offset: int = 0,
+    limit: int = 200,
+    columns: Optional[List[str]] = None,
+    sort: Optional[str] = None,
+    filters: Optional[List[str]] = None,
+    cache_key: Optional[Hashable] = None,
+) -> Dict[str, Any]:
+    """Retourne une page de lignes (DataFrame, avec leurs identifiants) et le total après filtres."""
+    missing = [col for col in (columns or []) if col not in df.columns]
+    sort_keys = parse_sort(sort)
+    filter_specs = parse_filters(filters)
+    missing += [col for col, _ in sort_keys if col not in df.columns]
+    missing += [col for col, _, _ in filter_specs if col not in df.columns]
+    if missing:
+        raise KeyError(f"Colonnes inconnues: {', '.join(dict.fromkeys(missing))}")
+
+    positions = view_positions(df, sort_keys, filter_specs, cache_key)
+    page = df.iloc[positions[offset:offset + limit]]
+    if columns:
+        page = page[columns]
+
+    return {
+        "total_rows": int(len(positions)),
+        "offset": offset,
+        "limit": limit,
+        "columns": [str(col) for col in page.columns],
+        "row_ids": page.index.tolist(),
+        "data": page,
+    }
@@ -0,0 +1,65 @@
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from ..models.organization import Organization
+from ..models.processing_rule import ProcessingRule
+from ..models.user import User
+from ..schemas.rule import RuleCreate, RuleUpdate
+from .pipeline import compile_rule, plan_settings
+
+class RuleService:
+    def _check_configuration(self, configuration: Dict[str, Any], organization: Optional[Organization]) -> None:
+        # Compilée dès l'enregistrement, avec les settings de l'organisation (pays
+        # téléphoniques propres à l'org...) : une règle invalide est refusée tout de suite
+        try:
+            compile_rule(configuration, plan_settings(organization.settings if organization else None))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def _get(self, db: Session, rule_id: str, user: User) -> ProcessingRule:
+        try:
+            rule_uuid = UUID(str(rule_id))
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Règle non trouvée")
+        rule = db.query(ProcessingRule).filter_by(id=rule_uuid, organization_id=user.organization_id).first()
+        if not rule:
+            raise HTTPException(status_code=404, detail="Règle non trouvée")
+        return rule
+
+    async def create(self, db: Session, rule_data: RuleCreate, user: User) -> ProcessingRule:
+        """Crée une règle pour l'organisation de l'utilisateur"""
+        if rule_data.organization_id != user.organization_id and not user.is_admin:
+            raise HTTPException(status_code=403, detail="Permission refusée")
+        self._check_configuration(rule_data.configuration, db.get(Organization, rule_data.organization_id))
+        rule = ProcessingRule(**rule_data.dict(), created_by=user.id)
+        db.add(rule)
+        db.commit()
+        db.refresh(rule)
+        return rule
+
+    async def get_all(self, db: Session, organization_id: UUID) -> List[ProcessingRule]:
+        """Règles de l'organisation, les plus récentes d'abord"""
+        return db.query(ProcessingRule)\
+            .filter_by(organization_id=organization_id)\
+            .order_by(ProcessingRule.created_at.desc())\
+            .all()
+
+    async def update(self, db: Session, rule_id: str, rule_data: RuleUpdate, user: User) -> ProcessingRule:
+        """Met à jour une règle (une nouvelle configuration donne une nouvelle version de plan)"""
+        rule = self._get(db, rule_id, user)
+        values = rule_data.dict(exclude_unset=True)
+        if values.get("configuration") is not None:
+            self._check_configuration(values["configuration"], rule.organization)
+        for key, value in values.items():
+            setattr(rule, key, value)
+        db.commit()
+        db.refresh(rule)
+        return rule
+
+    async def delete(self, db: Session, rule_id: str, user: User) -> None:
+        """Supprime une règle (les traitements passés gardent leur copie de la configuration)"""
+        rule = self._get(db, rule_id, user)
+        db.delete(rule)
+        db.commit()
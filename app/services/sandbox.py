@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import re
+import signal
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from app.services.spill import frame_to_bytes, frame_from_bytes
+from app.services.dtypes import compute_dtypes
+from app.services.pandas_options import configure_pandas
+
+try:
+    import resource
+except ImportError:  # Windows : pas de limites CPU par appel
+    resource = None
+
+# --- 🧪 Exécution isolée du code généré par le LLM ---
+#
+# Le code tourne dans un pool de processus pré-démarrés (pandas déjà importé via
+# le forkserver). Les DataFrames transitent en Arrow IPC ; chaque appel est borné
+# en temps réel (SANDBOX_TIMEOUT_SECONDS), en temps CPU (RLIMIT_CPU) et en mémoire
+# résidente (SANDBOX_MAX_RSS_BYTES, surveillée dans le processus). Un processus
+# qui dépasse une limite, ou dont l'appel est annulé, est tué puis remplacé.
+#
+# SANDBOX_WORKERS=0 exécute le code dans un thread du processus API (développement).
+
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", str(min(4, os.cpu_count() or 1))))
+SANDBOX_TIMEOUT_SECONDS = float(os.getenv("SANDBOX_TIMEOUT_SECONDS", "30"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "30"))
+SANDBOX_MAX_RSS_BYTES = int(os.getenv("SANDBOX_MAX_RSS_BYTES", str(2 * 1024 ** 3)))
+SANDBOX_MAX_TASKS_PER_WORKER = int(os.getenv("SANDBOX_MAX_TASKS_PER_WORKER", "200"))
+
+MEMORY_EXIT_CODE = 86
+EXEC_GLOBALS = {"pd": pd, "np": np, "re": re}
+
+
+class SandboxError(Exception):
+    """Erreur levée par le code exécuté, ou interruption du processus d'exécution."""
+
+
+class SandboxTimeout(SandboxError):
+    pass
+
+
+class SandboxMemoryError(SandboxError):
+    pass
+
+
+def _execute(code: str, frames: Dict[str, pd.DataFrame], helpers: Dict[str, Any], outputs: List[str]) -> Dict[str, Any]:
+    # Types compacts de la session (catégories, int32...) élargis pour le code utilisateur
+    local_vars = {**{name: compute_dtypes(df) for name, df in frames.items()}, **helpers}
+    exec(code, dict(EXEC_GLOBALS), local_vars)
+    return {name: local_vars[name] for name in outputs if name in local_vars}
+
+
+# 👷 Côté processus d'exécution
+
+def _current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _watch_memory(max_rss: int) -> None:
+    while True:
+        if _current_rss() > max_rss:
+            os._exit(MEMORY_EXIT_CODE)
+        time.sleep(0.05)
+
+
+def _encode_value(value: Any) -> tuple:
+    if isinstance(value, pd.DataFrame):
+        return "frame", frame_to_bytes(value, compression=None)
+    return "pickle", pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _decode_value(kind: str, data: bytes) -> Any:
+    return frame_from_bytes(data) if kind == "frame" else pickle.loads(data)
+
+
+def _handle(request: Dict[str, Any]) -> Dict[str, Any]:
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime) + 1
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = used + request["cpu_seconds"]
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    try:
+        frames = {name: frame_from_bytes(data) for name, data in request["frames"].items()}
+        helpers = pickle.loads(request["helpers"])
+        results = _execute(request["code"], frames, helpers, request["outputs"])
+        return {"outputs": {name: _encode_value(value) for name, value in results.items()}}
+    except Exception as e:
+        return {"error": str(e), "error_type": type(e).__name__}
+
+
+def _worker_main(conn, max_rss: int) -> None:
+    configure_pandas()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    threading.Thread(target=_watch_memory, args=(max_rss,), daemon=True).start()
+    while True:
+        try:
+            request = pickle.loads(conn.recv_bytes())
+        except (EOFError, OSError):
+            return
+        conn.send_bytes(pickle.dumps(_handle(request), protocol=pickle.HIGHEST_PROTOCOL))
+
+
+# 🏊 Côté API
+
+class _Worker:
+    def __init__(self, ctx, max_rss: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, max_rss), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+    def _death_error(self) -> SandboxError:
+        self.process.join(1)
+        code = self.process.exitcode
+        self.kill()
+        if code == MEMORY_EXIT_CODE:
+            return SandboxMemoryError("Mémoire maximale dépassée pendant l'exécution du code")
+        if code == -getattr(signal, "SIGXCPU", -1):
+            return SandboxTimeout("Temps CPU maximal dépassé pendant l'exécution du code")
+        return SandboxError(f"Processus d'exécution interrompu (code {code})")
+
+    def call(self, request: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        try:
+            self.conn.send_bytes(pickle.dumps(request, protocol=pickle.HIGHEST_PROTOCOL))
+            if not self.conn.poll(timeout):
+                self.kill()
+                raise SandboxTimeout(f"Temps d'exécution dépassé ({timeout:g} s)")
+            data = self.conn.recv_bytes()
+        except (EOFError, OSError, BrokenPipeError):
+            raise self._death_error()
+        self.tasks += 1
+        return pickle.loads(data)
+
+
+class SandboxPool:
+    """Pool de processus d'exécution ; run() est awaitable et annulable."""
+
+    def __init__(self, size: int = SANDBOX_WORKERS, timeout: float = SANDBOX_TIMEOUT_SECONDS,
+                 cpu_seconds: int = SANDBOX_CPU_SECONDS, max_rss: int = SANDBOX_MAX_RSS_BYTES,
+                 max_tasks: int = SANDBOX_MAX_TASKS_PER_WORKER):
+        self.size = size
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.max_rss = max_rss
+        self.max_tasks = max_tasks
+        self._ctx = None
+        # Emplacements du pool : None = processus à (re)démarrer
+        self._slots: "queue.LifoQueue[Optional[_Worker]]" = queue.LifoQueue()
+        for _ in range(size):
+            self._slots.put(None)
+
+    def _context(self):
+        if self._ctx is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                self._ctx = multiprocessing.get_context("forkserver")
+                self._ctx.set_forkserver_preload(["pandas", "numpy", "pyarrow", "app.services.sandbox"])
+            else:
+                self._ctx = multiprocessing.get_context("spawn")
+        return self._ctx
+
+    def start(self) -> None:
+        """Démarre tous les processus à l'avance (appelé au démarrage de l'API)."""
+        workers = [self._acquire() for _ in range(self.size)]
+        warmup = pd.DataFrame({"x": [0]})
+        for worker in workers:
+            try:
+                # Premier aller-retour Arrow : les modules paresseux sont chargés avant le premier appel réel
+                self._call(worker, "", {"df": warmup}, {}, ["df"], self.timeout)
+            except SandboxError as e:
+                logging.warning(f"⚠️ Processus d'exécution non pré-chauffé: {e}")
+            finally:
+                self._release(worker)
+
+    def _acquire(self) -> _Worker:
+        worker = self._slots.get()
+        if worker is None or not worker.alive:
+            try:
+                worker = _Worker(self._context(), self.max_rss)
+            except Exception:
+                self._slots.put(None)
+                raise
+        return worker
+
+    def _release(self, worker: _Worker) -> None:
+        if not worker.alive or worker.tasks >= self.max_tasks:
+            worker.kill()
+            worker = None
+        self._slots.put(worker)
+
+    def _call(self, worker: _Worker, code: str, frames: Dict[str, pd.DataFrame],
+              helpers: Dict[str, Any], outputs: List[str], timeout: float) -> Dict[str, Any]:
+        request = {
+            "code": code,
+            "frames": {name: frame_to_bytes(df, compression=None) for name, df in frames.items()},
+            "helpers": pickle.dumps(helpers, protocol=pickle.HIGHEST_PROTOCOL),
+            "outputs": outputs,
+            "cpu_seconds": self.cpu_seconds,
+        }
+        response = worker.call(request, timeout)
+        if "error" in response:
+            raise SandboxError(response["error"])
+        return {name: _decode_value(*encoded) for name, encoded in response["outputs"].items()}
+
+    async def run(
+        self,
+        code: str,
+        frames: Dict[str, pd.DataFrame],
+        outputs: List[str],
+        helpers: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Exécute `code` avec les DataFrames `frames` comme variables locales et
+        retourne les variables listées dans `outputs` (absentes si non définies).
+        Les helpers doivent être importables (fonctions de module).
+        """
+        helpers = helpers or {}
+        if self.size <= 0:
+            try:
+                return await asyncio.to_thread(_execute, code, dict(frames), helpers, outputs)
+            except Exception as e:
+                raise SandboxError(str(e)) from e
+
+        worker = await asyncio.to_thread(self._acquire)
+        try:
+            return await asyncio.to_thread(
+                self._call, worker, code, frames, helpers, outputs, timeout or self.timeout
+            )
+        except asyncio.CancelledError:
+            logging.info("🛑 Exécution annulée, processus d'exécution arrêté")
+            worker.kill()
+            raise
+        finally:
+            self._release(worker)
+
+
+sandbox = SandboxPool()
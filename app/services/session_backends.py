@@ -0,0 +1,713 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import pandas as pd
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from app.services.history import DataFrameHistory
+from app.services.session_store import SessionStore, SessionNamespace, DEFAULT_TTL_SECONDS
+from app.services.spill import SpilledStep, frame_to_bytes, frame_from_bytes, frame_from_file
+
+# --- 🌐 Backends de session partagés entre workers / réplicas ---
+#
+# SESSION_BACKEND choisit l'implémentation :
+#   - "memory" (défaut) : SessionStore, propre à chaque processus ;
+#   - "disk"  : fichiers Arrow + index SQLite sur un disque partagé par les workers ;
+#   - "redis" : blobs et index dans Redis (nécessite le paquet `redis`).
+#
+# Les valeurs sont sérialisées par type : DataFrame -> blob Arrow IPC,
+# DataFrameHistory -> DataFrame courant + une étape par blob (immuable, écrite
+# une seule fois), messages -> JSON. Chaque worker garde en cache les objets
+# désérialisés tant que la révision de l'entrée n'a pas changé.
+#
+# Plusieurs workers écrivent dans le même index :
+#   - chaque écriture est un compare-and-set sur la révision de l'entrée
+#     (SQLite : transaction BEGIN IMMEDIATE ; Redis : WATCH / MULTI). Un
+#     historique ou des messages lus ici puis modifiés ne s'enregistrent que si
+#     personne n'a écrit entre-temps : sinon SessionConflictError pour un
+#     historique, fusion des nouveaux messages pour une conversation ;
+#   - les blobs sont comptés par référence dans la même transaction. Un blob
+#     qui n'est plus référencé n'est supprimé qu'après SESSION_BLOB_GRACE_SECONDS :
+#     un autre worker peut encore être en train de le lire.
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_BACKEND_DIR = os.getenv("SESSION_BACKEND_DIR", os.path.join(tempfile.gettempdir(), "tervela_sessions"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_DISK_MAX_BYTES = int(os.getenv("SESSION_DISK_MAX_BYTES", str(20 * 1024 ** 3)))
+SESSION_BLOB_GRACE_SECONDS = float(os.getenv("SESSION_BLOB_GRACE_SECONDS", "600"))
+SWEEP_INTERVAL_SECONDS = 30
+WRITE_RETRIES = 5
+
+
+class SessionConflictError(RuntimeError):
+    """La session a été modifiée par un autre worker depuis sa lecture."""
+
+
+class SharedChatMessageHistory(BaseChatMessageHistory):
+    """Historique de messages qui se réécrit dans le backend à chaque ajout."""
+
+    def __init__(self, messages: Sequence[BaseMessage], on_change: Callable[["SharedChatMessageHistory"], None]):
+        self._messages = list(messages)
+        self._on_change = on_change
+        # Messages ajoutés depuis le dernier enregistrement (None après clear) : rejoués en cas de conflit
+        self._added: Optional[List[BaseMessage]] = []
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return list(self._messages)
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self._messages.extend(messages)
+        if self._added is not None:
+            self._added.extend(messages)
+        self._on_change(self)
+
+    def clear(self) -> None:
+        self._messages = []
+        self._added = None
+        self._on_change(self)
+
+    def rebase(self, messages: Sequence[BaseMessage]) -> None:
+        """Repart des messages enregistrés par un autre worker et y ajoute ceux d'ici."""
+        if self._added is not None:
+            self._messages = [*messages, *self._added]
+
+    def mark_saved(self) -> None:
+        self._added = []
+
+
+class SharedSessionBackend(ABC):
+    """
+    Logique commune des backends partagés. Les sous-classes fournissent
+    l'index des entrées (méta-données + révision), le stockage des blobs et
+    leur comptage de références.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, blob_grace_seconds: float = SESSION_BLOB_GRACE_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.blob_grace_seconds = blob_grace_seconds
+        self._cache: Dict[Tuple[str, str], Tuple[int, Any]] = {}
+        # DataFrame courant déjà publié par ce worker : (référence faible, blob, taille)
+        self._current_blobs: Dict[Tuple[str, str], Tuple[weakref.ref, str, int]] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.conflicts = 0
+
+    def namespace(self, name: str) -> SessionNamespace:
+        return SessionNamespace(self, name)
+
+    # 🔌 Primitives à implémenter
+
+    @abstractmethod
+    def _load_entry(self, key: str, name: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """(révision, méta-données) de l'entrée, None si elle n'existe pas."""
+
+    @abstractmethod
+    def _commit_entry(self, key: str, name: str, meta: Dict[str, Any], nbytes: int, expected: int,
+                      blob_ids: List[str], previous_blob_ids: List[str]) -> Optional[int]:
+        """
+        Compare-and-set : écrit l'entrée si sa révision vaut encore `expected`
+        (0 : absente) et retourne la nouvelle, None sinon. Dans la même
+        transaction, +1 référence pour les blobs ajoutés, -1 pour les retirés ;
+        SessionConflictError si un blob ajouté a déjà été supprimé.
+        """
+
+    @abstractmethod
+    def _remove_entry(self, key: str, name: str) -> Optional[Dict[str, Any]]:
+        """Supprime l'entrée et libère ses blobs ; retourne ses méta-données, None si absente."""
+
+    @abstractmethod
+    def _entry_keys(self, name: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    def _put_blob(self, key: str, blob_id: str, data: bytes) -> None:
+        """Écrit un blob, enregistré sans référence jusqu'au commit de l'entrée qui l'utilise."""
+
+    @abstractmethod
+    def _get_blob(self, key: str, blob_id: str) -> bytes:
+        ...
+
+    @abstractmethod
+    def _collect(self, key: str) -> None:
+        """Supprime les blobs sans référence depuis plus de blob_grace_seconds."""
+
+    @abstractmethod
+    def _drop_key(self, key: str) -> None:
+        """Supprime tout ce qui est rattaché à la clé (expiration, éviction, discard)."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    def _read_frame(self, key: str, blob_id: str) -> pd.DataFrame:
+        return frame_from_bytes(self._get_blob(key, blob_id))
+
+    def _write_frame(self, key: str, df: pd.DataFrame) -> Tuple[str, int]:
+        blob_id = uuid.uuid4().hex
+        data = frame_to_bytes(df)
+        self._put_blob(key, blob_id, data)
+        return blob_id, len(data)
+
+    # 🔁 (Dé)sérialisation des valeurs
+
+    def _serialize(self, key: str, name: str, value: Any, previous: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+        if isinstance(value, DataFrameHistory):
+            current = value.current
+            written = self._current_blobs.get((key, name))
+            if written and written[0]() is current and previous and previous.get("current") == written[1]:
+                current_blob, current_bytes = written[1], written[2]
+            else:
+                current_blob, current_bytes = self._write_frame(key, current)
+            self._current_blobs[(key, name)] = (weakref.ref(current), current_blob, current_bytes)
+            steps, nbytes = [], current_bytes
+            for step in value.export_steps():
+                if step.blob_id is None:
+                    step.blob_id = uuid.uuid4().hex
+                    self._put_blob(key, step.blob_id, step.to_bytes())
+                steps.append(step.blob_id)
+                nbytes += step.nbytes
+            meta = {
+                "type": "history",
+                "current": current_blob,
+                "steps": steps,
+                "generation": value.generation,
+            }
+            return meta, nbytes
+        if isinstance(value, pd.DataFrame):
+            blob_id, nbytes = self._write_frame(key, value)
+            return {"type": "frame", "blob": blob_id}, nbytes
+        if isinstance(value, BaseChatMessageHistory):
+            return {"type": "messages", "messages": messages_to_dict(value.messages)}, 0
+        return {"type": "value", "value": value}, 0
+
+    def _deserialize(self, key: str, name: str, meta: Dict[str, Any]) -> Any:
+        kind = meta["type"]
+        if kind == "history":
+            steps = []
+            for blob_id in meta["steps"]:
+                step = SpilledStep.from_bytes(self._get_blob(key, blob_id))
+                step.blob_id = blob_id
+                steps.append(step)
+            return DataFrameHistory.from_steps(self._read_frame(key, meta["current"]), steps, meta.get("generation"))
+        if kind == "frame":
+            return self._read_frame(key, meta["blob"])
+        if kind == "messages":
+            return SharedChatMessageHistory(
+                messages_from_dict(meta["messages"]),
+                on_change=lambda history: self.set(key, name, history),
+            )
+        return meta["value"]
+
+    @staticmethod
+    def _blob_ids(meta: Optional[Dict[str, Any]]) -> List[str]:
+        if not meta:
+            return []
+        if meta["type"] == "history":
+            return [meta["current"], *meta["steps"]]
+        if meta["type"] == "frame":
+            return [meta["blob"]]
+        return []
+
+    # 🔍 API commune avec SessionStore
+
+    def get(self, key: str, name: str) -> Any:
+        with self._lock:
+            for attempt in range(WRITE_RETRIES):
+                entry = self._load_entry(key, name)
+                if entry is None:
+                    self.misses += 1
+                    self._cache.pop((key, name), None)
+                    raise KeyError(key)
+                revision, meta = entry
+                cached = self._cache.get((key, name))
+                if cached is not None and cached[0] == revision:
+                    self.hits += 1
+                    return cached[1]
+                try:
+                    value = self._deserialize(key, name, meta)
+                except (KeyError, FileNotFoundError):
+                    # Entrée remplacée et ses blobs collectés pendant la lecture : on relit l'index
+                    continue
+                self.hits += 1
+                self._cache[(key, name)] = (revision, value)
+                return value
+            raise SessionConflictError(f"Session {key} réécrite pendant sa lecture")
+
+    def contains(self, key: str, name: str) -> bool:
+        with self._lock:
+            return self._load_entry(key, name) is not None
+
+    def set(self, key: str, name: str, value: Any) -> None:
+        with self._lock:
+            # Objet modifié sur place après lecture ici : il ne doit pas écraser une écriture plus récente
+            cached = self._cache.get((key, name))
+            mutable = isinstance(value, (DataFrameHistory, SharedChatMessageHistory))
+            read_revision = cached[0] if mutable and cached is not None and cached[1] is value else None
+            for attempt in range(WRITE_RETRIES):
+                entry = self._load_entry(key, name)
+                revision, previous = entry if entry else (0, None)
+                if read_revision is not None and revision != read_revision:
+                    self.conflicts += 1
+                    if not isinstance(value, SharedChatMessageHistory):
+                        raise SessionConflictError(f"Session {key} modifiée par une autre requête, à recharger")
+                    if previous is not None and previous["type"] == "messages":
+                        value.rebase(messages_from_dict(previous["messages"]))
+                    read_revision = revision
+                meta, nbytes = self._serialize(key, name, value, previous)
+                new_revision = self._commit_entry(
+                    key, name, meta, nbytes, revision, self._blob_ids(meta), self._blob_ids(previous)
+                )
+                if new_revision is not None:
+                    break
+            else:
+                raise SessionConflictError(f"Session {key} : écritures concurrentes, réessayer")
+            if isinstance(value, SharedChatMessageHistory):
+                value.mark_saved()
+            elif isinstance(value, BaseChatMessageHistory):
+                value = self._deserialize(key, name, meta)
+            self._cache[(key, name)] = (new_revision, value)
+        self._collect(key)
+
+    def delete(self, key: str, name: str) -> None:
+        with self._lock:
+            if self._remove_entry(key, name) is None:
+                raise KeyError(key)
+            self._cache.pop((key, name), None)
+            self._current_blobs.pop((key, name), None)
+        self._collect(key)
+
+    def keys(self, name: str) -> List[str]:
+        with self._lock:
+            return self._entry_keys(name)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._drop_key(key)
+            for cache_key in [k for k in self._cache if k[0] == key]:
+                del self._cache[cache_key]
+            for cache_key in [k for k in self._current_blobs if k[0] == key]:
+                del self._current_blobs[cache_key]
+
+
+class DiskSessionBackend(SharedSessionBackend):
+    """Blobs en fichiers Arrow IPC (relus en memory-map), index et références dans SQLite en mode WAL."""
+
+    def __init__(self, root: str = SESSION_BACKEND_DIR, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 max_bytes: int = SESSION_DISK_MAX_BYTES, blob_grace_seconds: float = SESSION_BLOB_GRACE_SECONDS):
+        super().__init__(ttl_seconds, blob_grace_seconds)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.expirations = 0
+        self._last_sweep = 0.0
+        os.makedirs(root, exist_ok=True)
+        # Transactions explicites (_transaction) : le module sqlite3 n'en ouvre pas de lui-même
+        self._db = sqlite3.connect(
+            os.path.join(root, "index.db"), timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS session_entries (
+                key TEXT NOT NULL,
+                name TEXT NOT NULL,
+                meta TEXT NOT NULL,
+                revision INTEGER NOT NULL,
+                nbytes INTEGER NOT NULL DEFAULT 0,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (key, name)
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS session_blobs (
+                key TEXT NOT NULL,
+                blob_id TEXT NOT NULL,
+                refs INTEGER NOT NULL DEFAULT 0,
+                released_at REAL,
+                PRIMARY KEY (key, blob_id)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS session_blobs_released ON session_blobs (released_at)")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE : verrou d'écriture dès le début, la révision lue ne peut plus changer
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._db
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _key_dir(self, key: str) -> str:
+        # Les identifiants viennent du client : on ne les utilise jamais tels quels comme chemin
+        return os.path.join(self.root, hashlib.sha256(key.encode()).hexdigest()[:32])
+
+    def _blob_path(self, key: str, blob_id: str) -> str:
+        return os.path.join(self._key_dir(key), blob_id)
+
+    def _load_entry(self, key, name):
+        row = self._db.execute(
+            "SELECT revision, meta, last_access FROM session_entries WHERE key = ? AND name = ?",
+            (key, name),
+        ).fetchone()
+        if row is None:
+            return None
+        revision, meta, last_access = row
+        now = time.time()
+        if self.ttl_seconds and now - last_access > self.ttl_seconds:
+            self._drop_key(key)
+            self.expirations += 1
+            return None
+        self._db.execute("UPDATE session_entries SET last_access = ? WHERE key = ?", (now, key))
+        return revision, json.loads(meta)
+
+    def _release(self, db: sqlite3.Connection, key: str, blob_ids: List[str], now: float) -> None:
+        for blob_id in blob_ids:
+            db.execute(
+                """
+                UPDATE session_blobs SET refs = refs - 1,
+                    released_at = CASE WHEN refs <= 1 THEN ? ELSE released_at END
+                WHERE key = ? AND blob_id = ?
+                """,
+                (now, key, blob_id),
+            )
+
+    def _commit_entry(self, key, name, meta, nbytes, expected, blob_ids, previous_blob_ids):
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT revision FROM session_entries WHERE key = ? AND name = ?", (key, name)
+            ).fetchone()
+            if (row[0] if row else 0) != expected:
+                return None
+            for blob_id in set(blob_ids) - set(previous_blob_ids):
+                updated = db.execute(
+                    "UPDATE session_blobs SET refs = refs + 1, released_at = NULL WHERE key = ? AND blob_id = ?",
+                    (key, blob_id),
+                ).rowcount
+                if not updated:
+                    raise SessionConflictError(f"Session {key} : blob {blob_id} supprimé avant l'enregistrement")
+            self._release(db, key, list(set(previous_blob_ids) - set(blob_ids)), now)
+            db.execute(
+                """
+                INSERT INTO session_entries (key, name, meta, revision, nbytes, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key, name) DO UPDATE SET
+                    meta = excluded.meta,
+                    revision = excluded.revision,
+                    nbytes = excluded.nbytes,
+                    last_access = excluded.last_access
+                """,
+                (key, name, json.dumps(meta), expected + 1, nbytes, now),
+            )
+        return expected + 1
+
+    def _remove_entry(self, key, name):
+        with self._transaction() as db:
+            row = db.execute("SELECT meta FROM session_entries WHERE key = ? AND name = ?", (key, name)).fetchone()
+            if row is None:
+                return None
+            meta = json.loads(row[0])
+            db.execute("DELETE FROM session_entries WHERE key = ? AND name = ?", (key, name))
+            self._release(db, key, self._blob_ids(meta), time.time())
+        return meta
+
+    def _entry_keys(self, name):
+        return [row[0] for row in self._db.execute("SELECT key FROM session_entries WHERE name = ?", (name,))]
+
+    def _put_blob(self, key, blob_id, data):
+        os.makedirs(self._key_dir(key), exist_ok=True)
+        path = self._blob_path(key, blob_id)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        self._db.execute(
+            "INSERT OR IGNORE INTO session_blobs (key, blob_id, refs, released_at) VALUES (?, ?, 0, ?)",
+            (key, blob_id, time.time()),
+        )
+
+    def _get_blob(self, key, blob_id):
+        with open(self._blob_path(key, blob_id), "rb") as f:
+            return f.read()
+
+    def _write_frame(self, key, df):
+        # Non compressé : le fichier est relu en memory-map
+        blob_id = uuid.uuid4().hex
+        data = frame_to_bytes(df, compression=None)
+        self._put_blob(key, blob_id, data)
+        return blob_id, len(data)
+
+    def _read_frame(self, key, blob_id):
+        return frame_from_file(self._blob_path(key, blob_id))
+
+    def _delete_files(self, blobs: List[Tuple[str, str]]) -> None:
+        for key, blob_id in blobs:
+            try:
+                os.remove(self._blob_path(key, blob_id))
+            except OSError:
+                pass
+
+    def _collect(self, key):
+        # Collecte globale avec le balayage TTL / LRU, au plus toutes les 30 s
+        self._sweep(protect=key)
+
+    def _drop_key(self, key):
+        with self._transaction() as db:
+            db.execute("DELETE FROM session_entries WHERE key = ?", (key,))
+            db.execute("DELETE FROM session_blobs WHERE key = ?", (key,))
+        shutil.rmtree(self._key_dir(key), ignore_errors=True)
+
+    def _sweep(self, protect: str) -> None:
+        """Blobs sans référence, expiration TTL et éviction LRU selon le budget disque, au plus toutes les 30 s."""
+        now = time.time()
+        if now - self._last_sweep < SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        with self._lock:
+            cutoff = now - self.blob_grace_seconds
+            with self._transaction() as db:
+                garbage = db.execute(
+                    "SELECT key, blob_id FROM session_blobs WHERE refs <= 0 AND released_at <= ?", (cutoff,)
+                ).fetchall()
+                db.execute("DELETE FROM session_blobs WHERE refs <= 0 AND released_at <= ?", (cutoff,))
+            self._delete_files(garbage)
+
+            rows = self._db.execute(
+                "SELECT key, MAX(last_access), SUM(nbytes) FROM session_entries GROUP BY key ORDER BY MAX(last_access)"
+            ).fetchall()
+            total = sum(nbytes for _, _, nbytes in rows)
+            for key, last_access, nbytes in rows:
+                if key == protect:
+                    continue
+                if self.ttl_seconds and now - last_access > self.ttl_seconds:
+                    self.expirations += 1
+                elif total > self.max_bytes:
+                    self.evictions += 1
+                    logging.info(f"🧹 Session évincée du disque (LRU): {key}")
+                else:
+                    continue
+                self._drop_key(key)
+                total -= nbytes
+
+    def stats(self):
+        with self._lock:
+            sessions, nbytes = self._db.execute(
+                "SELECT COUNT(DISTINCT key), COALESCE(SUM(nbytes), 0) FROM session_entries"
+            ).fetchone()
+            snapshots = 0
+            for (meta,) in self._db.execute("SELECT meta FROM session_entries WHERE meta LIKE '{\"type\": \"history\"%'"):
+                snapshots += len(json.loads(meta)["steps"]) + 1
+            released = self._db.execute("SELECT COUNT(*) FROM session_blobs WHERE refs <= 0").fetchone()[0]
+            return {
+                "backend": "disk",
+                "sessions": sessions,
+                "snapshots": snapshots,
+                "bytes": nbytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "released_blobs": released,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "conflicts": self.conflicts,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class RedisSessionBackend(SharedSessionBackend):
+    """Index, blobs et références dans Redis ; l'expiration est déléguée aux TTL Redis."""
+
+    def __init__(self, url: str = SESSION_REDIS_URL, ttl_seconds: float = DEFAULT_TTL_SECONDS, prefix: str = "tervela:",
+                 blob_grace_seconds: float = SESSION_BLOB_GRACE_SECONDS, client: Any = None):
+        super().__init__(ttl_seconds, blob_grace_seconds)
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_BACKEND=redis nécessite le paquet 'redis'") from e
+        self._watch_error = redis.WatchError
+        self._redis = client if client is not None else redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _entry_key(self, key: str, name: str) -> str:
+        return f"{self.prefix}entry:{key}:{name}"
+
+    def _blob_key(self, key: str, blob_id: str) -> str:
+        return f"{self.prefix}blob:{key}:{blob_id}"
+
+    def _refs_key(self, key: str) -> str:
+        # Hash blob_id -> nombre d'entrées qui le référencent
+        return f"{self.prefix}refs:{key}"
+
+    def _released_key(self, key: str) -> str:
+        # Sorted set blob_id -> date où il a perdu sa dernière référence
+        return f"{self.prefix}released:{key}"
+
+    def _touch(self, key: str) -> None:
+        if not self.ttl_seconds:
+            return
+        ttl = int(self.ttl_seconds)
+        pipe = self._redis.pipeline()
+        for member in self._redis.smembers(f"{self.prefix}members:{key}"):
+            pipe.expire(member, ttl)
+        pipe.expire(f"{self.prefix}members:{key}", ttl)
+        pipe.execute()
+
+    def _track(self, key: str, *redis_keys: str) -> None:
+        pipe = self._redis.pipeline()
+        pipe.sadd(f"{self.prefix}members:{key}", *redis_keys)
+        if self.ttl_seconds:
+            for redis_key in redis_keys:
+                pipe.expire(redis_key, int(self.ttl_seconds))
+            pipe.expire(f"{self.prefix}members:{key}", int(self.ttl_seconds))
+        pipe.execute()
+
+    def _load_entry(self, key, name):
+        data = self._redis.hmget(self._entry_key(key, name), "revision", "meta")
+        if data[0] is None:
+            return None
+        self._touch(key)
+        return int(data[0]), json.loads(data[1])
+
+    def _queue_release(self, pipe: Any, key: str, blob_ids: List[str], counts: List[Optional[bytes]], now: float) -> None:
+        for blob_id, count in zip(blob_ids, counts):
+            if count is None:
+                continue
+            pipe.hincrby(self._refs_key(key), blob_id, -1)
+            if int(count) <= 1:
+                pipe.zadd(self._released_key(key), {blob_id: now})
+
+    def _commit_entry(self, key, name, meta, nbytes, expected, blob_ids, previous_blob_ids):
+        entry_key, refs_key = self._entry_key(key, name), self._refs_key(key)
+        added = sorted(set(blob_ids) - set(previous_blob_ids))
+        released = sorted(set(previous_blob_ids) - set(blob_ids))
+        with self._redis.pipeline() as pipe:
+            try:
+                pipe.watch(entry_key, refs_key)
+                if int(pipe.hget(entry_key, "revision") or 0) != expected:
+                    return None
+                counts = pipe.hmget(refs_key, added + released) if added or released else []
+                missing = [blob_id for blob_id, count in zip(added, counts) if count is None]
+                if missing:
+                    raise SessionConflictError(f"Session {key} : blob {missing[0]} supprimé avant l'enregistrement")
+                pipe.multi()
+                pipe.hset(entry_key, mapping={"revision": expected + 1, "meta": json.dumps(meta), "nbytes": nbytes})
+                pipe.sadd(f"{self.prefix}keys:{name}", key)
+                for blob_id in added:
+                    pipe.hincrby(refs_key, blob_id, 1)
+                if added:
+                    pipe.zrem(self._released_key(key), *added)
+                self._queue_release(pipe, key, released, counts[len(added):], time.time())
+                pipe.execute()
+            except self._watch_error:
+                return None
+        self._track(key, entry_key)
+        return expected + 1
+
+    def _remove_entry(self, key, name):
+        entry_key, refs_key = self._entry_key(key, name), self._refs_key(key)
+        for attempt in range(WRITE_RETRIES):
+            with self._redis.pipeline() as pipe:
+                try:
+                    pipe.watch(entry_key, refs_key)
+                    raw = pipe.hget(entry_key, "meta")
+                    if raw is None:
+                        return None
+                    meta = json.loads(raw)
+                    blob_ids = self._blob_ids(meta)
+                    counts = pipe.hmget(refs_key, blob_ids) if blob_ids else []
+                    pipe.multi()
+                    pipe.delete(entry_key)
+                    pipe.srem(f"{self.prefix}keys:{name}", key)
+                    self._queue_release(pipe, key, blob_ids, counts, time.time())
+                    pipe.execute()
+                    return meta
+                except self._watch_error:
+                    continue
+        raise SessionConflictError(f"Session {key} : suppression concurrente, réessayer")
+
+    def _entry_keys(self, name):
+        keys = [member.decode() for member in self._redis.smembers(f"{self.prefix}keys:{name}")]
+        live = [key for key in keys if self._redis.exists(self._entry_key(key, name))]
+        expired = set(keys) - set(live)
+        if expired:
+            self._redis.srem(f"{self.prefix}keys:{name}", *expired)
+        return live
+
+    def _put_blob(self, key, blob_id, data):
+        pipe = self._redis.pipeline()
+        pipe.set(self._blob_key(key, blob_id), data)
+        pipe.hsetnx(self._refs_key(key), blob_id, 0)
+        pipe.zadd(self._released_key(key), {blob_id: time.time()})
+        pipe.execute()
+        self._track(key, self._blob_key(key, blob_id), self._refs_key(key), self._released_key(key))
+
+    def _get_blob(self, key, blob_id):
+        data = self._redis.get(self._blob_key(key, blob_id))
+        if data is None:
+            raise KeyError(key)
+        return data
+
+    def _collect(self, key):
+        refs_key, released_key = self._refs_key(key), self._released_key(key)
+        with self._redis.pipeline() as pipe:
+            try:
+                pipe.watch(refs_key, released_key)
+                blob_ids = [
+                    blob_id.decode()
+                    for blob_id in pipe.zrangebyscore(released_key, "-inf", time.time() - self.blob_grace_seconds)
+                ]
+                if not blob_ids:
+                    return
+                counts = pipe.hmget(refs_key, blob_ids)
+                garbage = [blob_id for blob_id, count in zip(blob_ids, counts) if count is None or int(count) <= 0]
+                pipe.multi()
+                pipe.zrem(released_key, *blob_ids)
+                if garbage:
+                    blob_keys = [self._blob_key(key, blob_id) for blob_id in garbage]
+                    pipe.hdel(refs_key, *garbage)
+                    pipe.delete(*blob_keys)
+                    pipe.srem(f"{self.prefix}members:{key}", *blob_keys)
+                pipe.execute()
+            except self._watch_error:
+                pass  # Écriture concurrente : collecte au prochain passage
+
+    def _drop_key(self, key):
+        members = list(self._redis.smembers(f"{self.prefix}members:{key}"))
+        if members:
+            self._redis.delete(*members)
+        self._redis.delete(f"{self.prefix}members:{key}")
+
+    def stats(self):
+        return {
+            "backend": "redis",
+            "ttl_seconds": self.ttl_seconds,
+            "conflicts": self.conflicts,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def create_session_backend():
+    """Instancie le backend de session choisi par SESSION_BACKEND."""
+    if SESSION_BACKEND == "memory":
+        return SessionStore()
+    if SESSION_BACKEND == "disk":
+        return DiskSessionBackend()
+    if SESSION_BACKEND == "redis":
+        return RedisSessionBackend()
+    raise ValueError(f"SESSION_BACKEND inconnu: {SESSION_BACKEND}")
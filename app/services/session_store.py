@@ -0,0 +1,237 @@
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, MutableMapping, Optional, Tuple
+import pandas as pd
+
+# --- 🗄️ Stockage borné des sessions (LRU + TTL + budget mémoire) ---
+#
+# Une seule instance par processus regroupe tout ce qui est rattaché à une clé
+# (session_id ou dataset_id) : historique des DataFrames, messages, version...
+# Chaque type de donnée est exposé comme un "namespace" qui se comporte comme
+# un dict. L'éviction porte sur la clé entière, tous namespaces confondus.
+# Les valeurs qui grossissent sans être réaffectées (messages du chat,
+# historique d'undo) sont remesurées à chaque lecture : le budget suit les
+# sessions longues.
+
+DEFAULT_MAX_BYTES = int(os.getenv("SESSION_STORE_MAX_BYTES", str(2 * 1024 ** 3)))
+DEFAULT_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+
+_frame_sizes: Dict[int, int] = {}
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """Taille mémoire d'un DataFrame (memory_usage(deep=True)), mémorisée par objet."""
+    key = id(df)
+    size = _frame_sizes.get(key)
+    if size is None:
+        size = int(df.memory_usage(deep=True).sum())
+        _frame_sizes[key] = size
+        weakref.finalize(df, _frame_sizes.pop, key, None)
+    return size
+
+
+def estimate_size(value: Any) -> Tuple[int, int]:
+    """Retourne (octets, nombre de snapshots DataFrame) pour une valeur stockée."""
+    if isinstance(value, pd.DataFrame):
+        return frame_bytes(value), 1
+    if hasattr(value, "nbytes") and hasattr(value, "snapshots"):
+        # Historique encodé en deltas : il connaît sa propre empreinte
+        return int(value.nbytes), int(value.snapshots)
+    if isinstance(value, (list, tuple)):
+        total, snapshots = 0, 0
+        for item in value:
+            size, count = estimate_size(item)
+            total += size
+            snapshots += count
+        return total, snapshots
+    if hasattr(value, "messages"):
+        return sum(sys.getsizeof(str(m.content)) for m in value.messages), 0
+    return sys.getsizeof(value), 0
+
+
+def _grows_in_place(value: Any) -> bool:
+    """Valeurs modifiées après lecture (add_message, append) : taille à remesurer."""
+    return hasattr(value, "messages") or (hasattr(value, "nbytes") and hasattr(value, "snapshots"))
+
+
+class _Entry:
+    __slots__ = ("values", "sizes", "last_access")
+
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        self.sizes: Dict[str, Tuple[int, int]] = {}
+        self.last_access = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(size for size, _ in self.sizes.values())
+
+    @property
+    def snapshots(self) -> int:
+        return sum(count for _, count in self.sizes.values())
+
+
+class SessionStore:
+    """Stockage des sessions avec budget en octets, expiration après inactivité et éviction LRU."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def namespace(self, name: str) -> "SessionNamespace":
+        return SessionNamespace(self, name)
+
+    # 🔍 Lecture / écriture
+
+    def _live_entry(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl_seconds and time.monotonic() - entry.last_access > self.ttl_seconds:
+            self._drop(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key: str, name: str) -> Any:
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None or name not in entry.values:
+                self.misses += 1
+                raise KeyError(key)
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry.values[name]
+            if _grows_in_place(value):
+                size = estimate_size(value)
+                if size != entry.sizes[name]:
+                    self._bytes += size[0] - entry.sizes[name][0]
+                    entry.sizes[name] = size
+                    self._enforce_budget(protect=key)
+            return value
+
+    def contains(self, key: str, name: str) -> bool:
+        with self._lock:
+            entry = self._live_entry(key)
+            return entry is not None and name in entry.values
+
+    def set(self, key: str, name: str, value: Any) -> None:
+        size = estimate_size(value)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            self._bytes -= entry.sizes.get(name, (0, 0))[0]
+            entry.values[name] = value
+            entry.sizes[name] = size
+            self._bytes += size[0]
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(key)
+            self._enforce_budget(protect=key)
+
+    def delete(self, key: str, name: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or name not in entry.values:
+                raise KeyError(key)
+            del entry.values[name]
+            self._bytes -= entry.sizes.pop(name)[0]
+            if not entry.values:
+                del self._entries[key]
+
+    def keys(self, name: str) -> list:
+        with self._lock:
+            return [key for key, entry in self._entries.items() if name in entry.values]
+
+    def discard(self, key: str) -> None:
+        """Supprime une session entière (tous namespaces)."""
+        with self._lock:
+            self._drop(key)
+
+    # 🧹 Éviction
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def evict_expired(self) -> int:
+        with self._lock:
+            now = time.monotonic()
+            expired = [
+                key for key, entry in self._entries.items()
+                if self.ttl_seconds and now - entry.last_access > self.ttl_seconds
+            ]
+            for key in expired:
+                self._drop(key)
+            self.expirations += len(expired)
+            return len(expired)
+
+    def _enforce_budget(self, protect: str) -> None:
+        self.evict_expired()
+        while self._bytes > self.max_bytes:
+            victim = next((key for key in self._entries if key != protect), None)
+            if victim is None:
+                logging.warning(
+                    f"⚠️ La session {protect} dépasse à elle seule le budget mémoire "
+                    f"({self._bytes} > {self.max_bytes} octets)"
+                )
+                return
+            self._drop(victim)
+            self.evictions += 1
+            logging.info(f"🧹 Session évincée (LRU): {victim}")
+
+    # 📊 Métriques
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "snapshots": sum(entry.snapshots for entry in self._entries.values()),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class SessionNamespace(MutableMapping):
+    """Vue dict d'un type de donnée (ex. 'df_history') dans le SessionStore."""
+
+    def __init__(self, store: SessionStore, name: str):
+        self.store = store
+        self.name = name
+
+    def __getitem__(self, key: str) -> Any:
+        return self.store.get(key, self.name)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.store.set(key, self.name, value)
+
+    def __delitem__(self, key: str) -> None:
+        self.store.delete(key, self.name)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.store.contains(key, self.name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.keys(self.name))
+
+    def __len__(self) -> int:
+        return len(self.store.keys(self.name))
@@ -0,0 +1,226 @@
+import logging
+import os
+import pickle
+import tempfile
+import uuid
+import zlib
+from typing import Any, Dict, Optional, Union
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.services.delta import FrameDelta
+
+# --- 🧊 Stockage hiérarchisé des anciennes versions d'historique ---
+#
+# Une étape d'historique (delta inverse ou snapshot complet) peut quitter la RAM :
+#   - niveau "memory" : sérialisée en Arrow IPC compressé (zstd) dans un buffer ;
+#   - niveau "disk"   : écrite en Arrow IPC non compressé dans SESSION_SPILL_DIR,
+#                       relue en memory-map seulement lors d'un undo.
+# Les colonnes qu'Arrow ne sait pas typer (objets mixtes) passent par pickle.
+
+SPILL_DIR = os.getenv("SESSION_SPILL_DIR", os.path.join(tempfile.gettempdir(), "tervela_spill"))
+SPILL_COMPRESSION = "zstd"
+
+Step = Union[FrameDelta, pd.DataFrame]
+
+
+def _frame_parts(step: Step) -> Dict[str, pd.DataFrame]:
+    if isinstance(step, pd.DataFrame):
+        return {"snapshot": step}
+    parts = {
+        "removed": pd.DataFrame(index=step.removed),
+        "inserted": step.inserted,
+    }
+    if step.columns:
+        parts["columns"] = pd.DataFrame(step.columns)
+    if step.row_order is not None:
+        parts["row_order"] = pd.DataFrame(index=step.row_order)
+    return parts
+
+
+def _to_arrow(df: pd.DataFrame) -> Optional[pa.Table]:
+    try:
+        return pa.Table.from_pandas(df, preserve_index=True)
+    except (pa.ArrowException, TypeError, ValueError):
+        return None
+
+
+def _from_arrow(table: pa.Table, dtypes: Dict[str, str]) -> pd.DataFrame:
+    # integer_object_nulls : une colonne object d'entiers avec des None reste en entiers
+    df = table.to_pandas(integer_object_nulls=True)
+    # Arrow peut changer certains dtypes (object -> str...) : on restaure ceux d'origine
+    for col in df.columns:
+        original = dtypes.get(str(col))
+        if original is not None and str(df[col].dtype) != original:
+            try:
+                df[col] = df[col].astype(original)
+            except (TypeError, ValueError):
+                pass
+    return df
+
+
+def _write_ipc(table: pa.Table, sink: Any, compression: Optional[str]) -> None:
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+
+
+def _with_dtypes(table: pa.Table, df: pd.DataFrame) -> pa.Table:
+    dtypes = {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+    return table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"tervela_dtypes": pickle.dumps(dtypes),
+    })
+
+
+def frame_to_bytes(df: pd.DataFrame, compression: Optional[str] = SPILL_COMPRESSION) -> bytes:
+    """Sérialise un DataFrame en Arrow IPC (pickle si Arrow ne sait pas le typer)."""
+    table = _to_arrow(df)
+    if table is None:
+        return b"PKL" + pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    table = _with_dtypes(table, df)
+    sink = pa.BufferOutputStream()
+    _write_ipc(table, sink, compression)
+    return sink.getvalue().to_pybytes()
+
+
+def _frame_from_table(table: pa.Table) -> pd.DataFrame:
+    metadata = table.schema.metadata or {}
+    dtypes = pickle.loads(metadata[b"tervela_dtypes"]) if b"tervela_dtypes" in metadata else {}
+    return _from_arrow(table, dtypes)
+
+
+def frame_from_bytes(data: bytes) -> pd.DataFrame:
+    if data[:3] == b"PKL":
+        return pickle.loads(data[3:])
+    return _frame_from_table(pa.ipc.open_file(pa.BufferReader(data)).read_all())
+
+
+def frame_to_parquet(df: pd.DataFrame, path: str, compression: Optional[str] = SPILL_COMPRESSION) -> bool:
+    """Écrit un DataFrame en Parquet typé ; False (rien d'écrit) si Arrow ne sait pas le typer."""
+    table = _to_arrow(df)
+    if table is None:
+        return False
+    pq.write_table(_with_dtypes(table, df), path, compression=compression)
+    return True
+
+
+def frame_from_parquet(path: str) -> pd.DataFrame:
+    return _frame_from_table(pq.read_table(path, memory_map=True))
+
+
+def frame_from_file(path: str) -> pd.DataFrame:
+    """Relit un DataFrame écrit par frame_to_bytes, en memory-map si c'est de l'Arrow."""
+    with open(path, "rb") as f:
+        if f.read(3) == b"PKL":
+            return pickle.loads(f.read())
+    with pa.memory_map(path, "r") as mapped:
+        return _frame_from_table(pa.ipc.open_file(mapped).read_all())
+
+
+class SpilledStep:
+    """Étape d'historique sortie de la RAM (buffers compressés ou fichiers sur disque)."""
+
+    def __init__(self, step: Step, tier: str, directory: Optional[str] = None):
+        self.tier = tier
+        self.is_snapshot = isinstance(step, pd.DataFrame)
+        self.dropped_columns = [] if self.is_snapshot else list(step.dropped_columns)
+        self.column_order = [] if self.is_snapshot else list(step.column_order)
+        self.nbytes = 0
+        self.disk_bytes = 0
+        # Identifiant du blob une fois l'étape publiée dans un backend de session partagé
+        self.blob_id: Optional[str] = None
+        # nom de la partie -> (format, buffer ou chemin, dtypes d'origine)
+        self._parts: Dict[str, tuple] = {}
+        for name, df in _frame_parts(step).items():
+            self._store(name, df, directory)
+
+    def _store(self, name: str, df: pd.DataFrame, directory: Optional[str]) -> None:
+        dtypes = {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+        table = _to_arrow(df)
+        if self.tier == "memory":
+            if table is not None:
+                sink = pa.BufferOutputStream()
+                _write_ipc(table, sink, SPILL_COMPRESSION)
+                payload = sink.getvalue()
+                self._parts[name] = ("arrow", payload, dtypes)
+            else:
+                payload = zlib.compress(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+                self._parts[name] = ("pickle", payload, dtypes)
+            self.nbytes += len(payload)
+            return
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{uuid.uuid4().hex}.{name}")
+        if table is not None:
+            path += ".arrow"
+            with pa.OSFile(path, "wb") as sink:
+                _write_ipc(table, sink, None)
+            self._parts[name] = ("arrow", path, dtypes)
+        else:
+            path += ".pkl"
+            with open(path, "wb") as sink:
+                pickle.dump(df, sink, protocol=pickle.HIGHEST_PROTOCOL)
+            self._parts[name] = ("pickle", path, dtypes)
+        self.disk_bytes += os.path.getsize(path)
+
+    def _read(self, name: str) -> pd.DataFrame:
+        fmt, source, dtypes = self._parts[name]
+        if self.tier == "memory":
+            if fmt == "arrow":
+                return _from_arrow(pa.ipc.open_file(pa.BufferReader(source)).read_all(), dtypes)
+            return pickle.loads(zlib.decompress(source))
+        if fmt == "arrow":
+            with pa.memory_map(source, "r") as mapped:
+                return _from_arrow(pa.ipc.open_file(mapped).read_all(), dtypes)
+        with open(source, "rb") as f:
+            return pickle.load(f)
+
+    def load(self) -> Step:
+        if self.is_snapshot:
+            return self._read("snapshot")
+        columns = self._read("columns") if "columns" in self._parts else None
+        return FrameDelta(
+            removed=self._read("removed").index,
+            inserted=self._read("inserted"),
+            columns={col: columns[col] for col in columns.columns} if columns is not None else {},
+            dropped_columns=self.dropped_columns,
+            column_order=self.column_order,
+            row_order=self._read("row_order").index if "row_order" in self._parts else None,
+        )
+
+    def to_bytes(self) -> bytes:
+        """Forme sérialisée (niveau "memory") utilisée par les backends de session partagés."""
+        step = self if self.tier == "memory" else SpilledStep(self.load(), "memory")
+        return pickle.dumps({
+            "is_snapshot": step.is_snapshot,
+            "dropped_columns": step.dropped_columns,
+            "column_order": step.column_order,
+            "parts": step._parts,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SpilledStep":
+        state = pickle.loads(data)
+        step = cls.__new__(cls)
+        step.tier = "memory"
+        step.is_snapshot = state["is_snapshot"]
+        step.dropped_columns = state["dropped_columns"]
+        step.column_order = state["column_order"]
+        step._parts = state["parts"]
+        step.nbytes = sum(len(payload) for _, payload, _ in step._parts.values())
+        step.disk_bytes = 0
+        step.blob_id = None
+        return step
+
+    def release(self) -> None:
+        """Supprime les fichiers éventuellement écrits sur disque."""
+        if self.tier != "disk":
+            return
+        for _, path, _ in self._parts.values():
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning(f"⚠️ Fichier de spill non supprimé {path}: {e}")
+        self._parts = {}
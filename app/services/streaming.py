@@ -0,0 +1,326 @@
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.services.datasets import prepare_initial_df
+from app.services.ingest import iter_upload_chunks
+from app.services.spill import SPILL_DIR
+
+# --- 🌊 Traitement en flux des fichiers plus gros que la RAM ---
+#
+# Le fichier est lu bloc par bloc (iter_upload_chunks) ; chaque bloc traverse la
+# liste ordonnée des étapes puis est écrit aussitôt (CSV ou Parquet), si bien que
+# la mémoire ne dépend que de la taille d'un bloc. Les étapes à état global
+# (dédoublonnage) gardent une empreinte 64 bits par ligne déjà vue dans un
+# SpillableHashSet : en RAM jusqu'à DEDUP_MEMORY_HASHES empreintes, puis déversé
+# sur disque en partitions triées, relues en memory-map.
+#
+# Les types sont inférés bloc par bloc : si un bloc ne correspond plus au schéma
+# de sortie (colonne numérique devenue texte...), le fichier est relu depuis le
+# début avec toutes les colonnes en texte.
+
+DEDUP_MEMORY_HASHES = int(os.getenv("DEDUP_MEMORY_HASHES", str(4_000_000)))  # 32 Mo
+DEDUP_PARTITIONS = 64
+DEDUP_MAX_RUNS = 8  # fichiers triés par partition avant fusion
+STREAM_OUTPUT_FORMATS = ("csv", "parquet")
+
+StreamStep = Callable[[pd.DataFrame], pd.DataFrame]
+
+
+class SchemaDrift(ValueError):
+    """Un bloc n'a plus les types du schéma de sortie."""
+
+
+# 🧮 Ensemble d'empreintes déversable sur disque
+
+def _in_sorted(run: np.ndarray, values: np.ndarray) -> np.ndarray:
+    if not len(run):
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(run, values), len(run) - 1)
+    return run[positions] == values
+
+
+class SpillableHashSet:
+    """
+    Ensemble d'entiers uint64 (empreintes de lignes). Les nouvelles valeurs
+    restent en RAM sous forme de tableaux triés ; au-delà de `max_memory`
+    valeurs, elles sont réparties par bits de poids fort en `partitions`
+    fichiers .npy triés (fusionnés quand une partition en compte trop).
+    """
+
+    def __init__(self, max_memory: int = DEDUP_MEMORY_HASHES, partitions: int = DEDUP_PARTITIONS,
+                 directory: str = SPILL_DIR):
+        self.max_memory = max_memory
+        self.partitions = partitions
+        self._shift = np.uint64(64 - int(np.log2(partitions)))
+        self._base_directory = directory
+        self._directory: Optional[str] = None
+        self._memory: List[np.ndarray] = []
+        self._memory_size = 0
+        self._runs: Dict[int, List[str]] = {}
+        self._mapped: Dict[str, np.ndarray] = {}
+        self.size = 0
+        self.spills = 0
+        self._files = 0  # numéro du prochain fichier : un nom n'est jamais réutilisé
+
+    def _contains(self, values: np.ndarray) -> np.ndarray:
+        """`values` triées et uniques."""
+        found = np.zeros(len(values), dtype=bool)
+        for run in self._memory:
+            found |= _in_sorted(run, values)
+        if self._runs:
+            bounds = np.searchsorted(values >> self._shift, np.arange(self.partitions + 1, dtype=np.uint64))
+            for partition, paths in self._runs.items():
+                start, stop = bounds[partition], bounds[partition + 1]
+                if start == stop:
+                    continue
+                for path in paths:
+                    found[start:stop] |= _in_sorted(self._mapped[path], values[start:stop])
+        return found
+
+    def add_new(self, values: np.ndarray) -> np.ndarray:
+        """Ajoute `values` ; masque des positions vues pour la première fois (ni avant, ni plus tôt dans `values`)."""
+        unique, first = np.unique(values, return_index=True)
+        new = ~self._contains(unique)
+        mask = np.zeros(len(values), dtype=bool)
+        mask[first[new]] = True
+        fresh = unique[new]
+        if len(fresh):
+            self._memory.append(fresh)
+            self._memory_size += len(fresh)
+            self.size += len(fresh)
+            if self._memory_size > self.max_memory:
+                self._spill()
+            elif len(self._memory) > DEDUP_MAX_RUNS:
+                # Valeurs disjointes d'un tableau à l'autre : la fusion est un simple tri
+                self._memory = [np.sort(np.concatenate(self._memory))]
+        return mask
+
+    def _write_run(self, partition: int, values: np.ndarray) -> None:
+        if self._directory is None:
+            os.makedirs(self._base_directory, exist_ok=True)
+            self._directory = tempfile.mkdtemp(dir=self._base_directory, prefix="dedup-")
+        path = os.path.join(self._directory, f"{partition:03d}-{self._files:06d}.npy")
+        self._files += 1
+        np.save(path, values)
+        self._mapped[path] = np.load(path, mmap_mode="r")
+        self._runs.setdefault(partition, []).append(path)
+
+    def _spill(self) -> None:
+        values = np.sort(np.concatenate(self._memory))
+        bounds = np.searchsorted(values >> self._shift, np.arange(self.partitions + 1, dtype=np.uint64))
+        for partition in range(self.partitions):
+            start, stop = bounds[partition], bounds[partition + 1]
+            if start == stop:
+                continue
+            self._write_run(partition, values[start:stop])
+            if len(self._runs[partition]) > DEDUP_MAX_RUNS:
+                self._compact(partition)
+        self.spills += 1
+        self._memory, self._memory_size = [], 0
+
+    def _compact(self, partition: int) -> None:
+        paths = self._runs.pop(partition)
+        merged = np.sort(np.concatenate([self._mapped.pop(path) for path in paths]))
+        # Les anciens fichiers ne sont supprimés qu'après l'écriture du fichier fusionné (nom neuf)
+        self._write_run(partition, merged)
+        for path in paths:
+            os.remove(path)
+
+    def close(self) -> None:
+        self._memory, self._mapped, self._runs = [], {}, {}
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Empreinte uint64 de chaque ligne, stable d'un bloc à l'autre : les nombres
+    sont comparés en float64 (1 et 1.0 se confondent), le reste sous forme de texte.
+    """
+    normalized = {}
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+            normalized[i] = col.astype("float64")
+        else:
+            normalized[i] = col.astype(str).where(col.notna(), None)
+    return pd.util.hash_pandas_object(pd.DataFrame(normalized, index=df.index), index=False).to_numpy()
+
+
+class StreamDeduplicate:
+    """Dédoublonnage sur l'ensemble du fichier : seule la première occurrence d'une ligne est gardée."""
+
+    def __init__(self, columns: Optional[Callable[[pd.DataFrame], List[Any]]] = None):
+        self.columns = columns
+        self.seen = SpillableHashSet()
+
+    def __call__(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        subset = chunk if self.columns is None else chunk[self.columns(chunk)]
+        return chunk[self.seen.add_new(row_hashes(subset))]
+
+    def close(self) -> None:
+        self.seen.close()
+
+
+# 💾 Écriture incrémentale
+
+def _arrow_column(column: pd.Series) -> pa.Array:
+    try:
+        return pa.Array.from_pandas(column)
+    except (pa.ArrowException, TypeError, ValueError):
+        return pa.Array.from_pandas(column.astype(str).where(column.notna(), None))
+
+
+class CsvSink:
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._header = True
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        chunk.to_csv(self._file, header=self._header, index=False)
+        self._header = False
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetSink:
+    """Parquet écrit par groupes de lignes ; le schéma est fixé par le premier bloc."""
+
+    def __init__(self, path: str, compression: str = "zstd"):
+        self.path = path
+        self.compression = compression
+        self._writer: Optional[pq.ParquetWriter] = None
+
+    def _conform(self, chunk: pd.DataFrame) -> pa.Table:
+        schema = self._writer.schema
+        if [str(col) for col in chunk.columns] != schema.names:
+            raise SchemaDrift(f"Colonnes différentes d'un bloc à l'autre: {list(chunk.columns)}")
+        arrays = []
+        for i, field in enumerate(schema):
+            array = _arrow_column(chunk.iloc[:, i])
+            if array.type != field.type:
+                try:
+                    array = array.cast(field.type)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                    raise SchemaDrift(f"Colonne {field.name}: {array.type} au lieu de {field.type} ({e})")
+            arrays.append(array)
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self._writer is None:
+            arrays = [_arrow_column(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+            # Colonne entièrement vide dans le premier bloc : typée texte
+            arrays = [pa.nulls(len(a), pa.string()) if a.type == pa.null() else a for a in arrays]
+            table = pa.Table.from_arrays(arrays, names=[str(col) for col in chunk.columns])
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression=self.compression)
+        else:
+            table = self._conform(chunk)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_sink(path: str, output_format: str):
+    if output_format == "parquet":
+        return ParquetSink(path)
+    if output_format == "csv":
+        return CsvSink(path)
+    raise ValueError(f"Format de sortie inconnu: {output_format} (attendu: {', '.join(STREAM_OUTPUT_FORMATS)})")
+
+
+# 🚰 Pipeline
+
+def _run_stream(
+    source_path: str,
+    filename: str,
+    steps: List[Tuple[str, StreamStep]],
+    output_path: str,
+    output_format: str,
+    as_text: bool,
+) -> Dict[str, Any]:
+    rows_in, rows_out, chunks = 0, 0, 0
+    columns: List[str] = []
+    step_rows = [0] * len(steps)
+    sink = open_sink(output_path, output_format)
+    written = False
+    try:
+        with open(source_path, "rb") as f:
+            offset = 0
+            for chunk in iter_upload_chunks(f, filename, as_text=as_text):
+                chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+                offset += len(chunk)
+                rows_in += len(chunk)
+                chunks += 1
+                chunk = prepare_initial_df(chunk)
+                for i, (_, step) in enumerate(steps):
+                    # Copie superficielle : les fonctions de cleaner.py modifient le DataFrame reçu
+                    chunk = step(chunk.copy(deep=False))
+                    step_rows[i] += len(chunk)
+                if len(chunk) or not written:
+                    sink.write(chunk)
+                    written = True
+                rows_out += len(chunk)
+                columns = [str(col) for col in chunk.columns]
+    finally:
+        sink.close()
+    return {
+        "chunks": chunks,
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "columns": columns,
+        "text_mode": as_text,
+        "steps": [
+            {"name": name, "rows_after": rows, **({"report": step.report} if hasattr(step, "report") else {})}
+            for (name, step), rows in zip(steps, step_rows)
+        ],
+    }
+
+
+def stream_file(
+    source_path: str,
+    filename: str,
+    build_steps: Callable[[], List[Tuple[str, StreamStep]]],
+    output_path: str,
+    output_format: str = "csv",
+) -> Dict[str, Any]:
+    """
+    Fait passer le fichier `source_path` bloc par bloc dans les étapes construites
+    par `build_steps` et écrit le résultat dans `output_path` (CSV ou Parquet).
+    `build_steps` est rappelé si le fichier doit être relu en texte (nouvel état).
+    Retourne le résumé : blocs, lignes lues / écrites, lignes restantes après chaque étape.
+    """
+    directory = os.path.dirname(output_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    for as_text in (False, True):
+        steps = build_steps()
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".stream-")
+        os.close(fd)
+        try:
+            summary = _run_stream(source_path, filename, steps, tmp_path, output_format, as_text)
+        except (SchemaDrift, pa.ArrowInvalid) as e:
+            os.remove(tmp_path)
+            if as_text:
+                raise ValueError(f"Types incohérents dans le fichier: {e}")
+            logging.warning(f"⚠️ Types incohérents entre blocs ({e}), relecture en texte")
+            continue
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        finally:
+            for _, step in steps:
+                if hasattr(step, "close"):
+                    step.close()
+        os.replace(tmp_path, output_path)
+        return summary
+    raise AssertionError("unreachable")
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Optional, Tuple
+import pandas as pd
+
+from app.services.spill import frame_to_bytes, frame_from_file, frame_to_parquet, frame_from_parquet
+
+# --- 🗄️ Stockage des fichiers envoyés, adressé par contenu ---
+#
+# Le fichier est copié sur disque par blocs tout en calculant son SHA-256, puis
+# renommé en UPLOAD_DIR/<2 premiers caractères>/<sha256><extension>. Un même
+# contenu n'est donc stocké qu'une fois, quel que soit son nom. Le DataFrame
+# obtenu après lecture est conservé à côté en Parquet typé (<fichier>.parquet),
+# ou en Arrow IPC (<fichier>.arrow) pour les colonnes qu'Arrow ne sait pas typer
+# en Parquet (objets mixtes venant d'Excel) : un fichier déjà connu n'est ni
+# réécrit, ni relu depuis le CSV / XLSX.
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class StoredUpload:
+    digest: str
+    path: str
+    size: int
+    created: bool  # False : contenu déjà présent, rien n'a été écrit
+
+    @property
+    def parquet_path(self) -> str:
+        return self.path + ".parquet"
+
+    @property
+    def parsed_path(self) -> str:
+        return self.path + ".arrow"
+
+
+def _extension(filename: str) -> str:
+    return os.path.splitext(filename)[1].lower()
+
+
+def store_upload(fileobj: BinaryIO, filename: str, upload_dir: str = UPLOAD_DIR) -> StoredUpload:
+    """Copie `fileobj` en flux (hash au fil de l'eau) vers son emplacement adressé par contenu."""
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        hexdigest = digest.hexdigest()
+        directory = os.path.join(upload_dir, hexdigest[:2])
+        path = os.path.join(directory, hexdigest + _extension(filename))
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return StoredUpload(hexdigest, path, size, created=False)
+        os.makedirs(directory, exist_ok=True)
+        os.replace(tmp_path, path)
+        return StoredUpload(hexdigest, path, size, created=True)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_parsed(stored: StoredUpload) -> Optional[pd.DataFrame]:
+    """DataFrame déjà lu : lecture colonnaire du Parquet, sinon de l'Arrow IPC."""
+    for path, reader in ((stored.parquet_path, frame_from_parquet), (stored.parsed_path, frame_from_file)):
+        if not os.path.exists(path):
+            continue
+        try:
+            return reader(path)
+        except Exception as e:
+            logging.warning(f"⚠️ Jeu de données lu illisible ({path}): {e}")
+    return None
+
+
+def save_parsed(stored: StoredUpload, df: pd.DataFrame) -> str:
+    """Écrit le DataFrame lu à côté du fichier stocké ; retourne le chemin écrit."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(stored.path), prefix=".parsed-")
+    os.close(fd)
+    try:
+        if frame_to_parquet(df, tmp_path):
+            os.replace(tmp_path, stored.parquet_path)
+            return stored.parquet_path
+        with open(tmp_path, "wb") as out:
+            out.write(frame_to_bytes(df, compression=None))
+        os.replace(tmp_path, stored.parsed_path)
+        return stored.parsed_path
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_or_parse(
+    stored: StoredUpload,
+    filename: str,
+    parse: Callable[[BinaryIO, str], pd.DataFrame],
+) -> Tuple[pd.DataFrame, bool]:
+    """DataFrame du fichier stocké : relu depuis sa version Parquet / Arrow, sinon lu puis converti."""
+    df = load_parsed(stored)
+    if df is not None:
+        return df, True
+    with open(stored.path, "rb") as f:
+        df = parse(f, filename)
+    save_parsed(stored, df)
+    return df, False
+
+
+def release_upload(path: str) -> None:
+    """Supprime un fichier stocké et ses versions déjà lues."""
+    for target in (path, path + ".parquet", path + ".arrow"):
+        try:
+            os.remove(target)
+        except OSError:
+            pass  # Le fichier n'existe peut-être pas
@@ -0,0 +1,128 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import orjson
+import pandas as pd
+import pyarrow as pa
+
+from app.utils.json_encoder import dumps, frame_records_fragment, frame_table_fragment, frame_columns_fragment
+
+# --- 📡 Format d'échange des lignes (négocié par en-tête) ---
+#
+# X-Data-Format choisit la forme de la clé "data" des réponses :
+#   - records : [{"col": valeur, ...}, ...]                       (défaut, historique)
+#   - table   : {"columns": [...], "dtypes": [...], "rows": [[...], ...]}
+#   - columns : {"columns": [...], "dtypes": [...], "values": [[...col0], [...col1]]}
+# Les formats table / columns ne répètent pas les noms de colonnes à chaque ligne.
+# Côté requête, la forme de "data" est reconnue d'elle-même (liste ou objet).
+#
+# Transport binaire : Accept (ou Content-Type) application/vnd.apache.arrow.stream.
+# Le corps est alors un flux Arrow IPC construit colonne par colonne depuis le
+# DataFrame ; le reste de la réponse (message, version...) est placé en JSON
+# dans les métadonnées du schéma, sous la clé "tervela".
+
+DATA_FORMAT_HEADER = "X-Data-Format"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+ARROW_METADATA_KEY = b"tervela"
+
+FRAME_ENCODERS: Dict[str, Callable[[pd.DataFrame], orjson.Fragment]] = {
+    "records": frame_records_fragment,
+    "table": frame_table_fragment,
+    "columns": frame_columns_fragment,
+}
+
+
+def parse_data_format(value: Optional[str], accept: Optional[str] = None) -> str:
+    if accept and ARROW_STREAM in accept and not value:
+        return "arrow"
+    data_format = (value or "records").strip().lower()
+    if data_format != "arrow" and data_format not in FRAME_ENCODERS:
+        raise ValueError(
+            f"Format de données inconnu: {value} (attendu: {', '.join(FRAME_ENCODERS)}, arrow)"
+        )
+    return data_format
+
+
+def encode_frame(df: pd.DataFrame, data_format: str = "records") -> orjson.Fragment:
+    return FRAME_ENCODERS[data_format](df)
+
+
+def _apply_dtypes(df: pd.DataFrame, dtypes: List[Optional[str]]) -> pd.DataFrame:
+    # Les dtypes envoyés sont des indications : une colonne non convertible reste inférée
+    for i, dtype in enumerate(dtypes):
+        if not dtype or dtype in ("object", "str", "string"):
+            continue
+        column = df.iloc[:, i]
+        try:
+            if dtype.startswith("datetime64"):
+                converted = pd.to_datetime(column, format="ISO8601")
+            else:
+                converted = column.astype(dtype)
+        except (TypeError, ValueError):
+            continue
+        df.isetitem(i, converted)
+    return df
+
+
+def decode_frame(payload: Any) -> pd.DataFrame:
+    """Construit un DataFrame depuis une charge records, table ou columns (ou Arrow déjà décodée)."""
+    if isinstance(payload, pd.DataFrame):
+        return payload
+    if isinstance(payload, list):
+        return pd.DataFrame(payload)
+    if not isinstance(payload, dict) or not isinstance(payload.get("columns"), list):
+        raise ValueError("'data' doit être une liste de lignes ou un objet {columns, rows | values}")
+
+    columns = payload["columns"]
+    if "rows" in payload:
+        rows = payload["rows"]
+        if any(len(row) != len(columns) for row in rows):
+            raise ValueError("Chaque ligne de 'rows' doit avoir autant de valeurs que 'columns'")
+        df = pd.DataFrame(rows, columns=range(len(columns)))
+    elif "values" in payload:
+        values = payload["values"]
+        if len(values) != len(columns) or len({len(col) for col in values}) > 1:
+            raise ValueError("'values' doit contenir une liste de même longueur par colonne")
+        df = pd.DataFrame(dict(enumerate(values)), columns=range(len(columns)))
+    else:
+        raise ValueError("'data' doit contenir 'rows' (format table) ou 'values' (format columns)")
+
+    # Positions d'abord, noms ensuite : les noms de colonnes en double sont conservés
+    df.columns = columns
+    dtypes = payload.get("dtypes")
+    if isinstance(dtypes, list) and len(dtypes) == len(columns):
+        df = _apply_dtypes(df, dtypes)
+    return df
+
+
+# 🏹 Arrow IPC
+
+def _arrow_column(column: pd.Series) -> pa.Array:
+    try:
+        return pa.Array.from_pandas(column)
+    except (pa.ArrowException, TypeError, ValueError):
+        # Objets de types mélangés : seule cette colonne passe en texte
+        return pa.Array.from_pandas(column.astype(str))
+
+
+def frame_to_arrow_stream(df: pd.DataFrame, metadata: Optional[Dict[str, Any]] = None) -> bytes:
+    """Flux Arrow IPC du DataFrame (sans index), `metadata` en JSON dans le schéma."""
+    table = pa.Table.from_arrays(
+        [_arrow_column(df.iloc[:, i]) for i in range(df.shape[1])],
+        names=[str(col) for col in df.columns],
+    )
+    if metadata:
+        table = table.replace_schema_metadata({ARROW_METADATA_KEY: dumps(metadata)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def frame_from_arrow_stream(data: bytes) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """Relit un flux Arrow IPC : (DataFrame, paramètres JSON des métadonnées du schéma)."""
+    try:
+        table = pa.ipc.open_stream(pa.BufferReader(data)).read_all()
+    except pa.ArrowException as e:
+        raise ValueError(f"Flux Arrow invalide: {e}")
+    metadata = table.schema.metadata or {}
+    params = orjson.loads(metadata[ARROW_METADATA_KEY]) if ARROW_METADATA_KEY in metadata else {}
+    return table.to_pandas(integer_object_nulls=True), params
@@ -1,3 +1,3 @@
-from .json_encoder import serialize_with_custom_encoder, CustomJSONEncoder
+from .json_encoder import DataJSONResponse, frame_records_fragment, frame_table_fragment, frame_columns_fragment
 
-__all__ = ['serialize_with_custom_encoder', 'CustomJSONEncoder'] 
\ No newline at end of file
+__all__ = ['DataJSONResponse', 'frame_records_fragment', 'frame_table_fragment', 'frame_columns_fragment'] 
\ No newline at end of file
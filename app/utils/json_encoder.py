@@ -1,16 +1,72 @@
-import json
 import numpy as np
-import math
+import orjson
+import pandas as pd
+from decimal import Decimal
 from typing import Any
+from fastapi.responses import JSONResponse
 
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (np.integer, np.floating)):
-            return obj.item()
-        if isinstance(obj, (float, np.float64)):
-            if math.isinf(obj) or math.isnan(obj):
-                return str(obj)
-        return super().default(obj)
-
-def serialize_with_custom_encoder(obj: Any) -> str:
-    return json.dumps(obj, cls=CustomJSONEncoder) 
\ No newline at end of file
+# --- ⚡ Réponses JSON rapides (orjson) ---
+#
+# Les DataFrames sont encodés directement par pandas (to_json) et insérés tels
+# quels dans la réponse via orjson.Fragment : pas de passage par des dicts de
+# lignes ni de double encodage. NaN / Inf deviennent null, les scalaires numpy
+# et les dates sont gérés nativement.
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _orjson_default(obj: Any) -> Any:
+    if isinstance(obj, pd.DataFrame):
+        return frame_records_fragment(obj)
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    return str(obj)
+
+def _json_ready(df: pd.DataFrame) -> pd.DataFrame:
+    # Dates au format texte (ISO) plutôt qu'en millisecondes epoch
+    datetime_columns = df.select_dtypes(include=["datetime", "datetimetz"]).columns
+    if len(datetime_columns):
+        df = df.copy(deep=False)
+        for col in datetime_columns:
+            df[col] = df[col].astype(str)
+    return df
+
+def _frame_json(obj: Any, orient: str) -> str:
+    return obj.to_json(orient=orient, double_precision=15, default_handler=str)
+
+def frame_records_fragment(df: pd.DataFrame) -> orjson.Fragment:
+    """Lignes d'un DataFrame au format records, déjà encodées en JSON."""
+    return orjson.Fragment(_frame_json(_json_ready(df), "records"))
+
+def _frame_header(df: pd.DataFrame) -> bytes:
+    return (
+        b'{"columns":' + orjson.dumps([str(col) for col in df.columns])
+        + b',"dtypes":' + orjson.dumps([str(dtype) for dtype in df.dtypes])
+    )
+
+def frame_table_fragment(df: pd.DataFrame) -> orjson.Fragment:
+    """{columns, dtypes, rows} : noms de colonnes une seule fois, lignes en tableaux."""
+    rows = _frame_json(_json_ready(df), "values")
+    return orjson.Fragment(_frame_header(df) + b',"rows":' + rows.encode() + b"}")
+
+def frame_columns_fragment(df: pd.DataFrame) -> orjson.Fragment:
+    """{columns, dtypes, values} : une liste de valeurs par colonne (column-major)."""
+    ready = _json_ready(df)
+    values = ",".join(_frame_json(ready.iloc[:, i], "values") for i in range(ready.shape[1]))
+    return orjson.Fragment(_frame_header(df) + b',"values":[' + values.encode() + b"]}")
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_orjson_default, option=ORJSON_OPTIONS)
+
+class DataJSONResponse(JSONResponse):
+    """JSONResponse encodée avec orjson (DataFrames, numpy, NaN/Inf, dates)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
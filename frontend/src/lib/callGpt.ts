@@ -1,6 +1,7 @@
 import { GPTResponse } from "../types/gpt";
 import Logger from './logger';
 let sessionId: string | null = null;
+let sessionReady = false;
 export type CleaningRule = {
   type: 'delete_rows' | 'format_column' | 'deduplicate';
   column: string;
@@ -20,9 +21,11 @@ export type ProcessPromptResponse = {
   session_id: string; 
 };
 
-interface DataRow {
-  [key: string]: any;
-}
+type TableData = {
+  columns: string[];
+  dtypes: string[];
+  rows: any[][];
+};
 
 export async function processPrompt(prompt: string, data: any[][], token: string, email?: string): Promise<ProcessPromptResponse> {
   try {
@@ -32,15 +35,9 @@ export async function processPrompt(prompt: string, data: any[][], token: string
 
     Logger.debug("Préparation des données", { component: "processPrompt" });
     
-    // Convertir le tableau de tableaux en tableau d'objets
+    // Format "table" : les en-têtes ne sont envoyés qu'une fois (voir X-Data-Format)
     const [headers, ...rows] = data;
-    const objectData = rows.map(row => {
-      const obj: { [key: string]: any } = {};
-      headers.forEach((header, index) => {
-        obj[header] = row[index];
-      });
-      return obj;
-    });
+    const tableData = { columns: headers, rows };
 
     Logger.request("Envoi de la requête", { 
       component: "processPrompt",
@@ -49,23 +46,31 @@ export async function processPrompt(prompt: string, data: any[][], token: string
     if (!sessionId) {
       sessionId = crypto.randomUUID(); // ou utilise Math.random... si crypto n’est pas dispo
     }
-    const processResponse = await fetch("http://localhost:8000/files/quick-process", {
+    // Les lignes ne sont envoyées qu'une fois par session : ensuite le serveur
+    // travaille sur son propre DataFrame.
+    const sendProcessRequest = (withData: boolean) => fetch("http://localhost:8000/files/quick-process", {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
         "Authorization": `Bearer ${token}`,
         "X-User-Email": email || '',
         "Accept": "application/json",
+        "X-Data-Format": "table",
       },
       mode: 'cors',
       credentials: 'include',
       body: JSON.stringify({
-        data: objectData,
+        ...(withData ? { data: tableData } : {}),
         prompt: prompt,
         session_id: sessionId,
-        
       }),
     });
+
+    let processResponse = await sendProcessRequest(!sessionReady);
+    if (processResponse.status === 404) {
+      // Session expirée côté serveur : on renvoie les données complètes
+      processResponse = await sendProcessRequest(true);
+    }
    
     Logger.debug("Statut de la réponse", { 
       component: "processPrompt",
@@ -91,6 +96,7 @@ export async function processPrompt(prompt: string, data: any[][], token: string
     }
 
     const processResult = await processResponse.json();
+    const resultTable: TableData = processResult.data;
     Logger.debug("Réponse du backend", { 
       component: "processPrompt",
       details: { messageLength: processResult.message.length }
@@ -110,16 +116,15 @@ export async function processPrompt(prompt: string, data: any[][], token: string
       results: {
         modified_columns: [],
         rows_before: data.length - 1,
-        rows_after: processResult.data.length,
-        rows_modified: Math.abs(data.length - 1 - processResult.data.length)
+        rows_after: resultTable.rows.length,
+        rows_modified: Math.abs(data.length - 1 - resultTable.rows.length)
       }
     };
 
-    // Convertir les données en format tableau de tableaux pour la réponse
-    const resultHeaders = Object.keys(processResult.data[0] || {});
-    const resultRows = processResult.data.map((row: DataRow) => resultHeaders.map(header => row[header]));
-    const resultData = [resultHeaders, ...resultRows];
+    // Déjà au format tableau de tableaux : on remet simplement les en-têtes en tête
+    const resultData = [resultTable.columns, ...resultTable.rows];
     sessionId = processResult.session_id;
+    sessionReady = true;
     return {
       data: resultData,
       message: processResult.message,
@@ -0,0 +1,30 @@
+"""Add job lease columns to file_processes
+
+Revision ID: 7c3e9a41b2d8
+Revises: e1a12fb5332c
+Create Date: 2026-10-18 10:12:03.418277
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e9a41b2d8'
+down_revision: Union[str, None] = 'e1a12fb5332c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('file_processes', sa.Column('claimed_by', sa.String(length=255), nullable=True))
+    op.add_column('file_processes', sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('file_processes', 'claimed_at')
+    op.drop_column('file_processes', 'claimed_by')
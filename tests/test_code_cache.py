@@ -0,0 +1,57 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from app.services.code_cache import CodeCache, instruction_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CodeCache(path=str(tmp_path / "code_cache.db"))
+
+
+DF = pd.DataFrame({"age": [20, 40], "ville": ["Paris", "N/A"]})
+
+
+@pytest.mark.parametrize("first, second", [
+    ("supprime les lignes où age > 30", "supprime les lignes où age < 30"),
+    ("garde les lignes où age >= -5", "garde les lignes où age >= 5"),
+    ("remplace 'N/A' par vide dans ville", "remplace 'n a' par vide dans ville"),
+    ("remplace N/A par vide dans ville", "remplace n a par vide dans ville"),
+    ("remplace Paris par PARIS dans ville", "remplace PARIS par Paris dans ville"),
+    ("multiplie age par 1.5", "multiplie age par 1.25"),
+])
+def test_distinct_instructions_never_share_code(cache, first, second):
+    assert instruction_key(first) != instruction_key(second)
+    cache.store(DF, first, "code_1", "org-a")
+    assert cache.lookup(DF, second, "org-a") is None
+
+
+def test_phrasing_variants_hit(cache):
+    cache.store(DF, "Supprime les doublons !", "df = df.drop_duplicates()", "org-a")
+    assert cache.lookup(DF, "supprime  les doublons", "org-a") == "df = df.drop_duplicates()"
+    assert cache.lookup(DF, "supprimer les doublons", "org-a") == "df = df.drop_duplicates()"
+    assert cache.stats()["exact_hits"] == 1 and cache.stats()["similar_hits"] == 1
+
+
+def test_code_is_never_shared_across_organizations(tmp_path):
+    path = str(tmp_path / "code_cache.db")
+    CodeCache(path=path).store(DF, "remplace les villes inconnues", "df['ville'] = df['ville'].replace('N/A', 'Paris')", "org-a")
+    cache = CodeCache(path=path)
+    assert cache.lookup(DF, "remplace les villes inconnues", "org-b") is None
+    assert cache.lookup(DF, "remplacer les villes inconnues", "org-b") is None
+    assert cache.lookup(DF, "remplace les villes inconnues", "org-a") is not None
+
+
+def test_keys_from_an_older_normalization_are_dropped(tmp_path):
+    path = str(tmp_path / "code_cache.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE code_cache (fingerprint TEXT NOT NULL, instruction TEXT NOT NULL, code TEXT NOT NULL, "
+        "last_used REAL NOT NULL, PRIMARY KEY (fingerprint, instruction))"
+    )
+    db.execute("INSERT INTO code_cache VALUES ('f', 'supprime les lignes ou age 30', 'code', 0)")
+    db.commit()
+    db.close()
+    assert CodeCache(path=path).stats()["entries"] == 0
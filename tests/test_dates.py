@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from app.services.cleaner import standardize_date_values
+from app.services.dates import format_cache, parse_dates
+
+
+@pytest.fixture(autouse=True)
+def empty_format_cache():
+    format_cache._entries.clear()
+
+
+@pytest.mark.parametrize("values", [
+    ["9999-12-31", "0001-01-01"],
+    ["31/12/9999", "2024-01-05", "01/01/0001"],
+])
+def test_out_of_nanosecond_range_dates_do_not_overflow(values):
+    expected = pd.Series(values).map(lambda v: v if "-" in v else "-".join(reversed(v.split("/"))))
+    result = standardize_date_values(pd.Series(values, name="date"))
+    assert result.tolist() == expected.tolist()
+
+
+def test_nanoseconds_are_kept_when_every_date_fits():
+    dates, report = parse_dates(pd.Series(["2024-01-05T10:11:12.123456789", "2024-01-06"], name="ts"))
+    assert dates.iloc[0] == pd.Timestamp("2024-01-05 10:11:12.123456789")
+    assert report["unparsed"] == 0
+
+
+def test_day_and_month_order_are_cached_separately():
+    values = pd.Series(["03/04/2024", "05/06/2024"], name="date")
+    assert standardize_date_values(values, dayfirst=True).tolist() == ["2024-04-03", "2024-06-05"]
+    assert standardize_date_values(values, dayfirst=False).tolist() == ["2024-03-04", "2024-05-06"]
+    dates, report = parse_dates(values, dayfirst=True)
+    assert report["cached"] and dates.dt.month.tolist() == [4, 6]
@@ -0,0 +1,31 @@
+import orjson
+import pandas as pd
+import pytest
+
+from app.services.delta import compute_delta, delta_to_payload
+from app.services.wire import decode_frame
+
+
+OLD = pd.DataFrame({"nom": ["alice", "bob", "carl"], "vu": pd.to_datetime(["2024-01-05", "2024-02-01", None])})
+
+
+def payload(data_format):
+    new = OLD.drop(index=1).assign(nom=lambda df: df["nom"].str.title())
+    new.loc[7] = ["Dora", pd.Timestamp("2024-03-01")]
+    return orjson.loads(orjson.dumps(delta_to_payload(compute_delta(OLD, new), data_format)))
+
+
+def test_records_keep_row_ids_and_iso_dates():
+    # Colonnes remplacées envoyées en entier (lignes insérées comprises), pas dans "inserted"
+    delta = payload("records")
+    assert delta["removed"] == [1]
+    assert delta["inserted"] == [{"_row_id": 7, "vu": "2024-03-01"}]
+    assert delta["columns"] == [{"nom": "Alice"}, {"nom": "Carl"}, {"nom": "Dora"}]
+
+
+@pytest.mark.parametrize("data_format", ["table", "columns"])
+def test_frames_follow_the_negotiated_format(data_format):
+    delta = payload(data_format)
+    inserted, columns = decode_frame(delta["inserted"]), decode_frame(delta["columns"])
+    assert inserted.to_dict(orient="records") == [{"_row_id": 7, "vu": pd.Timestamp("2024-03-01")}]
+    assert columns["nom"].tolist() == ["Alice", "Carl", "Dora"]
@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.services.history import DataFrameHistory
+from app.services.session_backends import DiskSessionBackend, RedisSessionBackend, SessionConflictError
+
+
+# Deux instances sur le même stockage : deux workers
+@pytest.fixture(params=["disk", "redis"])
+def workers(request, tmp_path):
+    if request.param == "disk":
+        return [DiskSessionBackend(root=str(tmp_path)) for _ in range(2)]
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    return [RedisSessionBackend(client=fakeredis.FakeRedis(server=server)) for _ in range(2)]
+
+
+def collect(backend, key):
+    backend._last_sweep = 0.0  # Balayage disque limité à un passage toutes les 30 s
+    backend._collect(key)
+
+
+def frame(*values):
+    return pd.DataFrame({"n": list(values)})
+
+
+def test_history_round_trip_keeps_generation(workers):
+    a, b = workers
+    history = DataFrameHistory(frame(1, 2))
+    history.append(frame(2, 4))
+    a.set("s", "df_history", history)
+
+    loaded = b.get("s", "df_history")
+    assert loaded.generation == history.generation
+    pd.testing.assert_frame_equal(loaded[-1], frame(2, 4))
+    pd.testing.assert_frame_equal(loaded[0], frame(1, 2))
+
+
+def test_stale_history_write_is_rejected(workers):
+    a, b = workers
+    a.set("s", "df_history", DataFrameHistory(frame(1)))
+    history_a, history_b = a.get("s", "df_history"), b.get("s", "df_history")
+
+    history_a.append(frame(2))
+    a.set("s", "df_history", history_a)
+    history_b.append(frame(3))
+    with pytest.raises(SessionConflictError):
+        b.set("s", "df_history", history_b)
+
+    reloaded = b.get("s", "df_history")
+    pd.testing.assert_frame_equal(reloaded[-1], frame(2))
+    reloaded.append(frame(3))
+    b.set("s", "df_history", reloaded)
+    pd.testing.assert_frame_equal(a.get("s", "df_history")[-1], frame(3))
+
+
+def test_concurrent_messages_are_merged(workers):
+    a, b = workers
+    a.set("s", "messages", InMemoryChatMessageHistory())
+    chat_a, chat_b = a.get("s", "messages"), b.get("s", "messages")
+
+    chat_a.add_messages([HumanMessage(content="a?"), AIMessage(content="a!")])
+    chat_b.add_messages([HumanMessage(content="b?"), AIMessage(content="b!")])
+
+    assert [m.content for m in a.get("s", "messages").messages] == ["a?", "a!", "b?", "b!"]
+
+
+def test_released_blobs_outlive_the_grace_period(workers):
+    a, b = workers
+    history = DataFrameHistory(frame(1))
+    history.append(frame(2))
+    a.set("s", "df_history", history)
+    _, old_meta = b._load_entry("s", "df_history")
+
+    a.set("s", "df_history", DataFrameHistory(frame(9)))
+    collect(a, "s")
+    # Un worker qui a lu l'ancienne entrée peut encore relire ses blobs
+    pd.testing.assert_frame_equal(b._deserialize("s", "df_history", old_meta)[0], frame(1))
+
+    a.blob_grace_seconds = 0
+    collect(a, "s")
+    with pytest.raises((KeyError, FileNotFoundError)):
+        b._deserialize("s", "df_history", old_meta)
+    pd.testing.assert_frame_equal(b.get("s", "df_history")[-1], frame(9))
+
+
+def test_blobs_shared_by_successive_revisions_are_kept(workers):
+    a, b = workers
+    a.blob_grace_seconds = 0
+    history = DataFrameHistory(frame(1))
+    for value in range(2, 6):
+        history.append(frame(value))
+        a.set("s", "df_history", history)
+        collect(a, "s")
+
+    reloaded = b.get("s", "df_history")
+    assert [df["n"].tolist() for df in reloaded] == [[1], [2], [3], [4], [5]]
+    del b.namespace("df_history")["s"]
+    assert "s" not in a.namespace("df_history")
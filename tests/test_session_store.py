@@ -0,0 +1,22 @@
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import HumanMessage
+
+from app.services.session_store import SessionStore
+
+
+def test_message_histories_are_remeasured_as_they_grow():
+    store = SessionStore(max_bytes=50_000, ttl_seconds=0)
+    messages = store.namespace("messages")
+    messages["old"] = InMemoryChatMessageHistory()
+    messages["s"] = InMemoryChatMessageHistory()
+    empty = store.stats()["bytes"]
+
+    for _ in range(10):
+        messages["s"].add_message(HumanMessage(content="x" * 1000))
+    assert store.stats()["bytes"] > empty + 9 * 1000
+
+    for _ in range(50):
+        messages["s"].add_message(HumanMessage(content="x" * 1000))
+    messages["s"]
+    # Budget dépassé par la session active : la plus ancienne est évincée
+    assert "old" not in messages and store.stats()["evictions"] == 1
@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.services import streaming
+from app.services.streaming import SpillableHashSet
+
+
+@pytest.fixture
+def hash_set(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming, "DEDUP_MAX_RUNS", 2)
+    seen = SpillableHashSet(max_memory=10, partitions=2, directory=str(tmp_path))
+    yield seen
+    seen.close()
+
+
+def test_survives_repeated_compactions(hash_set):
+    rng = np.random.default_rng(0)
+    values = rng.permutation(np.unique(rng.integers(0, np.iinfo(np.uint64).max, size=400, dtype=np.uint64)))
+    assert len(values) == 400
+    # 20 déversements de 20 valeurs : plusieurs fusions par partition
+    for batch in np.split(values, 20):
+        assert hash_set.add_new(batch).all()
+    assert hash_set.spills == 20 and hash_set.size == 400
+
+    for paths in hash_set._runs.values():
+        assert len(paths) <= 2 and all(os.path.exists(path) for path in paths)
+    assert not hash_set.add_new(values).any()
+    assert hash_set.add_new(np.array([values[0], 7, 7], dtype=np.uint64)).tolist() == [False, True, False]